@@ -0,0 +1,719 @@
+# archive_inspector.py
+import logging
+import lzma
+import os
+import struct
+import zipfile
+
+import config_manager
+import file_cache
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_CACHE_FILE = "archive_contents.sqlite"
+ARCHIVE_EXTENSIONS = (".zip", ".7z", ".rar")
+
+# Formaty modeli 3D i tekstur liczone w podsumowaniu zawartości
+MODEL_EXTENSIONS = frozenset(
+    (
+        ".max",
+        ".fbx",
+        ".obj",
+        ".3ds",
+        ".blend",
+        ".c4d",
+        ".ma",
+        ".mb",
+        ".skp",
+        ".gltf",
+        ".glb",
+        ".dae",
+        ".stl",
+        ".usd",
+        ".usdz",
+        ".abc",
+    )
+)
+TEXTURE_EXTENSIONS = frozenset(
+    (
+        ".jpg",
+        ".jpeg",
+        ".png",
+        ".tga",
+        ".tif",
+        ".tiff",
+        ".exr",
+        ".hdr",
+        ".bmp",
+        ".dds",
+        ".psd",
+        ".webp",
+    )
+)
+
+DEFAULT_MAX_ENTRIES = 100000  # limit wpisów RAR (każdy nagłówek to osobny odczyt)
+DEFAULT_MAX_HEADER_BYTES = 32 * 1024 * 1024  # limit nagłówka 7z
+TOP_EXTENSIONS = 10  # ile najczęstszych rozszerzeń zapisywać w rekordzie
+
+SEVENZIP_SIGNATURE = b"7z\xbc\xaf\x27\x1c"
+RAR5_SIGNATURE = b"Rar!\x1a\x07\x01\x00"
+RAR4_SIGNATURE = b"Rar!\x1a\x07\x00"
+
+
+class ArchiveFormatError(ValueError):
+    """Nagłówki archiwum są nieczytelne lub nieobsługiwane."""
+
+
+class ArchiveEntry:
+    """Plik w archiwum: nazwa, rozmiar po rozpakowaniu i flagi."""
+
+    __slots__ = ("name", "size_bytes", "is_dir", "encrypted")
+
+    def __init__(self, name, size_bytes, is_dir=False, encrypted=False):
+        self.name = name
+        self.size_bytes = size_bytes
+        self.is_dir = is_dir
+        self.encrypted = encrypted
+
+
+def get_inspector_settings(config=None):
+    """
+    Zwraca ustawienia inspektora archiwów z sekcji archive_inspector
+    (config: migawka konfiguracji przebiegu, None = bieżąca).
+    """
+    settings = config_manager.get_config_value("archive_inspector", {}, config) or {}
+    return {
+        "enabled": bool(settings.get("enabled", True)),
+        "max_entries": int(settings.get("max_entries", DEFAULT_MAX_ENTRIES)),
+        "max_header_bytes": int(
+            settings.get("max_header_mb", DEFAULT_MAX_HEADER_BYTES // (1024 * 1024))
+        )
+        * 1024
+        * 1024,
+    }
+
+
+def is_archive_extension(extension):
+    return extension in ARCHIVE_EXTENSIONS
+
+
+# --- ZIP ------------------------------------------------------------------
+
+
+def list_zip(archive_file, max_entries, max_header_bytes):
+    """Czyta tylko katalog centralny ZIP (zipfile nie otwiera danych plików)."""
+    try:
+        with zipfile.ZipFile(archive_file) as archive:
+            return [
+                ArchiveEntry(
+                    info.filename,
+                    info.file_size,
+                    info.is_dir(),
+                    bool(info.flag_bits & 0x1),
+                )
+                for info in archive.infolist()[:max_entries]
+            ]
+    except zipfile.BadZipFile as e:
+        raise ArchiveFormatError(str(e)) from e
+
+
+# --- 7z -------------------------------------------------------------------
+
+SEVENZIP_CODER_COPY = b"\x00"
+SEVENZIP_CODER_LZMA = b"\x03\x01\x01"
+SEVENZIP_CODER_LZMA2 = b"\x21"
+SEVENZIP_CODER_AES = b"\x06\xf1\x07\x01"
+
+(
+    K_END,
+    K_HEADER,
+    K_ARCHIVE_PROPERTIES,
+    K_ADDITIONAL_STREAMS_INFO,
+    K_MAIN_STREAMS_INFO,
+    K_FILES_INFO,
+    K_PACK_INFO,
+    K_UNPACK_INFO,
+    K_SUBSTREAMS_INFO,
+    K_SIZE,
+    K_CRC,
+    K_FOLDER,
+    K_CODERS_UNPACK_SIZE,
+    K_NUM_UNPACK_STREAM,
+    K_EMPTY_STREAM,
+    K_EMPTY_FILE,
+) = range(16)
+K_NAME = 0x11
+K_ENCODED_HEADER = 0x17
+
+
+class _SevenZipFolder:
+    __slots__ = ("coders", "bind_pair_out", "unpack_sizes", "crc_defined")
+
+    def __init__(self):
+        self.coders = []  # (id, właściwości)
+        self.bind_pair_out = set()
+        self.unpack_sizes = []
+        self.crc_defined = False
+
+    @property
+    def unpack_size(self):
+        # Rozmiar strumienia wyjściowego, który nie jest wejściem innego kodera
+        for index, size in enumerate(self.unpack_sizes):
+            if index not in self.bind_pair_out:
+                return size
+        return 0
+
+    @property
+    def encrypted(self):
+        return any(coder_id == SEVENZIP_CODER_AES for coder_id, _ in self.coders)
+
+
+class _SevenZipReader:
+    """Parser nagłówka 7z (format opisany w 7zFormat.txt z dystrybucji 7-Zip)."""
+
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def byte(self):
+        if self.position >= len(self.data):
+            raise ArchiveFormatError("niepełny nagłówek 7z")
+        value = self.data[self.position]
+        self.position += 1
+        return value
+
+    def read(self, count):
+        if self.position + count > len(self.data):
+            raise ArchiveFormatError("niepełny nagłówek 7z")
+        value = self.data[self.position : self.position + count]
+        self.position += count
+        return value
+
+    def number(self):
+        first = self.byte()
+        mask = 0x80
+        value = 0
+        for index in range(8):
+            if not first & mask:
+                return value | ((first & (mask - 1)) << (8 * index))
+            value |= self.byte() << (8 * index)
+            mask >>= 1
+        return value
+
+    def bits(self, count):
+        """Wektor bitów (najstarszy bit pierwszy)."""
+        result = []
+        current = mask = 0
+        for _ in range(count):
+            if not mask:
+                current = self.byte()
+                mask = 0x80
+            result.append(bool(current & mask))
+            mask >>= 1
+        return result
+
+    def defined_bits(self, count):
+        """Wektor z bajtem 'wszystkie zdefiniowane' na początku."""
+        if self.byte():
+            return [True] * count
+        return self.bits(count)
+
+    def expect(self, property_id):
+        if self.number() != property_id:
+            raise ArchiveFormatError("nieoczekiwana właściwość nagłówka 7z")
+
+    def skip_digests(self, count):
+        defined = self.defined_bits(count)
+        self.read(4 * sum(defined))
+        return defined
+
+    def pack_info(self):
+        pack_position = self.number()
+        pack_count = self.number()
+        pack_sizes = []
+        while True:
+            property_id = self.number()
+            if property_id == K_END:
+                return pack_position, pack_sizes
+            if property_id == K_SIZE:
+                pack_sizes = [self.number() for _ in range(pack_count)]
+            elif property_id == K_CRC:
+                self.skip_digests(pack_count)
+            else:
+                raise ArchiveFormatError("nieznana właściwość PackInfo 7z")
+
+    def folder(self):
+        folder = _SevenZipFolder()
+        total_in = total_out = 0
+        for _ in range(self.number()):
+            flags = self.byte()
+            coder_id = self.read(flags & 0x0F)
+            in_count = out_count = 1
+            if flags & 0x10:
+                in_count = self.number()
+                out_count = self.number()
+            properties = self.read(self.number()) if flags & 0x20 else b""
+            folder.coders.append((coder_id, properties))
+            total_in += in_count
+            total_out += out_count
+        for _ in range(total_out - 1):
+            self.number()  # indeks wejścia
+            folder.bind_pair_out.add(self.number())
+        packed_count = total_in - (total_out - 1)
+        if packed_count > 1:
+            for _ in range(packed_count):
+                self.number()
+        folder.unpack_sizes = [0] * total_out
+        return folder
+
+    def unpack_info(self):
+        self.expect(K_FOLDER)
+        folder_count = self.number()
+        if self.byte():
+            raise ArchiveFormatError("zewnętrzne foldery 7z nie są obsługiwane")
+        folders = [self.folder() for _ in range(folder_count)]
+        self.expect(K_CODERS_UNPACK_SIZE)
+        for folder in folders:
+            folder.unpack_sizes = [self.number() for _ in folder.unpack_sizes]
+        while True:
+            property_id = self.number()
+            if property_id == K_END:
+                return folders
+            if property_id == K_CRC:
+                for folder, defined in zip(folders, self.skip_digests(folder_count)):
+                    folder.crc_defined = defined
+            else:
+                raise ArchiveFormatError("nieznana właściwość UnPackInfo 7z")
+
+    def substreams_info(self, folders):
+        stream_counts = [1] * len(folders)
+        property_id = self.number()
+        if property_id == K_NUM_UNPACK_STREAM:
+            stream_counts = [self.number() for _ in folders]
+            property_id = self.number()
+
+        sizes = []
+        for folder, stream_count in zip(folders, stream_counts):
+            if not stream_count:
+                continue
+            folder_sizes = []
+            if property_id == K_SIZE:
+                folder_sizes = [self.number() for _ in range(stream_count - 1)]
+            folder_sizes.append(folder.unpack_size - sum(folder_sizes))
+            sizes.extend(folder_sizes)
+        if property_id == K_SIZE:
+            property_id = self.number()
+
+        while property_id != K_END:
+            if property_id != K_CRC:
+                raise ArchiveFormatError("nieznana właściwość SubStreamsInfo 7z")
+            digest_count = sum(
+                count
+                for folder, count in zip(folders, stream_counts)
+                if not (count == 1 and folder.crc_defined)
+            )
+            self.skip_digests(digest_count)
+            property_id = self.number()
+        return sizes, stream_counts
+
+    def streams_info(self):
+        """Zwraca (pozycja spakowanych danych, rozmiary, foldery, rozmiary plików)."""
+        pack_position, pack_sizes, folders = 0, [], []
+        sizes, stream_counts = None, None
+        while True:
+            property_id = self.number()
+            if property_id == K_END:
+                break
+            if property_id == K_PACK_INFO:
+                pack_position, pack_sizes = self.pack_info()
+            elif property_id == K_UNPACK_INFO:
+                folders = self.unpack_info()
+            elif property_id == K_SUBSTREAMS_INFO:
+                sizes, stream_counts = self.substreams_info(folders)
+            else:
+                raise ArchiveFormatError("nieznana właściwość StreamsInfo 7z")
+        if sizes is None:
+            sizes = [folder.unpack_size for folder in folders]
+            stream_counts = [1] * len(folders)
+        return pack_position, pack_sizes, folders, sizes, stream_counts
+
+    def skip_properties(self):
+        while self.number() != K_END:
+            self.read(self.number())
+
+    def files_info(self, sizes, folders, stream_counts):
+        file_count = self.number()
+        empty_stream = [False] * file_count
+        empty_file = []
+        names = [""] * file_count
+        while True:
+            property_id = self.number()
+            if property_id == K_END:
+                break
+            size = self.number()
+            end = self.position + size
+            if property_id == K_EMPTY_STREAM:
+                empty_stream = self.bits(file_count)
+            elif property_id == K_EMPTY_FILE:
+                empty_file = self.bits(sum(empty_stream))
+            elif property_id == K_NAME:
+                if self.byte():
+                    raise ArchiveFormatError("zewnętrzne nazwy 7z nie są obsługiwane")
+                raw_names = self.read(end - self.position).decode("utf-16-le")
+                names = raw_names.split("\x00")[:file_count]
+            self.position = end
+
+        # Szyfrowanie strumieni plików (folder po folderze)
+        stream_encrypted = []
+        for folder, stream_count in zip(folders, stream_counts):
+            stream_encrypted.extend([folder.encrypted] * stream_count)
+
+        entries = []
+        stream_index = empty_index = 0
+        for index in range(file_count):
+            if empty_stream[index]:
+                is_dir = not (empty_index < len(empty_file) and empty_file[empty_index])
+                empty_index += 1
+                entries.append(ArchiveEntry(names[index], 0, is_dir))
+                continue
+            size_bytes = sizes[stream_index] if stream_index < len(sizes) else 0
+            encrypted = (
+                stream_encrypted[stream_index]
+                if stream_index < len(stream_encrypted)
+                else False
+            )
+            stream_index += 1
+            entries.append(ArchiveEntry(names[index], size_bytes, False, encrypted))
+        return entries
+
+    def header(self):
+        property_id = self.number()
+        if property_id == K_ARCHIVE_PROPERTIES:
+            self.skip_properties()
+            property_id = self.number()
+        if property_id == K_ADDITIONAL_STREAMS_INFO:
+            self.streams_info()
+            property_id = self.number()
+        sizes, folders, stream_counts = [], [], []
+        if property_id == K_MAIN_STREAMS_INFO:
+            _, _, folders, sizes, stream_counts = self.streams_info()
+            property_id = self.number()
+        if property_id == K_FILES_INFO:
+            return self.files_info(sizes, folders, stream_counts)
+        return []
+
+
+def _decode_7z_header(archive_file, reader, max_header_bytes):
+    """Rozpakowuje zakodowany (skompresowany) nagłówek 7z."""
+    pack_position, pack_sizes, folders, _, _ = reader.streams_info()
+    if not folders or not pack_sizes:
+        raise ArchiveFormatError("pusty zakodowany nagłówek 7z")
+    folder = folders[0]
+    if folder.encrypted:
+        raise ArchiveFormatError("zaszyfrowane nagłówki 7z")
+    if len(folder.coders) != 1:
+        raise ArchiveFormatError("nieobsługiwany łańcuch koderów nagłówka 7z")
+    if pack_sizes[0] > max_header_bytes or folder.unpack_size > max_header_bytes:
+        raise ArchiveFormatError("nagłówek 7z przekracza limit")
+
+    archive_file.seek(32 + pack_position)
+    packed = archive_file.read(pack_sizes[0])
+    coder_id, properties = folder.coders[0]
+    if coder_id == SEVENZIP_CODER_COPY:
+        return packed
+    if coder_id == SEVENZIP_CODER_LZMA and len(properties) >= 5:
+        literal_bits = properties[0] % 9
+        remainder = properties[0] // 9
+        lzma_filter = {
+            "id": lzma.FILTER_LZMA1,
+            "lc": literal_bits,
+            "lp": remainder % 5,
+            "pb": remainder // 5,
+            "dict_size": struct.unpack("<I", properties[1:5])[0],
+        }
+    elif coder_id == SEVENZIP_CODER_LZMA2 and properties:
+        dict_bits = properties[0]
+        lzma_filter = {
+            "id": lzma.FILTER_LZMA2,
+            "dict_size": (2 | (dict_bits & 1)) << (dict_bits // 2 + 11),
+        }
+    else:
+        raise ArchiveFormatError("nieobsługiwana kompresja nagłówka 7z")
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=[lzma_filter])
+    try:
+        return decompressor.decompress(packed, max_length=folder.unpack_size)
+    except lzma.LZMAError as e:
+        raise ArchiveFormatError(f"uszkodzony nagłówek 7z: {e}") from e
+
+
+def list_7z(archive_file, max_entries, max_header_bytes):
+    """Czyta nagłówek 7z z końca archiwum (dwa odczyty + ewentualna dekompresja)."""
+    start_header = archive_file.read(32)
+    if len(start_header) < 32 or not start_header.startswith(SEVENZIP_SIGNATURE):
+        raise ArchiveFormatError("brak sygnatury 7z")
+    next_offset, next_size = struct.unpack("<QQ", start_header[12:28])
+    if next_size == 0:
+        return []
+    if next_size > max_header_bytes:
+        raise ArchiveFormatError("nagłówek 7z przekracza limit")
+    archive_file.seek(32 + next_offset)
+    header = archive_file.read(next_size)
+    if len(header) < next_size:
+        raise ArchiveFormatError("obcięte archiwum 7z")
+
+    reader = _SevenZipReader(header)
+    for _ in range(4):  # nagłówek może być zakodowany wielokrotnie
+        property_id = reader.number()
+        if property_id == K_HEADER:
+            return reader.header()[:max_entries]
+        if property_id != K_ENCODED_HEADER:
+            raise ArchiveFormatError("nieznany typ nagłówka 7z")
+        reader = _SevenZipReader(
+            _decode_7z_header(archive_file, reader, max_header_bytes)
+        )
+    raise ArchiveFormatError("zbyt wiele poziomów kodowania nagłówka 7z")
+
+
+# --- RAR ------------------------------------------------------------------
+
+
+def _read_vint(data, position):
+    """Liczba zmiennej długości RAR5; zwraca (wartość, nowa pozycja)."""
+    value = shift = 0
+    while True:
+        if position >= len(data):
+            raise ArchiveFormatError("niepełny nagłówek RAR")
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def list_rar5(archive_file, max_entries):
+    """
+    Przechodzi po nagłówkach bloków RAR5, przeskakując dane plików
+    przez seek - odczytywane są tylko nagłówki.
+    """
+    entries = []
+    position = len(RAR5_SIGNATURE)
+    while len(entries) < max_entries:
+        archive_file.seek(position)
+        prefix = archive_file.read(7)  # CRC32 + rozmiar nagłówka (do 3 bajtów)
+        if len(prefix) < 5:
+            break
+        header_size, data_start = _read_vint(prefix, 4)
+        header = prefix[data_start:] + archive_file.read(
+            max(0, header_size - (len(prefix) - data_start))
+        )
+        header = header[:header_size]
+        if len(header) < header_size:
+            raise ArchiveFormatError("obcięte archiwum RAR")
+
+        header_type, offset = _read_vint(header, 0)
+        header_flags, offset = _read_vint(header, offset)
+        extra_size = data_size = 0
+        if header_flags & 0x01:
+            extra_size, offset = _read_vint(header, offset)
+        if header_flags & 0x02:
+            data_size, offset = _read_vint(header, offset)
+
+        if header_type == 4:
+            raise ArchiveFormatError("zaszyfrowane nagłówki RAR")
+        if header_type == 5:  # koniec archiwum
+            break
+        # Plik kontynuowany z poprzedniego woluminu jest liczony tylko raz
+        if header_type == 2 and not header_flags & 0x08:
+            file_flags, offset = _read_vint(header, offset)
+            unpacked_size, offset = _read_vint(header, offset)
+            _, offset = _read_vint(header, offset)  # atrybuty
+            if file_flags & 0x02:
+                offset += 4  # mtime
+            if file_flags & 0x04:
+                offset += 4  # CRC32
+            _, offset = _read_vint(header, offset)  # informacje o kompresji
+            _, offset = _read_vint(header, offset)  # system
+            name_length, offset = _read_vint(header, offset)
+            name = header[offset : offset + name_length].decode("utf-8", "replace")
+            offset += name_length
+
+            encrypted = False
+            extra_end = offset + extra_size
+            while offset < extra_end:
+                record_size, record_start = _read_vint(header, offset)
+                record_type, _ = _read_vint(header, record_start)
+                encrypted = encrypted or record_type == 0x01
+                offset = record_start + record_size
+            if file_flags & 0x08:  # rozmiar nieznany
+                unpacked_size = 0
+            entries.append(
+                ArchiveEntry(name, unpacked_size, bool(file_flags & 0x01), encrypted)
+            )
+        position += data_start + header_size + data_size
+    return entries
+
+
+def list_rar4(archive_file, max_entries):
+    """Przechodzi po blokach RAR 2.9-4.x (nagłówki + seek nad danymi)."""
+    entries = []
+    position = len(RAR4_SIGNATURE)
+    while len(entries) < max_entries:
+        archive_file.seek(position)
+        block = archive_file.read(7)
+        if len(block) < 7:
+            break
+        _, header_type, header_flags, header_size = struct.unpack("<HBHH", block)
+        if header_size < 7:
+            raise ArchiveFormatError("uszkodzony nagłówek RAR")
+        header = block + archive_file.read(header_size - 7)
+        if len(header) < header_size:
+            raise ArchiveFormatError("obcięte archiwum RAR")
+
+        add_size = 0
+        if header_type == 0x73 and header_flags & 0x0080:
+            raise ArchiveFormatError("zaszyfrowane nagłówki RAR")
+        if header_type == 0x7B:  # koniec archiwum
+            break
+        if header_type == 0x74:
+            pack_size, unpacked_size = struct.unpack("<II", header[7:15])
+            name_size = struct.unpack("<H", header[26:28])[0]
+            name_offset = 32
+            if header_flags & 0x0100:  # rozmiary 64-bitowe
+                high_pack, high_unpacked = struct.unpack("<II", header[32:40])
+                pack_size |= high_pack << 32
+                unpacked_size |= high_unpacked << 32
+                name_offset = 40
+            raw_name = header[name_offset : name_offset + name_size]
+            if header_flags & 0x0200:  # nazwa Unicode: część ASCII przed \0
+                raw_name = raw_name.split(b"\x00", 1)[0]
+                name = raw_name.decode("utf-8", "replace")
+            else:
+                name = raw_name.decode("cp437", "replace")
+            add_size = pack_size
+            if not header_flags & 0x0001:
+                entries.append(
+                    ArchiveEntry(
+                        name.replace("\\", "/"),
+                        unpacked_size,
+                        header_flags & 0x00E0 == 0x00E0,
+                        bool(header_flags & 0x0004),
+                    )
+                )
+        elif header_flags & 0x8000:
+            add_size = struct.unpack("<I", header[7:11])[0]
+        position += header_size + add_size
+    return entries
+
+
+def list_rar(archive_file, max_entries, max_header_bytes):
+    signature = archive_file.read(len(RAR5_SIGNATURE))
+    if signature == RAR5_SIGNATURE:
+        return list_rar5(archive_file, max_entries)
+    if signature.startswith(RAR4_SIGNATURE):
+        return list_rar4(archive_file, max_entries)
+    raise ArchiveFormatError("brak sygnatury RAR")
+
+
+# --- Podsumowanie ----------------------------------------------------------
+
+
+def list_archive(archive_path, max_entries=DEFAULT_MAX_ENTRIES, max_header_bytes=None):
+    """
+    Zwraca listę ArchiveEntry archiwum ZIP/7z/RAR czytając wyłącznie
+    nagłówki (katalog centralny ZIP, nagłówek 7z, nagłówki bloków RAR).
+    Format jest rozpoznawany po sygnaturze, nie po rozszerzeniu.
+    """
+    if max_header_bytes is None:
+        max_header_bytes = DEFAULT_MAX_HEADER_BYTES
+    with open(archive_path, "rb") as archive_file:
+        signature = archive_file.read(8)
+        archive_file.seek(0)
+        if signature.startswith(SEVENZIP_SIGNATURE):
+            return "7z", list_7z(archive_file, max_entries, max_header_bytes)
+        if signature.startswith(RAR4_SIGNATURE) or signature == RAR5_SIGNATURE:
+            return "rar", list_rar(archive_file, max_entries, max_header_bytes)
+        if signature.startswith(b"PK"):
+            return "zip", list_zip(archive_file, max_entries, max_header_bytes)
+    raise ArchiveFormatError("nieznany format archiwum")
+
+
+def get_entry_extension(name):
+    base_name = name.rstrip("/").rsplit("/", 1)[-1]
+    _, extension = os.path.splitext(base_name)
+    return extension.lower()
+
+
+def summarize_entries(archive_type, entries, max_entries=DEFAULT_MAX_ENTRIES):
+    """Buduje podsumowanie zawartości zapisywane w rekordzie pliku."""
+    extension_counts = {}
+    uncompressed_size = 0
+    file_count = 0
+    encrypted = False
+    for entry in entries:
+        if entry.is_dir:
+            continue
+        file_count += 1
+        uncompressed_size += entry.size_bytes
+        encrypted = encrypted or entry.encrypted
+        extension = get_entry_extension(entry.name)
+        if extension:
+            extension_counts[extension] = extension_counts.get(extension, 0) + 1
+
+    top_extensions = sorted(
+        extension_counts.items(), key=lambda item: (-item[1], item[0])
+    )[:TOP_EXTENSIONS]
+    return {
+        "type": archive_type,
+        "file_count": file_count,
+        "uncompressed_size_bytes": uncompressed_size,
+        "model_formats": sorted(
+            extension for extension in extension_counts if extension in MODEL_EXTENSIONS
+        ),
+        "texture_count": sum(
+            count
+            for extension, count in extension_counts.items()
+            if extension in TEXTURE_EXTENSIONS
+        ),
+        "extensions": dict(top_extensions),
+        "encrypted": encrypted,
+        "truncated_listing": len(entries) >= max_entries,
+    }
+
+
+def inspect_archive(archive_path, size_bytes=None, settings=None):
+    """
+    Zwraca podsumowanie zawartości archiwum albo słownik z polem error,
+    jeśli nagłówków nie da się odczytać.
+    """
+    settings = settings or get_inspector_settings()
+    try:
+        archive_type, entries = list_archive(
+            archive_path, settings["max_entries"], settings["max_header_bytes"]
+        )
+        return summarize_entries(archive_type, entries, settings["max_entries"])
+    except (ArchiveFormatError, struct.error, UnicodeDecodeError) as e:
+        return {"error": str(e) or "nieczytelne nagłówki archiwum"}
+    except OSError as e:
+        return {"error": f"błąd odczytu: {e}"}
+
+
+def get_archive_cache():
+    """Zwraca współdzieloną pamięć zawartości archiwów (w katalogu baz)."""
+    return file_cache.get_file_cache(ARCHIVE_CACHE_FILE)
+
+
+def inspect_archives(archive_entries, archive_cache=None, settings=None):
+    """
+    Zwraca {ścieżka: podsumowanie} dla wpisów migawki folderu. Archiwa
+    o niezmienionym rozmiarze i mtime są brane z pamięci bez otwierania.
+    """
+    settings = settings or get_inspector_settings()
+    return file_cache.read_with_cache(
+        archive_entries,
+        lambda archive_path, size_bytes: inspect_archive(
+            archive_path, size_bytes, settings
+        ),
+        archive_cache,
+        is_flagged=lambda summary: "error" in summary,
+    )
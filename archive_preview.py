@@ -0,0 +1,259 @@
+# archive_preview.py
+import hashlib
+import logging
+import os
+import time
+import zipfile
+import zlib
+
+import config_manager
+import file_cache
+import image_metadata
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PREVIEW_CACHE_FILE = "archive_previews.sqlite"
+DEFAULT_PREVIEW_DIR = os.path.join("_gallery_cache", "_archive_previews")
+DEFAULT_MAX_IMAGE_BYTES = 20 * 1024 * 1024
+DEFAULT_TIMEOUT_SECONDS = 5.0
+CHUNK_SIZE = 256 * 1024
+MAX_CANDIDATES = 3  # ile obrazów z archiwum próbować, zanim uznamy brak podglądu
+
+# Rozpakowywane są tylko archiwa ZIP - 7z (bloki solid) i RAR (kompresja
+# zamknięta) wymagałyby zewnętrznego dekompresora
+EXTRACTABLE_EXTENSIONS = (".zip",)
+# Formaty wyświetlane przez przeglądarkę i rozpoznawane przez image_metadata
+PREVIEW_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+PREVIEW_KEYWORDS = ("preview", "render", "thumb", "cover", "podglad", "podgląd")
+# Mapy tekstur - wybierane jako podgląd tylko w ostateczności
+TEXTURE_KEYWORDS = (
+    "diffuse",
+    "albedo",
+    "normal",
+    "bump",
+    "rough",
+    "specular",
+    "gloss",
+    "metal",
+    "displace",
+    "height",
+    "opacity",
+    "_ao",
+    "_nrm",
+)
+# Błędy pojedynczego pliku w archiwum - próbowany jest wtedy kolejny obraz
+# (NotImplementedError: nieobsługiwana metoda kompresji)
+MEMBER_ERRORS = (ValueError, NotImplementedError, zipfile.BadZipFile, zlib.error)
+
+
+class PreviewExtractionTimeout(Exception):
+    """Rozpakowanie podglądu przekroczyło limit czasu."""
+
+
+def get_preview_settings(config=None):
+    """
+    Zwraca ustawienia podglądów z archiwów z sekcji archive_previews
+    (config: migawka konfiguracji przebiegu, None = bieżąca).
+    """
+    settings = config_manager.get_config_value("archive_previews", {}, config) or {}
+    return {
+        "enabled": bool(settings.get("enabled", True)),
+        "directory": settings.get("directory", DEFAULT_PREVIEW_DIR),
+        "max_image_bytes": int(
+            settings.get("max_image_mb", DEFAULT_MAX_IMAGE_BYTES // (1024 * 1024))
+        )
+        * 1024
+        * 1024,
+        "timeout_seconds": float(
+            settings.get("timeout_seconds", DEFAULT_TIMEOUT_SECONDS)
+        ),
+    }
+
+
+def can_extract(extension):
+    return extension in EXTRACTABLE_EXTENSIONS
+
+
+def score_entry(entry_name, size_bytes, archive_stem):
+    """
+    Ocena obrazu z archiwum jako podglądu (większa = lepsza): najpierw
+    nazwa (słowa typu preview/render albo nazwa archiwum, mapy tekstur na
+    końcu), potem płytkość w drzewie archiwum, na końcu rozmiar (większy
+    render zwykle lepiej wygląda).
+    """
+    stem = os.path.splitext(entry_name.rsplit("/", 1)[-1])[0].lower()
+    if stem == archive_stem or any(keyword in stem for keyword in PREVIEW_KEYWORDS):
+        name_score = 2
+    elif any(keyword in stem for keyword in TEXTURE_KEYWORDS):
+        name_score = 0
+    else:
+        name_score = 1
+    return name_score, -entry_name.strip("/").count("/"), size_bytes
+
+
+def get_preview_base(preview_dir, archive_path):
+    """Wspólny przedrostek plików podglądu archiwum (skrót ścieżki)."""
+    key = hashlib.sha1(archive_path.encode("utf-8")).hexdigest()
+    return os.path.join(preview_dir, key[:2], key)
+
+
+def _remove_previous_previews(preview_base, keep_path):
+    """Usuwa podglądy wcześniejszych wersji archiwum (inny rozmiar/mtime)."""
+    preview_dir = os.path.dirname(preview_base)
+    prefix = os.path.basename(preview_base) + "_"
+    try:
+        names = os.listdir(preview_dir)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(preview_dir, name)
+        if name.startswith(prefix) and path != keep_path:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Nie można usunąć starego podglądu {path}: {e}")
+
+
+def _copy_member(archive, info, target_path, max_bytes, deadline):
+    """
+    Strumieniowo kopiuje plik z archiwum porcjami CHUNK_SIZE, pilnując
+    limitu bajtów (także gdy nagłówek zaniża rozmiar) i czasu.
+    """
+    temp_path = f"{target_path}.{os.getpid()}.tmp"
+    copied = 0
+    try:
+        with archive.open(info) as source, open(temp_path, "wb") as target:
+            while True:
+                if time.monotonic() > deadline:
+                    raise PreviewExtractionTimeout(info.filename)
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                copied += len(chunk)
+                if copied > max_bytes:
+                    raise ValueError(f"obraz większy niż {max_bytes} bajtów")
+                target.write(chunk)
+        os.replace(temp_path, target_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def extract_archive_preview(archive_path, size_bytes, mtime_ns, settings=None):
+    """
+    Wyciąga najlepszy obraz z archiwum ZIP do pamięci podglądów.
+    Nazwa pliku zawiera skrót ścieżki oraz rozmiaru i mtime archiwum,
+    więc zmienione archiwum dostaje nowy podgląd. Zwraca
+    {entry, preview_path}, {entry: None} gdy archiwum nie ma obrazów
+    albo {error} przy błędzie lub przekroczeniu limitu czasu.
+    """
+    settings = settings or get_preview_settings()
+    deadline = time.monotonic() + settings["timeout_seconds"]
+    archive_stem = os.path.splitext(os.path.basename(archive_path))[0].lower()
+    preview_dir = os.path.abspath(settings["directory"])
+    preview_base = get_preview_base(preview_dir, archive_path)
+    version = hashlib.sha1(f"{size_bytes}|{mtime_ns}".encode("utf-8")).hexdigest()
+    try:
+        with zipfile.ZipFile(archive_path) as archive:
+            candidates = [
+                info
+                for info in archive.infolist()
+                if not info.is_dir()
+                and not info.flag_bits & 0x1  # zaszyfrowane
+                and 0 < info.file_size <= settings["max_image_bytes"]
+                and os.path.splitext(info.filename)[1].lower()
+                in PREVIEW_IMAGE_EXTENSIONS
+            ]
+            candidates.sort(
+                key=lambda info: score_entry(
+                    info.filename, info.file_size, archive_stem
+                ),
+                reverse=True,
+            )
+            for info in candidates[:MAX_CANDIDATES]:
+                extension = os.path.splitext(info.filename)[1].lower()
+                preview_path = f"{preview_base}_{version[:12]}{extension}"
+                os.makedirs(os.path.dirname(preview_path), exist_ok=True)
+                try:
+                    _copy_member(
+                        archive,
+                        info,
+                        preview_path,
+                        settings["max_image_bytes"],
+                        deadline,
+                    )
+                except MEMBER_ERRORS as e:
+                    logger.debug(f"Pominięto {info.filename} z {archive_path}: {e}")
+                    continue
+                metadata = image_metadata.read_image_metadata(preview_path)
+                if metadata["corrupt"]:
+                    os.remove(preview_path)
+                    continue
+                _remove_previous_previews(preview_base, preview_path)
+                return {"entry": info.filename, "preview_path": preview_path}
+    except PreviewExtractionTimeout as e:
+        logger.warning(f"Przekroczono limit czasu podglądu {e} z {archive_path}")
+        return {"error": "przekroczono limit czasu rozpakowania"}
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, EOFError) as e:
+        return {"error": str(e) or "nieczytelne archiwum"}
+    except OSError as e:
+        return {"error": f"błąd odczytu: {e}"}
+    return {"entry": None}
+
+
+def get_archive_preview_cache():
+    """Zwraca współdzieloną pamięć wyników rozpakowania (w katalogu baz)."""
+    return file_cache.get_file_cache(ARCHIVE_PREVIEW_CACHE_FILE)
+
+
+def extract_previews(archive_entries, preview_cache=None, settings=None):
+    """
+    Zwraca {ścieżka archiwum: wpis migawki podglądu (path, size_bytes,
+    mtime_ns) + entry} dla archiwów, z których udało się wyciągnąć obraz.
+    Niezmienione archiwa (rozmiar i mtime) nie są otwierane ponownie,
+    chyba że ich podgląd zniknął z pamięci podglądów.
+    """
+    settings = settings or get_preview_settings()
+    archive_versions = {
+        os.path.abspath(entry["path"]): (entry["size_bytes"], entry["mtime_ns"])
+        for entry in archive_entries
+    }
+
+    def extract(archive_path, size_bytes=None):
+        return extract_archive_preview(
+            archive_path, *archive_versions[archive_path], settings
+        )
+
+    results = file_cache.read_with_cache(
+        archive_entries,
+        extract,
+        preview_cache,
+        is_flagged=lambda result: "error" in result,
+    )
+
+    previews = {}
+    refreshed = []
+    for archive_path, result in results.items():
+        if not result.get("preview_path"):
+            continue
+        if not os.path.exists(result["preview_path"]):
+            # Podgląd usunięty z pamięci (np. czyszczenie _gallery_cache)
+            result = extract(archive_path)
+            refreshed.append(
+                (archive_path, *archive_versions[archive_path], result, False)
+            )
+            if not result.get("preview_path"):
+                continue
+        try:
+            preview_stat = os.stat(result["preview_path"])
+        except OSError:
+            continue
+        previews[archive_path] = {
+            "path": result["preview_path"],
+            "entry": result["entry"],
+            "size_bytes": preview_stat.st_size,
+            "mtime_ns": preview_stat.st_mtime_ns,
+        }
+    if refreshed and preview_cache is not None:
+        preview_cache.put_many(refreshed)
+    return previews
@@ -0,0 +1,551 @@
+# catalog.py
+import functools
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import config_manager
+import index_stream
+
+logger = logging.getLogger(__name__)
+
+# Domyślny katalog baz (lokalnie, obok _gallery_cache i logs)
+DEFAULT_CATALOG_DIR = "_catalog"
+# Tyle folderów jest zapisywanych w jednej transakcji
+CATALOG_BATCH_SIZE = 200
+# Zmiana schematu = baza jest budowana od nowa przy następnym skanowaniu
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    path TEXT PRIMARY KEY,
+    parent_path TEXT,
+    name TEXT NOT NULL,
+    total_size_bytes INTEGER NOT NULL DEFAULT 0,
+    file_count INTEGER NOT NULL DEFAULT 0,
+    subdir_count INTEGER NOT NULL DEFAULT 0,
+    timed_out INTEGER NOT NULL DEFAULT 0,
+    signature TEXT,
+    content_hash TEXT,
+    folder_info TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent_path);
+
+CREATE TABLE IF NOT EXISTS files (
+    folder_path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL DEFAULT 0,
+    size_readable TEXT,
+    extension TEXT,
+    extra TEXT,
+    PRIMARY KEY (folder_path, kind, position)
+);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+
+CREATE TABLE IF NOT EXISTS matches (
+    file_path TEXT PRIMARY KEY,
+    folder_path TEXT NOT NULL,
+    preview_path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS matches_folder ON matches (folder_path);
+"""
+
+# Rodzaje wpisów w tabeli files
+KIND_FILE = "file"  # archiwa i inne pliki (files_with/without_previews)
+KIND_IMAGE = "image"  # obrazy niebędące podglądami (other_images)
+
+# Pola rekordu zapisywane w osobnych kolumnach; pozostałe trafiają do extra
+RECORD_COLUMNS = ("name", "path_absolute", "size_bytes", "size_readable", "extension")
+MATCH_FIELDS = ("preview_found", "preview_name", "preview_path_absolute")
+
+# Odczyt sekcji folderu porcjami (duże foldery nie trafiają naraz do pamięci)
+READ_BATCH_SIZE = 1000
+SECTION_FROM = (
+    "FROM files LEFT JOIN matches ON matches.file_path = files.path "
+    "AND matches.folder_path = files.folder_path "
+    "WHERE files.folder_path = ? AND files.kind = ?"
+)
+
+
+def is_catalog_enabled(config=None):
+    return bool(config_manager.get_config_value("catalog.enabled", True, config))
+
+
+def get_catalog_dir():
+    return config_manager.get_config_value("catalog.directory", DEFAULT_CATALOG_DIR)
+
+
+def should_export_index_json(config=None):
+    """Czy zapisywać index.json w folderach (zawsze, gdy katalog jest wyłączony)."""
+    if not is_catalog_enabled(config):
+        return True
+    return bool(
+        config_manager.get_config_value("catalog.export_index_json", True, config)
+    )
+
+
+def get_catalog_path(root_folder_path, catalog_dir=None):
+    """Zwraca ścieżkę bazy folderu roboczego (nazwa + skrót pełnej ścieżki)."""
+    root_folder_path = os.path.abspath(root_folder_path)
+    digest = hashlib.md5(root_folder_path.encode("utf-8")).hexdigest()[:12]
+    name = os.path.basename(root_folder_path.rstrip("\\/")) or "root"
+    name = "".join(c if c.isalnum() or c in "-_" else "_" for c in name)
+    return os.path.join(catalog_dir or get_catalog_dir(), f"{name}_{digest}.sqlite")
+
+
+def is_path_within(path, root_path):
+    path = os.path.abspath(path)
+    root_path = os.path.abspath(root_path)
+    return path == root_path or path.startswith(root_path.rstrip(os.sep) + os.sep)
+
+
+def escape_like(value):
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class Catalog:
+    """
+    Baza SQLite z wynikami skanowania jednego folderu roboczego: foldery
+    (z folder_info), pliki i dopasowania podglądów.
+    Zapisy z wątków skanera są buforowane i zatwierdzane partiami po
+    batch_size folderów w jednej transakcji (tryb WAL, więc odczyty galerii
+    nie blokują skanowania). Wszystkie operacje idą przez jedno połączenie
+    chronione blokadą.
+    """
+
+    def __init__(self, db_path, root_folder_path, batch_size=CATALOG_BATCH_SIZE):
+        self.db_path = db_path
+        self.root_folder_path = os.path.abspath(root_folder_path)
+        self.batch_size = batch_size
+        self._lock = threading.RLock()
+        self._pending = []
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+
+    def _create_schema(self):
+        with self._lock:
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                if version:
+                    logger.info(
+                        f"Nowa wersja schematu katalogu ({version} → "
+                        f"{SCHEMA_VERSION}), baza zostanie zbudowana od nowa"
+                    )
+                self._connection.executescript(
+                    "DROP TABLE IF EXISTS folders;"
+                    "DROP TABLE IF EXISTS files;"
+                    "DROP TABLE IF EXISTS matches;"
+                )
+            self._connection.executescript(SCHEMA)
+            self._connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._connection.commit()
+
+    # --- Zapis ---
+
+    def save_folder(self, folder_path, index_data, subdirectories=None):
+        """
+        Dodaje dane folderu (w formacie index.json) do bieżącej partii.
+        subdirectories: aktualne podfoldery - foldery z katalogu, których
+        już nie ma, są usuwane razem z poddrzewem (None = bez porządkowania).
+        """
+        with self._lock:
+            self._pending.append((folder_path, index_data, subdirectories))
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        """Zatwierdza oczekujące zapisy w jednej transakcji."""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                with self._connection:
+                    for folder_path, index_data, subdirectories in pending:
+                        self._write_folder(folder_path, index_data, subdirectories)
+            except sqlite3.Error as e:
+                logger.error(f"Błąd zapisu katalogu {self.db_path}: {e}")
+                return
+            logger.debug(f"Zapisano w katalogu {len(pending)} folderów")
+
+    def _write_folder(self, folder_path, index_data, subdirectories):
+        folder_path = os.path.abspath(folder_path)
+        folder_info = index_data.get("folder_info") or {}
+        parent_path = (
+            None
+            if folder_path == self.root_folder_path
+            else os.path.dirname(folder_path)
+        )
+        signature = folder_info.get("signature")
+        content_hash = folder_info.get("content_hash")
+
+        # Ta sama treść (bez scan_date) - bez zapisu, updated_at się nie zmienia,
+        # więc strona galerii nie jest renderowana ponownie
+        if content_hash:
+            row = self._connection.execute(
+                "SELECT content_hash FROM folders WHERE path = ?", (folder_path,)
+            ).fetchone()
+            if row and row[0] == content_hash:
+                return
+
+        self._delete_folder_rows(folder_path)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO folders (path, parent_path, name, "
+            "total_size_bytes, file_count, subdir_count, timed_out, signature, "
+            "content_hash, folder_info, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                folder_path,
+                parent_path,
+                os.path.basename(folder_path),
+                folder_info.get("total_size_bytes", 0),
+                folder_info.get("file_count", 0),
+                folder_info.get("subdir_count", 0),
+                int(bool(folder_info.get("timed_out"))),
+                json.dumps(signature) if signature else None,
+                content_hash,
+                json.dumps(folder_info, ensure_ascii=False),
+                time.time(),
+            ),
+        )
+
+        # Wiersze jako generatory - sekcje mogą być buforami index_stream
+        # z dziesiątkami tysięcy rekordów, które nie trafiają naraz do pamięci
+        file_items = itertools.chain(
+            index_data.get("files_with_previews", []),
+            index_data.get("files_without_previews", []),
+        )
+        file_rows = itertools.chain(
+            (
+                self._file_row(folder_path, KIND_FILE, position, item)
+                for position, item in enumerate(file_items)
+            ),
+            (
+                self._file_row(folder_path, KIND_IMAGE, position, item)
+                for position, item in enumerate(index_data.get("other_images", []))
+            ),
+        )
+        match_rows = (
+            (item["path_absolute"], folder_path, item["preview_path_absolute"])
+            for item in index_data.get("files_with_previews", [])
+            if item.get("preview_path_absolute")
+        )
+        self._connection.executemany(
+            "INSERT INTO files (folder_path, kind, position, name, path, size_bytes, "
+            "size_readable, extension, extra) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            file_rows,
+        )
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO matches (file_path, folder_path, preview_path) "
+            "VALUES (?, ?, ?)",
+            match_rows,
+        )
+
+        if subdirectories is not None:
+            current = {os.path.abspath(path) for path in subdirectories}
+            for (child_path,) in self._connection.execute(
+                "SELECT path FROM folders WHERE parent_path = ?", (folder_path,)
+            ).fetchall():
+                if child_path not in current:
+                    self._delete_subtree(child_path)
+
+    @staticmethod
+    def _file_row(folder_path, kind, position, item):
+        extra = {
+            key: value
+            for key, value in item.items()
+            if key not in RECORD_COLUMNS and key not in MATCH_FIELDS
+        }
+        return (
+            folder_path,
+            kind,
+            position,
+            item.get("name", ""),
+            item.get("path_absolute", ""),
+            item.get("size_bytes", 0),
+            item.get("size_readable"),
+            item.get("extension"),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+    def _delete_folder_rows(self, folder_path):
+        self._connection.execute(
+            "DELETE FROM files WHERE folder_path = ?", (folder_path,)
+        )
+        self._connection.execute(
+            "DELETE FROM matches WHERE folder_path = ?", (folder_path,)
+        )
+
+    def _delete_subtree(self, folder_path):
+        prefix = escape_like(folder_path.rstrip(os.sep) + os.sep) + "%"
+        for table, column in (
+            ("files", "folder_path"),
+            ("matches", "folder_path"),
+            ("folders", "path"),
+        ):
+            self._connection.execute(
+                f"DELETE FROM {table} WHERE {column} = ? "
+                f"OR {column} LIKE ? ESCAPE '\\'",
+                (folder_path, prefix),
+            )
+        logger.info(f"Usunięto z katalogu nieistniejący folder: {folder_path}")
+
+    def remove_folder(self, folder_path):
+        """Usuwa folder i jego poddrzewo z katalogu."""
+        with self._lock:
+            self.flush()
+            with self._connection:
+                self._delete_subtree(os.path.abspath(folder_path))
+
+    # --- Odczyt ---
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            self.flush()
+            return self._connection.execute(sql, params).fetchall()
+
+    def _subtree_params(self, root_path):
+        root_path = os.path.abspath(root_path)
+        return root_path, escape_like(root_path.rstrip(os.sep) + os.sep) + "%"
+
+    def has_folder(self, folder_path):
+        return bool(
+            self._query(
+                "SELECT 1 FROM folders WHERE path = ?", (os.path.abspath(folder_path),)
+            )
+        )
+
+    def get_folders(self, root_path=None):
+        """Zwraca [(ścieżka, czas zapisu)] folderów poddrzewa (rodzic przed dziećmi)."""
+        return self._query(
+            "SELECT path, updated_at FROM folders "
+            "WHERE path = ? OR path LIKE ? ESCAPE '\\' ORDER BY path",
+            self._subtree_params(root_path or self.root_folder_path),
+        )
+
+    def get_updated_at(self, folder_path):
+        """Zwraca czas ostatniego zapisu folderu w katalogu albo None."""
+        rows = self._query(
+            "SELECT updated_at FROM folders WHERE path = ?",
+            (os.path.abspath(folder_path),),
+        )
+        return rows[0][0] if rows else None
+
+    def get_signature(self, folder_path):
+        rows = self._query(
+            "SELECT signature FROM folders WHERE path = ?",
+            (os.path.abspath(folder_path),),
+        )
+        if not rows or not rows[0][0]:
+            return None
+        return json.loads(rows[0][0])
+
+    def get_folder_info(self, folder_path):
+        rows = self._query(
+            "SELECT folder_info FROM folders WHERE path = ?",
+            (os.path.abspath(folder_path),),
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_subfolders(self, folder_path):
+        """Zwraca [(nazwa, folder_info)] bezpośrednich podfolderów."""
+        rows = self._query(
+            "SELECT name, folder_info FROM folders WHERE parent_path = ? ORDER BY name",
+            (os.path.abspath(folder_path),),
+        )
+        return [(name, json.loads(folder_info)) for name, folder_info in rows]
+
+    @staticmethod
+    def _section_query(section):
+        """Zwraca (rodzaj wpisu, warunek dopasowania) sekcji index.json."""
+        if section == "other_images":
+            return KIND_IMAGE, ""
+        if section == "files_with_previews":
+            return KIND_FILE, " AND matches.preview_path IS NOT NULL"
+        return KIND_FILE, " AND matches.preview_path IS NULL"
+
+    def iter_section_records(self, folder_path, section, batch_size=READ_BATCH_SIZE):
+        """
+        Zwraca kolejne rekordy sekcji folderu w formacie index.json, czytane
+        porcjami po batch_size wierszy (pozycja jako klucz stronicowania).
+        """
+        folder_path = os.path.abspath(folder_path)
+        kind, condition = self._section_query(section)
+        position = -1
+        while True:
+            rows = self._query(
+                "SELECT files.position, files.name, files.path, files.size_bytes, "
+                "files.size_readable, files.extension, files.extra, "
+                f"matches.preview_path {SECTION_FROM} AND files.position > ?"
+                f"{condition} ORDER BY files.position LIMIT ?",
+                (folder_path, kind, position, batch_size),
+            )
+            for (
+                position,
+                name,
+                path,
+                size_bytes,
+                size_readable,
+                extension,
+                extra,
+                preview_path,
+            ) in rows:
+                item = {
+                    "name": name,
+                    "path_absolute": path,
+                    "size_bytes": size_bytes,
+                    "size_readable": size_readable,
+                    "extension": extension,
+                }
+                if extra:
+                    item.update(json.loads(extra))
+                if kind == KIND_FILE and preview_path:
+                    item["preview_found"] = True
+                    item["preview_name"] = os.path.basename(preview_path)
+                    item["preview_path_absolute"] = preview_path
+                elif kind == KIND_FILE:
+                    item["preview_found"] = False
+                yield item
+            if len(rows) < batch_size:
+                return
+
+    def count_section_records(self, folder_path, section):
+        kind, condition = self._section_query(section)
+        rows = self._query(
+            f"SELECT COUNT(*) {SECTION_FROM}{condition}",
+            (os.path.abspath(folder_path), kind),
+        )
+        return rows[0][0]
+
+    def get_index_data(self, folder_path):
+        """
+        Odtwarza dane folderu w formacie index.json albo zwraca None.
+        Sekcje to index_stream.LazySection - rekordy są czytane z bazy
+        porcjami przy każdej iteracji, a nie wczytywane naraz.
+        """
+        folder_path = os.path.abspath(folder_path)
+        folder_info = self.get_folder_info(folder_path)
+        if folder_info is None:
+            return None
+
+        index_data = {"folder_info": folder_info}
+        for section in index_stream.INDEX_SECTIONS:
+            index_data[section] = index_stream.LazySection(
+                functools.partial(self.iter_section_records, folder_path, section),
+                functools.partial(self.count_section_records, folder_path, section),
+            )
+        return index_data
+
+    def get_files(self, root_path=None, kind=KIND_FILE):
+        """Zwraca [(ścieżka, rozmiar)] plików danego rodzaju w poddrzewie."""
+        root_path, prefix = self._subtree_params(root_path or self.root_folder_path)
+        return self._query(
+            "SELECT path, size_bytes FROM files WHERE kind = ? "
+            "AND (folder_path = ? OR folder_path LIKE ? ESCAPE '\\')",
+            (kind, root_path, prefix),
+        )
+
+    def get_empty_folder_candidates(self, root_path, content_extensions):
+        """
+        Zwraca foldery bez podfolderów i bez plików o rozszerzeniach
+        content_extensions (kandydaci do usunięcia - do sprawdzenia na dysku).
+        """
+        content_extensions = {ext.lower() for ext in content_extensions}
+        root_path, prefix = self._subtree_params(root_path)
+        folders = {}
+        for folder_path, file_name in self._query(
+            "SELECT folders.path, files.name FROM folders "
+            "LEFT JOIN files ON files.folder_path = folders.path "
+            "WHERE folders.subdir_count = 0 "
+            "AND (folders.path = ? OR folders.path LIKE ? ESCAPE '\\')",
+            (root_path, prefix),
+        ):
+            has_content = bool(file_name) and (
+                os.path.splitext(file_name)[1].lower() in content_extensions
+            )
+            folders[folder_path] = folders.get(folder_path, False) or has_content
+        return sorted(
+            (path for path, has_content in folders.items() if not has_content),
+            key=lambda path: path.count(os.sep),
+            reverse=True,
+        )
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._connection.close()
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(root_folder_path, catalog_dir=None):
+    """Zwraca współdzielony katalog folderu roboczego (otwierany raz)."""
+    db_path = os.path.abspath(get_catalog_path(root_folder_path, catalog_dir))
+    with _catalogs_lock:
+        catalog = _catalogs.get(db_path)
+        if catalog is None:
+            catalog = Catalog(db_path, root_folder_path)
+            _catalogs[db_path] = catalog
+        return catalog
+
+
+def get_catalog_for_folder(folder_path):
+    """
+    Zwraca katalog, do którego należy folder: katalog folderu roboczego
+    z konfiguracji, jeśli folder leży w nim, w przeciwnym razie katalog
+    samego folderu. None, gdy katalog jest wyłączony lub nie da się go otworzyć.
+    """
+    if not is_catalog_enabled():
+        return None
+    work_directory = config_manager.get_work_directory()
+    root_folder_path = (
+        work_directory
+        if work_directory and is_path_within(folder_path, work_directory)
+        else folder_path
+    )
+    try:
+        return get_catalog(root_folder_path)
+    except (OSError, sqlite3.Error) as e:
+        logger.error(f"Nie można otworzyć katalogu dla {root_folder_path}: {e}")
+        return None
+
+
+def find_catalog(folder_path):
+    """
+    Jak get_catalog_for_folder, ale tylko dla istniejącej bazy, w której
+    jest już zapisany folder_path. Służy odczytom (galeria, sprzątanie).
+    """
+    if not is_catalog_enabled():
+        return None
+    work_directory = config_manager.get_work_directory()
+    candidates = [folder_path]
+    if work_directory and is_path_within(folder_path, work_directory):
+        candidates.insert(0, work_directory)
+    for root_folder_path in candidates:
+        if not os.path.exists(get_catalog_path(root_folder_path)):
+            continue
+        try:
+            catalog = get_catalog(root_folder_path)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Nie można otworzyć katalogu dla {root_folder_path}: {e}")
+            continue
+        if catalog.has_folder(folder_path):
+            return catalog
+    return None
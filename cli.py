@@ -0,0 +1,211 @@
+# cli.py
+"""
+Skanowanie i generowanie galerii bez interfejsu graficznego (bez PyQt),
+np. do nocnego indeksowania uruchamianego na serwerze plików, gdzie dyski
+są lokalne zamiast przez SMB.
+
+Przykład:
+    python cli.py /srv/modele --workers 16 --incremental --json
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+import time
+
+import config_manager
+import gallery_generator
+import scanner_logic
+
+DEFAULT_GALLERY_CACHE_DIR = "_gallery_cache"  # jak MainWindow.GALLERY_CACHE_DIR
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_CANCELLED = 130
+
+
+class ProgressPrinter:
+    """
+    Wypisuje postęp na stdout: jednowierszowe opisy albo (json=True)
+    obiekty JSON w osobnych wierszach, po jednym na zdarzenie. Logi trafiają
+    na stderr, więc stdout zawiera wyłącznie postęp.
+    """
+
+    def __init__(self, json_output=False, stream=None):
+        self.json_output = json_output
+        self.stream = stream or sys.stdout
+
+    def emit(self, event_type, stage, **fields):
+        if self.json_output:
+            line = json.dumps(
+                {"event": event_type, "stage": stage, "time": time.time(), **fields},
+                ensure_ascii=False,
+            )
+        elif event_type == "progress":
+            line = fields["description"]
+        else:
+            line = fields.get("message") or f"[{stage}] {event_type}"
+        print(line, file=self.stream, flush=True)
+
+    def scan_event(self, event):
+        """Callback ProgressEvent ze scanner_logic.start_scanning."""
+        data = event.as_dict()
+        data["description"] = event.describe()
+        self.emit("progress", "scan", **data)
+
+    def gallery_message(self, message):
+        self.emit("message", "gallery", message=message)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Skanowanie folderu i generowanie galerii HTML bez GUI."
+    )
+    parser.add_argument("root", help="folder główny do przeskanowania")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="liczba wątków skanowania (domyślnie performance.max_worker_threads)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="pomijaj foldery, których zawartość się nie zmieniła",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_GALLERY_CACHE_DIR,
+        help=f"folder galerii i miniatur (domyślnie {DEFAULT_GALLERY_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--config",
+        default=None,
+        help=f"ścieżka pliku konfiguracji (domyślnie {config_manager.CONFIG_FILE})",
+    )
+    stages = parser.add_mutually_exclusive_group()
+    stages.add_argument(
+        "--scan-only", action="store_true", help="tylko skanowanie, bez galerii"
+    )
+    stages.add_argument(
+        "--gallery-only",
+        action="store_true",
+        help="tylko galeria z wyników poprzedniego skanowania",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="postęp jako JSON (jeden obiekt w wierszu) na stdout",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="szczegółowe logi na stderr"
+    )
+    return parser
+
+
+def install_signal_handlers(control):
+    """
+    Pierwsze SIGINT/SIGTERM przerywa skanowanie łagodnie (zapisane foldery
+    zostają w katalogu), kolejne kończy proces natychmiast.
+    """
+
+    def handle_signal(signum, frame):
+        if control.is_cancelled():
+            raise KeyboardInterrupt
+        control.cancel()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, handle_signal)
+
+
+def run_scan(root_path, args, control, printer):
+    started = time.monotonic()
+    printer.emit("start", "scan", message=f"Skanowanie: {root_path}", root=root_path)
+    scanner_logic.start_scanning(
+        root_path,
+        max_workers=args.workers,
+        incremental=args.incremental,
+        control=control,
+        progress_event_callback=printer.scan_event,
+    )
+    cancelled = control.is_cancelled()
+    printer.emit(
+        "done",
+        "scan",
+        message="Skanowanie przerwane." if cancelled else "Skanowanie zakończone.",
+        cancelled=cancelled,
+        elapsed_seconds=round(time.monotonic() - started, 3),
+    )
+    return not cancelled
+
+
+def run_gallery(root_path, args, control, printer):
+    started = time.monotonic()
+    printer.emit("start", "gallery", message=f"Galeria: {root_path}", root=root_path)
+    if not gallery_generator.has_scan_data(root_path):
+        printer.emit(
+            "error",
+            "gallery",
+            message=f"Brak wyników skanowania dla {root_path} - uruchom skanowanie.",
+        )
+        return None
+    root_html_path = gallery_generator.generate_full_gallery(
+        root_path,
+        args.cache_dir,
+        progress_callback=printer.gallery_message,
+        should_stop=control.should_stop,
+    )
+    printer.emit(
+        "done",
+        "gallery",
+        message=f"Galeria: {root_html_path}" if root_html_path else "Brak galerii.",
+        root_html=os.path.abspath(root_html_path) if root_html_path else None,
+        cancelled=control.is_cancelled(),
+        elapsed_seconds=round(time.monotonic() - started, 3),
+    )
+    return root_html_path
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # force: config_manager konfiguruje logowanie (INFO) już przy imporcie
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        force=True,
+        stream=sys.stderr,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    if not args.verbose:
+        # Logger skanera ma własny handler konsoli (INFO na stderr)
+        logging.getLogger("scanner").setLevel(logging.WARNING)
+    if args.config:
+        config_manager.CONFIG_FILE = args.config
+
+    printer = ProgressPrinter(args.json)
+    root_path = os.path.abspath(args.root)
+    if not os.path.isdir(root_path):
+        printer.emit("error", "scan", message=f"Folder nie istnieje: {root_path}")
+        return EXIT_ERROR
+
+    control = scanner_logic.ScanControl()
+    install_signal_handlers(control)
+    try:
+        if not args.gallery_only and not run_scan(root_path, args, control, printer):
+            return EXIT_CANCELLED
+        if not args.scan_only:
+            root_html_path = run_gallery(root_path, args, control, printer)
+            if control.is_cancelled():
+                return EXIT_CANCELLED
+            if not root_html_path:
+                return EXIT_ERROR
+    except KeyboardInterrupt:
+        printer.emit("error", "cli", message="Przerwano.")
+        return EXIT_CANCELLED
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,22 @@
 # config_manager.py
+import copy
 import json
 import logging
 import os
+import threading
+import time
+from collections.abc import Mapping
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 CONFIG_FILE = "config.json"
+# Co ile sekund migawka sprawdza mtime config.json (między sprawdzeniami
+# odczyty konfiguracji nie wykonują żadnego I/O)
+CONFIG_CHECK_INTERVAL = 1.0
 DEFAULT_CONFIG = {
     "work_directory": None,
     "preview_size": 400,
@@ -20,6 +28,43 @@ DEFAULT_CONFIG = {
         "lazy_loading": True,
         "max_cache_size_mb": 1024,
         "cache_ttl_hours": 24,
+        "folder_timeout_seconds": 30,
+        "timing_report_folders": 20,
+        "compact_index_json": False,
+    },
+    "catalog": {
+        "enabled": True,
+        "directory": "_catalog",
+        "export_index_json": True,
+    },
+    "watcher": {
+        "enabled": True,
+        "mode": "auto",
+        "batch_delay_seconds": 2.0,
+        "max_batch_delay_seconds": 30.0,
+        "poll_interval_seconds": 30.0,
+    },
+    "duplicates": {"enabled": False, "hash_workers": 4, "chunk_size_kb": 1024},
+    "image_metadata": {"enabled": True},
+    "archive_inspector": {"enabled": True, "max_entries": 100000, "max_header_mb": 32},
+    "io_policy": {
+        "max_retries": 3,
+        "base_delay_ms": 200,
+        "max_delay_ms": 5000,
+        "per_share_limit": 8,
+        "share_limits": {},
+    },
+    "archive_previews": {
+        "enabled": True,
+        "directory": "_gallery_cache/_archive_previews",
+        "max_image_mb": 20,
+        "timeout_seconds": 5,
+    },
+    "fuzzy_matching": {"enabled": True, "threshold": 0.7, "margin": 0.05},
+    "links": {"follow": "once"},
+    "ignore": {
+        "patterns": [".git/", "$RECYCLE.BIN/", "System Volume Information/"],
+        "use_ignore_files": True,
     },
     "ui": {"animation_speed": 300, "hover_delay": 500, "max_preview_size": 1200},
     "security": {
@@ -63,20 +108,139 @@ def load_config() -> Dict[str, Any]:
         if os.path.exists(CONFIG_FILE):
             with open(CONFIG_FILE, "r", encoding="utf-8") as f:
                 user_config = json.load(f)
-                config = DEFAULT_CONFIG.copy()
+                # Kopia głęboka - zmiany zwróconego słownika (set_config_value)
+                # nie mogą trafić do zagnieżdżonych sekcji DEFAULT_CONFIG
+                config = copy.deepcopy(DEFAULT_CONFIG)
                 config.update(user_config)
 
                 if not validate_config(config):
                     logger.warning(
                         "Używam domyślnej konfiguracji z powodu błędów walidacji"
                     )
-                    return DEFAULT_CONFIG.copy()
+                    return copy.deepcopy(DEFAULT_CONFIG)
 
                 return config
-        return DEFAULT_CONFIG.copy()
+        return copy.deepcopy(DEFAULT_CONFIG)
     except Exception as e:
         logger.error(f"Błąd wczytywania konfiguracji: {e}")
-        return DEFAULT_CONFIG.copy()
+        return copy.deepcopy(DEFAULT_CONFIG)
+
+
+def _freeze(value: Any) -> Any:
+    """Zamienia słowniki na widoki tylko do odczytu, a listy na krotki."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class ConfigSnapshot(Mapping):
+    """
+    Niezmienna migawka konfiguracji (z domyślnymi wartościami, po walidacji).
+    Sekcje są widokami tylko do odczytu, listy - krotkami, więc jedną migawkę
+    mogą bezpiecznie współdzielić wątki skanera i generatora galerii.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self._data = _freeze(config)
+
+    def __getitem__(self, key: str) -> Any:
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_value(self, key: str, default: Any = None) -> Any:
+        """Zwraca wartość dla klucza z kropkami ("performance.max_worker_threads")."""
+        value = self._data
+        for k in key.split("."):
+            if isinstance(value, Mapping) and k in value:
+                value = value[k]
+            else:
+                return default
+        return value
+
+
+_snapshot: Optional[ConfigSnapshot] = None
+_snapshot_source = None  # (CONFIG_FILE, mtime_ns, rozmiar) wczytanej migawki
+_snapshot_checked_at = 0.0
+_snapshot_lock = threading.Lock()
+_config_listeners: List[Callable[[ConfigSnapshot], None]] = []
+
+
+def _get_config_source():
+    try:
+        config_stat = os.stat(CONFIG_FILE)
+    except OSError:
+        return (CONFIG_FILE, None, None)
+    return (CONFIG_FILE, config_stat.st_mtime_ns, config_stat.st_size)
+
+
+def get_config_snapshot() -> ConfigSnapshot:
+    """
+    Zwraca migawkę konfiguracji. config.json jest wczytywany ponownie tylko
+    po zmianie mtime (sprawdzanym co CONFIG_CHECK_INTERVAL s) lub ścieżki
+    CONFIG_FILE; zmiana treści powiadamia słuchaczy add_config_listener.
+    """
+    global _snapshot, _snapshot_source, _snapshot_checked_at
+    now = time.monotonic()
+    snapshot = _snapshot
+    source = _snapshot_source
+    if (
+        snapshot is not None
+        and source is not None
+        and source[0] == CONFIG_FILE
+        and now - _snapshot_checked_at < CONFIG_CHECK_INTERVAL
+    ):
+        return snapshot
+
+    with _snapshot_lock:
+        previous = _snapshot
+        source = _get_config_source()
+        _snapshot_checked_at = now
+        if previous is not None and source == _snapshot_source:
+            return previous
+        snapshot = ConfigSnapshot(load_config())
+        _snapshot = snapshot
+        _snapshot_source = source
+        listeners = list(_config_listeners)
+
+    if previous is not None and previous != snapshot:
+        logger.info("Konfiguracja zmieniła się - wczytano nową migawkę")
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Błąd słuchacza zmian konfiguracji: {e}")
+    return snapshot
+
+
+def invalidate_config_snapshot() -> None:
+    """Wymusza sprawdzenie config.json przy następnym odczycie."""
+    global _snapshot_checked_at, _snapshot_source
+    with _snapshot_lock:
+        _snapshot_checked_at = 0.0
+        _snapshot_source = None
+
+
+def add_config_listener(listener: Callable[[ConfigSnapshot], None]) -> None:
+    """
+    Rejestruje funkcję wywoływaną z nową migawką po zmianie konfiguracji
+    (zapis przez save_config albo edycja pliku). Może być wywołana z dowolnego
+    wątku, który odczytuje konfigurację.
+    """
+    with _snapshot_lock:
+        _config_listeners.append(listener)
+
+
+def remove_config_listener(listener: Callable[[ConfigSnapshot], None]) -> None:
+    with _snapshot_lock:
+        if listener in _config_listeners:
+            _config_listeners.remove(listener)
 
 
 def save_config(config_data: Dict[str, Any]) -> bool:
@@ -87,24 +251,28 @@ def save_config(config_data: Dict[str, Any]) -> bool:
 
         with open(CONFIG_FILE, "w", encoding="utf-8") as f:
             json.dump(config_data, f, indent=4, ensure_ascii=False)
+        # Zapis w tej samej chwili co poprzedni może nie zmienić mtime
+        invalidate_config_snapshot()
+        get_config_snapshot()
         return True
     except Exception as e:
         logger.error(f"Błąd zapisywania konfiguracji: {e}")
         return False
 
 
-def get_config_value(key: str, default: Any = None) -> Any:
-    """Pobiera wartość z konfiguracji."""
+def get_config_value(
+    key: str, default: Any = None, config: Optional[ConfigSnapshot] = None
+) -> Any:
+    """
+    Pobiera wartość z migawki konfiguracji (get_config_snapshot).
+    config: migawka pobrana raz na przebieg (skanowanie, generowanie galerii) -
+    zmiany config.json w trakcie przebiegu go nie dotyczą; None = bieżąca.
+    Sekcje są tylko do odczytu - do zmian służy set_config_value.
+    """
     try:
-        config = load_config()
-        keys = key.split(".")
-        value = config
-        for k in keys:
-            if isinstance(value, dict) and k in value:
-                value = value[k]
-            else:
-                return default
-        return value
+        if config is None:
+            config = get_config_snapshot()
+        return config.get_value(key, default)
     except Exception as e:
         logger.error(f"Błąd pobierania wartości konfiguracji: {e}")
         return default
@@ -142,12 +310,12 @@ def set_work_directory(path: str) -> bool:
     return set_config_value("work_directory", str(path_obj.absolute()))
 
 
-def get_preview_size() -> int:
-    return get_config_value("preview_size", 400)
+def get_preview_size(config: Optional[ConfigSnapshot] = None) -> int:
+    return get_config_value("preview_size", 400, config)
 
 
-def get_thumbnail_size() -> int:
-    return get_config_value("thumbnail_size", 150)
+def get_thumbnail_size(config: Optional[ConfigSnapshot] = None) -> int:
+    return get_config_value("thumbnail_size", 150, config)
 
 
 def get_allowed_extensions() -> List[str]:
@@ -157,10 +325,15 @@ def get_allowed_extensions() -> List[str]:
     )
 
 
-def get_archive_color(file_extension):
-    """Pobiera kolor dla danego typu archiwum."""
+def get_archive_color(file_extension, colors=None):
+    """
+    Pobiera kolor dla danego typu archiwum.
+    colors: sekcja archive_colors pobrana raz (np. na stronę galerii);
+    None = z bieżącej migawki konfiguracji.
+    """
     try:
-        colors = get_config_value("archive_colors", {})
+        if colors is None:
+            colors = get_config_value("archive_colors", {})
         # Konwertuj rozszerzenie na małe litery dla porównania
         ext_lower = file_extension.lower() if file_extension else ""
 
@@ -0,0 +1,290 @@
+# content_hash.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import catalog
+import config_manager
+import io_policy
+
+logger = logging.getLogger(__name__)
+
+HASH_ALGORITHM = "sha256"
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # odczyt plików kawałkami po 1 MB
+DEFAULT_HASH_WORKERS = 4
+HASH_CACHE_FILE = "hash_cache.sqlite"
+
+HASH_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    hashed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS duplicates (
+    path TEXT PRIMARY KEY,
+    duplicate_of TEXT NOT NULL,
+    hash TEXT NOT NULL
+);
+"""
+
+
+def get_hashing_settings(config=None):
+    """
+    Zwraca ustawienia etapu haszowania z sekcji duplicates konfiguracji
+    (config: migawka konfiguracji przebiegu, None = bieżąca).
+    """
+    settings = config_manager.get_config_value("duplicates", {}, config) or {}
+    return {
+        "enabled": bool(settings.get("enabled", False)),
+        "workers": int(settings.get("hash_workers", DEFAULT_HASH_WORKERS)),
+        "chunk_size": int(settings.get("chunk_size_kb", DEFAULT_CHUNK_SIZE // 1024))
+        * 1024,
+    }
+
+
+def hash_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE, should_stop=None):
+    """
+    Liczy skrót zawartości pliku czytając go kawałkami do jednego bufora
+    (hashlib i odczyt zwalniają GIL, więc wątki haszują równolegle).
+    Zwraca None, jeśli przerwano przez should_stop.
+    """
+    digest = hashlib.new(HASH_ALGORITHM)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, "rb", buffering=0) as f:
+        while True:
+            if should_stop and should_stop():
+                return None
+            read_count = f.readinto(buffer)
+            if not read_count:
+                break
+            digest.update(view[:read_count])
+    return digest.hexdigest()
+
+
+def stat_key(file_path):
+    """Zwraca (rozmiar, mtime_ns, inode) pliku - klucz ważności skrótu."""
+    file_stat = os.stat(file_path)
+    return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
+
+
+class HashCache:
+    """
+    Trwała pamięć skrótów plików (SQLite). Skrót jest ważny, dopóki plik
+    ma ten sam rozmiar, mtime i inode - niezmienione pliki nie są czytane
+    ponownie. Przechowuje też ostatnio wyznaczone duplikaty.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._connection.executescript(HASH_CACHE_SCHEMA)
+            self._connection.commit()
+
+    def get(self, file_path, key):
+        """Zwraca zapamiętany skrót, jeśli (rozmiar, mtime, inode) się zgadzają."""
+        size_bytes, mtime_ns, inode = key
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT hash FROM file_hashes WHERE path = ? AND size_bytes = ? "
+                "AND mtime_ns = ? AND inode = ? AND algorithm = ?",
+                (file_path, size_bytes, mtime_ns, inode, HASH_ALGORITHM),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, entries):
+        """Zapisuje [(ścieżka, (rozmiar, mtime, inode), skrót)] w jednej transakcji."""
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO file_hashes (path, size_bytes, mtime_ns, "
+                "inode, algorithm, hash, hashed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (path, key[0], key[1], key[2], HASH_ALGORITHM, file_hash, now)
+                    for path, key, file_hash in entries
+                ],
+            )
+
+    def get_duplicates(self, root_path):
+        """Zwraca {ścieżka: duplicate_of} zapamiętane dla poddrzewa root_path."""
+        root_path = os.path.abspath(root_path)
+        prefix = catalog.escape_like(root_path.rstrip(os.sep) + os.sep) + "%"
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, duplicate_of FROM duplicates "
+                "WHERE path LIKE ? ESCAPE '\\'",
+                (prefix,),
+            ).fetchall()
+        return dict(rows)
+
+    def set_duplicates(self, root_path, duplicate_map, hashes):
+        """Zastępuje duplikaty poddrzewa root_path nowym wynikiem."""
+        root_path = os.path.abspath(root_path)
+        prefix = catalog.escape_like(root_path.rstrip(os.sep) + os.sep) + "%"
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM duplicates WHERE path LIKE ? ESCAPE '\\'", (prefix,)
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO duplicates (path, duplicate_of, hash) "
+                "VALUES (?, ?, ?)",
+                [
+                    (path, original, hashes[path])
+                    for path, original in duplicate_map.items()
+                ],
+            )
+
+
+_hash_cache = None
+_hash_cache_lock = threading.Lock()
+
+
+def get_hash_cache():
+    """Zwraca współdzieloną pamięć skrótów (w katalogu baz, wspólna dla folderów)."""
+    global _hash_cache
+    with _hash_cache_lock:
+        if _hash_cache is None:
+            _hash_cache = HashCache(
+                os.path.join(catalog.get_catalog_dir(), HASH_CACHE_FILE)
+            )
+        return _hash_cache
+
+
+def hash_files(
+    file_paths,
+    hash_cache,
+    workers=DEFAULT_HASH_WORKERS,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    progress_callback=None,
+    should_stop=None,
+):
+    """
+    Zwraca {ścieżka: skrót} dla plików; pliki z ważnym wpisem w pamięci
+    skrótów nie są czytane, pozostałe są haszowane w puli wątków.
+    Pliki niedostępne są pomijane.
+    """
+    hashes = {}
+    to_hash = []
+    for file_path in file_paths:
+        try:
+            key = stat_key(file_path)
+        except OSError as e:
+            logger.warning(f"Pominięto przy haszowaniu {file_path}: {e}")
+            continue
+        cached_hash = hash_cache.get(file_path, key)
+        if cached_hash:
+            hashes[file_path] = cached_hash
+        else:
+            to_hash.append((file_path, key))
+
+    logger.info(
+        f"Haszowanie: {len(hashes)} z pamięci, {len(to_hash)} do odczytu "
+        f"({sum(key[0] for _, key in to_hash)} bajtów)"
+    )
+    if not to_hash:
+        return hashes
+
+    new_entries = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            # Odczyt według polityki I/O: ponowienia i limit operacji na udział
+            executor.submit(
+                io_policy.call,
+                hash_file,
+                file_path,
+                chunk_size,
+                should_stop,
+                path=os.path.dirname(file_path),
+                description=f"haszowanie {file_path}",
+            ): (file_path, key)
+            for file_path, key in to_hash
+        }
+        for done_count, future in enumerate(as_completed(futures), 1):
+            file_path, key = futures[future]
+            try:
+                file_hash = future.result()
+            except OSError as e:
+                logger.warning(f"Błąd odczytu przy haszowaniu {file_path}: {e}")
+                continue
+            if file_hash is None:
+                continue  # przerwano
+            hashes[file_path] = file_hash
+            new_entries.append((file_path, key, file_hash))
+            if progress_callback and done_count % 50 == 0:
+                progress_callback(f"Haszowanie plików: {done_count}/{len(to_hash)}")
+            if len(new_entries) >= 500:
+                hash_cache.put_many(new_entries)
+                new_entries = []
+
+    if new_entries:
+        hash_cache.put_many(new_entries)
+    return hashes
+
+
+def find_duplicate_groups(files, hashes):
+    """
+    Grupuje pliki o tym samym skrócie. files: {ścieżka: rozmiar}.
+    Zwraca listę grup [{"hash", "size_bytes", "files"}] posortowaną
+    malejąco po możliwym do odzyskania miejscu; pierwszy plik grupy
+    (alfabetycznie) jest oryginałem.
+    """
+    by_hash = {}
+    for file_path, file_hash in hashes.items():
+        by_hash.setdefault(file_hash, []).append(file_path)
+
+    groups = []
+    for file_hash, paths in by_hash.items():
+        if len(paths) < 2:
+            continue
+        paths.sort()
+        size_bytes = files[paths[0]]
+        groups.append(
+            {
+                "hash": file_hash,
+                "size_bytes": size_bytes,
+                "wasted_bytes": size_bytes * (len(paths) - 1),
+                "files": paths,
+            }
+        )
+    groups.sort(key=lambda group: group["wasted_bytes"], reverse=True)
+    return groups
+
+
+def write_duplicates_report(root_folder_path, groups, log_dir="logs"):
+    """Zapisuje raport duplikatów w log_dir i zwraca ścieżkę pliku."""
+    log_path = Path(log_dir)
+    log_path.mkdir(exist_ok=True)
+    now = datetime.now()
+    report_file = log_path / f"duplicates_{now.strftime('%Y%m%d_%H%M%S')}.json"
+    report = {
+        "root": os.path.abspath(root_folder_path),
+        "created": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "algorithm": HASH_ALGORITHM,
+        "group_count": len(groups),
+        "duplicate_file_count": sum(len(group["files"]) - 1 for group in groups),
+        "wasted_bytes": sum(group["wasted_bytes"] for group in groups),
+        "groups": groups,
+    }
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    logger.info(f"Zapisano raport duplikatów: {report_file}")
+    return str(report_file)
@@ -0,0 +1,130 @@
+# file_cache.py
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+import catalog
+
+logger = logging.getLogger(__name__)
+
+FILE_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    path TEXT PRIMARY KEY,
+    size_bytes INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    flagged INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+class FileResultCache:
+    """
+    Trwała pamięć wyników odczytu plików (SQLite), np. metadanych obrazów
+    albo zawartości archiwów. Wpis jest ważny, dopóki plik ma ten sam
+    rozmiar i mtime - niezmienione pliki nie są otwierane ponownie.
+    flagged oznacza wyniki wymagające uwagi (np. uszkodzony plik).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._connection.executescript(FILE_CACHE_SCHEMA)
+            self._connection.commit()
+
+    def get(self, file_path, size_bytes, mtime_ns):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM results "
+                "WHERE path = ? AND size_bytes = ? AND mtime_ns = ?",
+                (file_path, size_bytes, mtime_ns),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_many(self, entries):
+        """Zapisuje [(ścieżka, rozmiar, mtime_ns, wynik, flagged)] w transakcji."""
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results "
+                "(path, size_bytes, mtime_ns, flagged, data) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        file_path,
+                        size_bytes,
+                        mtime_ns,
+                        int(flagged),
+                        json.dumps(result, ensure_ascii=False),
+                    )
+                    for file_path, size_bytes, mtime_ns, result, flagged in entries
+                ],
+            )
+
+    def get_flagged(self, root_path):
+        """Zwraca [(ścieżka, wynik)] oznaczonych plików poddrzewa."""
+        root_path = os.path.abspath(root_path)
+        prefix = catalog.escape_like(root_path.rstrip(os.sep) + os.sep) + "%"
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, data FROM results "
+                "WHERE flagged = 1 AND path LIKE ? ESCAPE '\\' ORDER BY path",
+                (prefix,),
+            ).fetchall()
+        return [(path, json.loads(data)) for path, data in rows]
+
+    def remove(self, file_path):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM results WHERE path = ?", (file_path,))
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_file_cache(file_name):
+    """Zwraca współdzieloną pamięć wyników o podanej nazwie (w katalogu baz)."""
+    db_path = os.path.abspath(os.path.join(catalog.get_catalog_dir(), file_name))
+    with _caches_lock:
+        cache = _caches.get(db_path)
+        if cache is None:
+            cache = FileResultCache(db_path)
+            _caches[db_path] = cache
+        return cache
+
+
+def read_with_cache(file_entries, read_function, result_cache=None, is_flagged=None):
+    """
+    Zwraca {ścieżka: wynik} dla wpisów migawki folderu (słowniki z path,
+    size_bytes i mtime_ns). Pliki z ważnym wpisem w pamięci nie są
+    otwierane; pozostałe czyta read_function(ścieżka, rozmiar), a nowe
+    wyniki są zapisywane jedną transakcją. is_flagged(wynik) wyznacza
+    wyniki wymagające uwagi.
+    """
+    results = {}
+    new_entries = []
+    for file_entry in file_entries:
+        file_path = os.path.abspath(file_entry["path"])
+        size_bytes = file_entry["size_bytes"]
+        mtime_ns = file_entry["mtime_ns"]
+        result = None
+        if result_cache is not None:
+            result = result_cache.get(file_path, size_bytes, mtime_ns)
+        if result is None:
+            result = read_function(file_path, size_bytes)
+            flagged = bool(is_flagged and is_flagged(result))
+            new_entries.append((file_path, size_bytes, mtime_ns, result, flagged))
+        results[file_path] = result
+    if result_cache is not None and new_entries:
+        try:
+            result_cache.put_many(new_entries)
+        except sqlite3.Error as e:
+            logger.error(f"Błąd zapisu pamięci {result_cache.db_path}: {e}")
+    return results
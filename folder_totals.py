@@ -0,0 +1,170 @@
+# folder_totals.py
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Pola sum rekurencyjnych zapisywanych w folder_info["recursive"]
+TOTAL_FIELDS = (
+    "total_size_bytes",
+    "file_count",
+    "with_previews_count",  # archiwa (pliki bez obrazów) z podglądem
+    "without_previews_count",  # archiwa bez podglądu
+    "subdir_count",  # wszystkie zagnieżdżone foldery
+)
+
+
+def own_totals(folder_info):
+    """Sumy samego folderu (bez podfolderów) z jego folder_info."""
+    totals = {field: folder_info.get(field, 0) for field in TOTAL_FIELDS}
+    totals["subdir_count"] = 0
+    return totals
+
+
+def add_child_totals(totals, child_totals):
+    """Dolicza sumy podfolderu (i sam podfolder) do totals."""
+    for field in TOTAL_FIELDS:
+        totals[field] += child_totals.get(field, 0)
+    totals["subdir_count"] += 1
+
+
+def same_totals(totals, other):
+    """Czy sumy są równe (pola pochodne, np. total_size_readable, są pomijane)."""
+    if not other:
+        return False
+    return all(totals.get(field) == other.get(field) for field in TOTAL_FIELDS)
+
+
+def get_recursive_totals(folder_info):
+    """Sumy rekurencyjne z folder_info; bez nich - sumy samego folderu."""
+    return folder_info.get("recursive") or own_totals(folder_info)
+
+
+class _FolderState:
+    """Folder przeskanowany, czekający na sumy podfolderów."""
+
+    __slots__ = ("own", "folder_info", "pending", "children", "listed")
+
+    def __init__(self, own, folder_info, subdirectories, listed):
+        self.own = own
+        self.folder_info = folder_info
+        self.pending = set(subdirectories)
+        self.children = {}  # ścieżka -> (sumy, czy folder ma indeks)
+        self.listed = listed
+
+
+class FolderTotals:
+    """
+    Sumy rekurencyjne folderów liczone w trakcie skanowania od liści w górę.
+    Folder zgłasza swoje sumy i listę podfolderów po przeskanowaniu; gdy
+    wszystkie podfoldery zgłoszą sumy, jego sumy są kompletne i trafiają do
+    on_complete(ścieżka, sumy, podfoldery, folder_info, ma_rodzica), a potem
+    do folderu nadrzędnego. Podfoldery nieprzeskanowane w tym przebiegu
+    (skanowanie bez rekurencji, limit czasu, błąd) są uzupełniane na końcu
+    przez finish_pending z zapisanych indeksów.
+    Metody mogą być wywoływane z wielu wątków skanera.
+    """
+
+    def __init__(self, on_complete):
+        self.on_complete = on_complete
+        self._lock = threading.Lock()
+        self._folders = {}  # ścieżka -> _FolderState
+        self._parents = {}  # ścieżka podfolderu -> ścieżka folderu
+
+    def folder_scanned(self, folder_path, folder_info, subdirectories, listed=True):
+        """
+        Zgłasza przeskanowany folder. folder_info - zapisane dane folderu
+        (None, gdy folder nie ma indeksu, np. po błędzie dostępu).
+        """
+        own = own_totals(folder_info or {})
+        with self._lock:
+            self._folders[folder_path] = _FolderState(
+                own, folder_info, subdirectories, listed and folder_info is not None
+            )
+            for subdir in subdirectories:
+                self._parents[subdir] = folder_path
+        self._complete(folder_path)
+
+    def finish_pending(self, load_folder_info):
+        """
+        Uzupełnia sumy podfolderów, które nie zostały przeskanowane,
+        z ich zapisanych indeksów (load_folder_info(ścieżka) -> folder_info
+        albo None) i kończy foldery, które na nie czekały.
+        """
+        while True:
+            with self._lock:
+                missing = [
+                    subdir
+                    for state in self._folders.values()
+                    for subdir in state.pending
+                    if subdir not in self._folders
+                ]
+            if not missing:
+                break
+            for subdir in missing:
+                folder_info = load_folder_info(subdir)
+                totals = get_recursive_totals(folder_info or {})
+                self._child_done(subdir, totals, folder_info is not None)
+        with self._lock:
+            if self._folders:
+                logger.warning(
+                    f"Niekompletne sumy rekurencyjne dla {len(self._folders)} folderów"
+                )
+            self._folders.clear()
+            self._parents.clear()
+
+    def discard(self):
+        """Porzuca niekompletne sumy (np. po przerwaniu skanowania)."""
+        with self._lock:
+            self._folders.clear()
+            self._parents.clear()
+
+    def _child_done(self, subdir, totals, listed):
+        with self._lock:
+            parent_path = self._parents.pop(subdir, None)
+            state = self._folders.get(parent_path)
+            if state is None or subdir not in state.pending:
+                return
+            state.pending.discard(subdir)
+            state.children[subdir] = (totals, listed)
+        self._complete(parent_path)
+
+    def _complete(self, folder_path):
+        # Pętla zamiast rekurencji - głębokość drzewa nie jest ograniczona
+        while folder_path is not None:
+            with self._lock:
+                state = self._folders.get(folder_path)
+                if state is None or state.pending:
+                    return
+                del self._folders[folder_path]
+                parent_path = self._parents.pop(folder_path, None)
+            totals = dict(state.own)
+            subfolders = []
+            for subdir, (child_totals, listed) in state.children.items():
+                add_child_totals(totals, child_totals)
+                if listed:
+                    subfolders.append((os.path.basename(subdir), child_totals))
+            subfolders.sort(key=lambda item: item[0])
+            if state.folder_info is not None:
+                try:
+                    self.on_complete(
+                        folder_path,
+                        totals,
+                        subfolders,
+                        state.folder_info,
+                        parent_path is not None,
+                    )
+                except Exception as e:
+                    logger.error(
+                        f"Błąd zapisu sum rekurencyjnych {folder_path}: {e}"
+                    )
+            if parent_path is None:
+                return
+            with self._lock:
+                parent_state = self._folders.get(parent_path)
+                if parent_state is None or folder_path not in parent_state.pending:
+                    return
+                parent_state.pending.discard(folder_path)
+                parent_state.children[folder_path] = (totals, state.listed)
+            folder_path = parent_path
@@ -0,0 +1,447 @@
+# folder_watcher.py
+import logging
+import os
+import threading
+import time
+
+import catalog
+import config_manager
+import ignore_rules
+import scanner_logic
+
+try:
+    # pip install watchdog - bez niego obserwator używa odpytywania
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+# Systemy plików, na których powiadomienia jądra nie widzą zmian z innych maszyn
+NETWORK_FILESYSTEMS = frozenset(
+    (
+        "cifs",
+        "smb3",
+        "smbfs",
+        "nfs",
+        "nfs4",
+        "afs",
+        "9p",
+        "davfs",
+        "fuse.sshfs",
+        "fuse.rclone",
+    )
+)
+
+DEFAULT_BATCH_DELAY = 2.0  # cisza (s) po ostatnim zdarzeniu przed przetworzeniem
+DEFAULT_MAX_BATCH_DELAY = 30.0  # najdłuższe odkładanie partii przy ciągłych zmianach
+DEFAULT_POLL_INTERVAL = 30.0  # co ile sekund odpytywać foldery (tryb polling)
+
+WATCH_MODES = ("auto", "native", "polling")
+
+
+def get_watcher_settings():
+    """Zwraca ustawienia obserwatora z sekcji watcher konfiguracji."""
+    settings = config_manager.get_config_value("watcher", {}) or {}
+    mode = settings.get("mode", "auto")
+    if mode not in WATCH_MODES:
+        logger.warning(f"Nieznany tryb obserwatora '{mode}', używam auto")
+        mode = "auto"
+    return {
+        "enabled": bool(settings.get("enabled", True)),
+        "mode": mode,
+        "batch_delay": float(settings.get("batch_delay_seconds", DEFAULT_BATCH_DELAY)),
+        "max_batch_delay": float(
+            settings.get("max_batch_delay_seconds", DEFAULT_MAX_BATCH_DELAY)
+        ),
+        "poll_interval": float(
+            settings.get("poll_interval_seconds", DEFAULT_POLL_INTERVAL)
+        ),
+    }
+
+
+def is_network_path(path):
+    """Sprawdza, czy ścieżka leży na udziale sieciowym (UNC, dysk sieciowy, NFS/SMB)."""
+    path = os.path.abspath(path)
+    if path.startswith("\\\\") or path.startswith("//"):
+        return True
+
+    if os.name == "nt":
+        import ctypes
+
+        drive = os.path.splitdrive(path)[0]
+        if not drive:
+            return False
+        DRIVE_REMOTE = 4
+        return ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == DRIVE_REMOTE
+
+    best_mount, best_type = "", ""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 3:
+                    continue
+                mount_point = parts[1].replace("\\040", " ")
+                if len(mount_point) > len(best_mount) and catalog.is_path_within(
+                    path, mount_point
+                ):
+                    best_mount, best_type = mount_point, parts[2]
+    except OSError:
+        return False
+    return best_type in NETWORK_FILESYSTEMS
+
+
+class ChangeBatcher:
+    """
+    Zbiera zmienione foldery i przekazuje je do handler(batch) partiami:
+    po batch_delay sekundach ciszy albo najpóźniej po max_batch_delay od
+    pierwszego zdarzenia. batch to słownik {folder: recursive}.
+    """
+
+    def __init__(self, handler, batch_delay, max_batch_delay):
+        self.handler = handler
+        self.batch_delay = batch_delay
+        self.max_batch_delay = max_batch_delay
+        self._condition = threading.Condition()
+        self._pending = {}
+        self._first_event = None
+        self._last_event = None
+        self._paused = False
+        self._stopped = False
+        self._thread = threading.Thread(
+            target=self._run, name="watcher-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def add(self, folder_path, recursive=False):
+        with self._condition:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_event = now
+            self._last_event = now
+            self._pending[folder_path] = self._pending.get(folder_path) or recursive
+            self._condition.notify()
+
+    def pause(self):
+        """Wstrzymuje przetwarzanie (zdarzenia są dalej zbierane)."""
+        with self._condition:
+            self._paused = True
+
+    def resume(self):
+        with self._condition:
+            self._paused = False
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (self._paused or not self._pending):
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                due = min(
+                    self._last_event + self.batch_delay,
+                    self._first_event + self.max_batch_delay,
+                )
+                wait_time = due - time.monotonic()
+                if wait_time > 0:
+                    self._condition.wait(wait_time)
+                    continue
+                batch, self._pending = self._pending, {}
+
+            try:
+                self.handler(batch)
+            except Exception as e:
+                logger.exception(f"Błąd przetwarzania zmian w folderach: {e}")
+
+
+class NativeEventHandler(FileSystemEventHandler):
+    """Przekazuje zdarzenia watchdog (inotify/ReadDirectoryChangesW) do obserwatora."""
+
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        if event.event_type not in ("created", "deleted", "modified", "moved"):
+            return
+        self.watcher.path_changed(event.src_path, event.event_type, event.is_directory)
+        dest_path = getattr(event, "dest_path", "")
+        if dest_path:
+            self.watcher.path_changed(dest_path, "created", event.is_directory)
+
+
+class PollingBackend:
+    """
+    Odpytywanie dla udziałów sieciowych: co interval sekund stat każdego
+    znanego folderu (jedno zapytanie na folder). Zmiana mtime folderu
+    oznacza dodanie, usunięcie lub zmianę nazwy wpisu; tylko wtedy folder
+    jest listowany w poszukiwaniu nowych podfolderów.
+    Zapis index.json przez indeksator też zmienia mtime folderu - mtime
+    zgłoszony przez index_written nie jest traktowany jako zmiana.
+    """
+
+    def __init__(self, watcher, interval):
+        self.watcher = watcher
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._mtimes = {}
+        self._own_writes = {}  # folder -> mtime_ns po zapisie index.json
+        self._own_writes_lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="watcher-polling", daemon=True
+        )
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _add_tree(self, root_path):
+        """Zapamiętuje mtime folderu i wszystkich jego podfolderów."""
+        folder_stack = [root_path]
+        while folder_stack and not self._stop_event.is_set():
+            folder_path = folder_stack.pop()
+            try:
+                self._mtimes[folder_path] = os.stat(folder_path).st_mtime_ns
+                with os.scandir(folder_path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(
+                            follow_symlinks=False
+                        ) and not self.watcher.is_ignored(entry.path):
+                            folder_stack.append(entry.path)
+            except OSError as e:
+                logger.debug(f"Pominięto przy obserwacji {folder_path}: {e}")
+
+    def index_written(self, folder_path, mtime_ns):
+        """Zapamiętuje mtime folderu po zapisie jego index.json (dowolny wątek)."""
+        with self._own_writes_lock:
+            self._own_writes[folder_path] = mtime_ns
+
+    def _forget_tree(self, folder_path):
+        prefix = folder_path.rstrip(os.sep) + os.sep
+        for path in list(self._mtimes):
+            if path == folder_path or path.startswith(prefix):
+                del self._mtimes[path]
+
+    def _poll(self):
+        for folder_path in sorted(self._mtimes):
+            if self._stop_event.is_set():
+                return
+            if folder_path not in self._mtimes:
+                continue  # usunięty razem z rodzicem
+            try:
+                mtime_ns = os.stat(folder_path).st_mtime_ns
+            except FileNotFoundError:
+                self._forget_tree(folder_path)
+                self.watcher.path_changed(folder_path, "deleted", True)
+                continue
+            except OSError as e:
+                logger.debug(f"Błąd odpytywania {folder_path}: {e}")
+                continue
+            if mtime_ns == self._mtimes[folder_path]:
+                continue
+
+            self._mtimes[folder_path] = mtime_ns
+            with self._own_writes_lock:
+                own_write_mtime = self._own_writes.pop(folder_path, None)
+            if mtime_ns == own_write_mtime:
+                continue  # jedyna zmiana to zapis index.json przez indeksator
+            self.watcher.folder_changed(folder_path)
+            try:
+                with os.scandir(folder_path) as entries:
+                    new_folders = [
+                        entry.path
+                        for entry in entries
+                        if entry.is_dir(follow_symlinks=False)
+                        and entry.path not in self._mtimes
+                        and not self.watcher.is_ignored(entry.path)
+                    ]
+            except OSError:
+                continue
+            for new_folder in new_folders:
+                self._add_tree(new_folder)
+                self.watcher.folder_changed(new_folder, recursive=True)
+
+    def _run(self):
+        self._add_tree(self.watcher.root_path)
+        logger.info(f"Odpytywanie {len(self._mtimes)} folderów co {self.interval:g} s")
+        while not self._stop_event.wait(self.interval):
+            self._poll()
+
+
+class FolderWatcher:
+    """
+    Obserwuje drzewo folderu roboczego i utrzymuje aktualne indeksy.
+    Zmiany są grupowane per folder (ChangeBatcher), zmienione foldery są
+    indeksowane ponownie przez scanner_logic.process_folder (przyrostowo),
+    a on_reindexed(foldery) dostaje listę folderów, których strony galerii
+    trzeba odświeżyć (zmienione foldery, foldery z nowymi sumami
+    rekurencyjnymi i ich rodzice - kafelki podfolderów).
+    Tryb native używa watchdog (inotify itp.), polling - odpytywania;
+    auto wybiera polling dla udziałów sieciowych lub gdy brak watchdog.
+    """
+
+    def __init__(
+        self,
+        root_path,
+        on_reindexed=None,
+        progress_callback=None,
+        mode="auto",
+        batch_delay=DEFAULT_BATCH_DELAY,
+        max_batch_delay=DEFAULT_MAX_BATCH_DELAY,
+        poll_interval=DEFAULT_POLL_INTERVAL,
+    ):
+        self.root_path = os.path.abspath(root_path)
+        self.on_reindexed = on_reindexed
+        self.progress_callback = progress_callback
+        self.mode = self._resolve_mode(mode)
+        self.poll_interval = poll_interval
+        self.ignore_matcher = ignore_rules.get_ignore_matcher(self.root_path)
+        self._batcher = ChangeBatcher(self.reindex_folders, batch_delay, max_batch_delay)
+        self._observer = None
+        self._polling = None
+
+    @classmethod
+    def from_config(cls, root_path, on_reindexed=None, progress_callback=None):
+        """Tworzy obserwator z ustawień konfiguracji albo zwraca None (wyłączony)."""
+        settings = get_watcher_settings()
+        if not settings["enabled"]:
+            return None
+        return cls(
+            root_path,
+            on_reindexed,
+            progress_callback,
+            mode=settings["mode"],
+            batch_delay=settings["batch_delay"],
+            max_batch_delay=settings["max_batch_delay"],
+            poll_interval=settings["poll_interval"],
+        )
+
+    def _resolve_mode(self, mode):
+        if mode == "native" and Observer is None:
+            logger.warning("Brak pakietu watchdog - obserwator użyje odpytywania")
+            return "polling"
+        if mode == "auto":
+            if Observer is None or is_network_path(self.root_path):
+                return "polling"
+            return "native"
+        return mode
+
+    def start(self):
+        if self.mode == "native":
+            self._observer = Observer()
+            self._observer.schedule(
+                NativeEventHandler(self), self.root_path, recursive=True
+            )
+            self._observer.daemon = True
+            self._observer.start()
+        else:
+            self._polling = PollingBackend(self, self.poll_interval)
+            self._polling.start()
+        logger.info(f"Obserwowanie folderu ({self.mode}): {self.root_path}")
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+        if self._polling is not None:
+            self._polling.stop()
+            self._polling = None
+        self._batcher.stop()
+        logger.info(f"Zatrzymano obserwowanie folderu: {self.root_path}")
+
+    def pause(self):
+        """Wstrzymuje indeksowanie (np. na czas pełnego skanowania)."""
+        self._batcher.pause()
+
+    def resume(self):
+        self._batcher.resume()
+
+    # --- Zdarzenia ---
+
+    def is_ignored(self, path, is_dir=True):
+        """Czy ścieżka jest pomijana według reguł ignore (.3dindexignore)."""
+        return self.ignore_matcher.is_ignored_path(path, is_dir)
+
+    def folder_changed(self, folder_path, recursive=False):
+        if catalog.is_path_within(
+            folder_path, self.root_path
+        ) and not self.is_ignored(folder_path):
+            self._batcher.add(os.path.abspath(folder_path), recursive)
+
+    def path_changed(self, path, event_type, is_directory):
+        """Mapuje zdarzenie dla ścieżki na foldery do ponownego indeksowania."""
+        if not is_directory and scanner_logic.is_index_file_name(
+            os.path.basename(path)
+        ):
+            return  # własne zapisy index.json
+        if os.path.basename(path) == ignore_rules.IGNORE_FILE_NAME:
+            # Nowe reguły mogą pominąć lub przywrócić całe poddrzewo
+            self.ignore_matcher = ignore_rules.get_ignore_matcher(self.root_path)
+            self.folder_changed(os.path.dirname(path), recursive=True)
+            return
+        if self.is_ignored(path, is_directory):
+            return
+        if is_directory and event_type == "modified":
+            return  # zmiany wpisów folderu przychodzą jako osobne zdarzenia
+        self.folder_changed(os.path.dirname(path))
+        if is_directory and event_type in ("created", "deleted"):
+            self.folder_changed(path, recursive=event_type == "created")
+
+    def index_written(self, folder_path, mtime_ns):
+        """
+        Zgłoszenie zapisu index.json przez indeksator (ponowne indeksowanie
+        albo pełne skanowanie) - odpytywanie nie indeksuje folderu ponownie.
+        Obserwator natywny pomija zdarzenia index.json sam.
+        """
+        polling = self._polling
+        if polling is not None:
+            polling.index_written(folder_path, mtime_ns)
+
+    # --- Indeksowanie ---
+
+    def reindex_folders(self, batch):
+        """Indeksuje ponownie partię folderów {folder: recursive}."""
+        context = scanner_logic.ScanContext.for_folder(
+            self.root_path,
+            self.progress_callback,
+            incremental=True,
+            on_index_written=self.index_written,
+        )
+        changed_folders = []
+        try:
+            for folder_path in sorted(batch, key=lambda path: path.count(os.sep)):
+                if not os.path.isdir(folder_path):
+                    if context.catalog is not None:
+                        context.catalog.remove_folder(folder_path)
+                    continue
+                logger.info(f"Zmiany w folderze, ponowne indeksowanie: {folder_path}")
+                scanner_logic.process_folder(
+                    folder_path, recursive=batch[folder_path], context=context
+                )
+                changed_folders.append(folder_path)
+        finally:
+            context.flush()
+
+        pages = []
+        # Foldery nadrzędne z nowymi sumami rekurencyjnymi też zmieniają kafelki
+        for folder_path in changed_folders + context.totals_updated:
+            parent_path = os.path.dirname(folder_path)
+            for page_folder in (folder_path, parent_path):
+                if page_folder not in pages and catalog.is_path_within(
+                    page_folder, self.root_path
+                ):
+                    pages.append(page_folder)
+        if pages and self.on_reindexed:
+            self.on_reindexed(pages)
+        return pages
@@ -0,0 +1,198 @@
+# fuzzy_matcher.py
+import logging
+import os
+import re
+from collections import Counter, defaultdict
+
+import config_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.7  # minimalne podobieństwo nazw (współczynnik Dice)
+DEFAULT_MARGIN = 0.05  # wymagana przewaga nad drugim kandydatem
+MAX_CANDIDATES = 8  # kandydaci z indeksu oceniani dokładnie
+# Trigramy występujące w więcej niż tylu obrazach (albo w ćwierci folderu)
+# nie wyznaczają kandydatów - lista takich obrazów rośnie z wielkością folderu
+MIN_POSTING_LIMIT = 64
+
+# Słowa opisujące rodzaj pliku, a nie przedmiot modelu
+# ("Porsche Panamera 3D Model.rar" ↔ "Porsche Panamera.jpg")
+GENERIC_TOKENS = frozenset(
+    (
+        "3d",
+        "model",
+        "models",
+        "preview",
+        "render",
+        "thumb",
+        "thumbnail",
+        "cover",
+        "podglad",
+        "podgląd",
+        "img",
+        "image",
+        "free",
+        "max",
+        "obj",
+        "fbx",
+        "blend",
+        "c4d",
+        "3ds",
+        "vray",
+        "corona",
+    )
+)
+WORD_PATTERN = re.compile(r"[^\W_]+")
+# Słowa dzielone na litery i liczby ("Chair01" -> "chair", "1")
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+")
+
+
+def get_fuzzy_settings(config=None):
+    """
+    Zwraca ustawienia dopasowania przybliżonego z sekcji fuzzy_matching
+    albo None, gdy jest wyłączone (config: migawka konfiguracji przebiegu).
+    """
+    settings = config_manager.get_config_value("fuzzy_matching", {}, config) or {}
+    if not settings.get("enabled", True):
+        return None
+    try:
+        threshold = float(settings.get("threshold", DEFAULT_THRESHOLD))
+        margin = float(settings.get("margin", DEFAULT_MARGIN))
+    except (TypeError, ValueError):
+        logger.warning("Nieprawidłowe ustawienia fuzzy_matching, używam domyślnych")
+        threshold, margin = DEFAULT_THRESHOLD, DEFAULT_MARGIN
+    return {"threshold": threshold, "margin": margin}
+
+
+def tokenize(name):
+    """
+    Dzieli nazwę na słowa i liczby (małe litery, liczby bez zer wiodących),
+    z pominięciem słów ogólnych - chyba że nazwa składa się tylko z nich.
+    """
+    words = WORD_PATTERN.findall(name.lower())
+    words = [word for word in words if word not in GENERIC_TOKENS] or words
+    return [
+        (token.lstrip("0") or "0") if token.isdigit() else token
+        for word in words
+        for token in TOKEN_PATTERN.findall(word)
+    ]
+
+
+def name_trigrams(tokens):
+    """Zbiór trigramów słów (każde słowo otoczone spacjami)."""
+    trigrams = set()
+    for token in tokens:
+        padded = f" {token} "
+        trigrams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def numbers_conflict(numbers, other_numbers):
+    """
+    Czy liczby w nazwach się wykluczają ("Chair 01" i "Chair 02").
+    Liczby jednej nazwy zawarte w drugiej ("Porsche 911 2019" i "Porsche 911")
+    nie są konfliktem.
+    """
+    return bool(
+        numbers
+        and other_numbers
+        and not (numbers <= other_numbers or other_numbers <= numbers)
+    )
+
+
+class FuzzyMatcher:
+    """
+    Drugi etap dopasowania podglądów: dla plików, których nazwy nie pasują
+    dokładnie ani prefiksem, szuka obrazu o podobnej nazwie.
+    Indeks odwrócony trigramów obrazów jednego folderu wyznacza kilku
+    kandydatów na plik, więc koszt rośnie prawie liniowo z wielkością folderu;
+    kandydaci są oceniani współczynnikiem Dice zbiorów trigramów.
+    Dopasowanie wymaga podobieństwa co najmniej threshold i przewagi margin
+    nad drugim kandydatem; sprzeczne liczby w nazwach wykluczają parę.
+    """
+
+    def __init__(
+        self, image_files, threshold=DEFAULT_THRESHOLD, margin=DEFAULT_MARGIN
+    ):
+        self.image_files = list(image_files)
+        self.threshold = threshold
+        self.margin = margin
+        self.trigrams = []
+        self.numbers = []
+        self.postings = defaultdict(list)  # trigram -> indeksy obrazów
+
+        for index, img_path in enumerate(self.image_files):
+            tokens = tokenize(os.path.splitext(os.path.basename(img_path))[0])
+            trigrams = name_trigrams(tokens)
+            self.trigrams.append(trigrams)
+            self.numbers.append({token for token in tokens if token.isdigit()})
+            for trigram in trigrams:
+                self.postings[trigram].append(index)
+        self.posting_limit = max(MIN_POSTING_LIMIT, len(self.image_files) // 4)
+
+    def candidate_indexes(self, trigrams):
+        """Obrazy z największą liczbą wspólnych trigramów (bez trigramów częstych)."""
+        shared = Counter()
+        for trigram in trigrams:
+            posting = self.postings.get(trigram)
+            if posting and len(posting) <= self.posting_limit:
+                shared.update(posting)
+        return [index for index, _ in shared.most_common(MAX_CANDIDATES)]
+
+    def score(self, trigrams, numbers, index):
+        """Podobieństwo nazwy do obrazu index (0-1)."""
+        if numbers_conflict(numbers, self.numbers[index]):
+            return 0.0
+        image_trigrams = self.trigrams[index]
+        total = len(trigrams) + len(image_trigrams)
+        if not total:
+            return 0.0
+        return 2 * len(trigrams & image_trigrams) / total
+
+    def rank(self, base_filename):
+        """Zwraca [(podobieństwo, indeks obrazu)] kandydatów, najlepsi pierwsi."""
+        tokens = tokenize(base_filename)
+        trigrams = name_trigrams(tokens)
+        numbers = {token for token in tokens if token.isdigit()}
+        scored = [
+            (self.score(trigrams, numbers, index), index)
+            for index in self.candidate_indexes(trigrams)
+        ]
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return scored
+
+    def best_match(self, base_filename):
+        """
+        Zwraca (podobieństwo, indeks obrazu) najlepszego kandydata albo None,
+        gdy jest poniżej progu lub zbyt bliski drugiemu.
+        """
+        scored = self.rank(base_filename)
+        if not scored or scored[0][0] < self.threshold:
+            return None
+        if len(scored) > 1 and scored[0][0] - scored[1][0] < self.margin:
+            return None
+        return scored[0]
+
+    def match_all(self, base_filenames):
+        """
+        Dopasowuje listę nazw bazowych plików. Każdy obraz trafia do co
+        najwyżej jednego pliku - przy konflikcie wygrywa wyższe podobieństwo.
+        Zwraca {pozycja nazwy: (ścieżka obrazu, podobieństwo)}.
+        """
+        if not self.image_files:
+            return {}
+        proposals = []
+        for position, base_filename in enumerate(base_filenames):
+            match = self.best_match(base_filename)
+            if match is not None:
+                proposals.append((match[0], position, match[1]))
+        proposals.sort(key=lambda item: (-item[0], item[1]))
+
+        matches = {}
+        used_images = set()
+        for score, position, index in proposals:
+            if index in used_images:
+                continue
+            used_images.add(index)
+            matches[position] = (self.image_files[index], score)
+        return matches
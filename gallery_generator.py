@@ -1,12 +1,19 @@
 # gallery_generator.py
-import json
 import os
 import re
 import shutil
+import time
 
 from jinja2 import Environment, FileSystemLoader
 
+import catalog
 import config_manager
+import ignore_rules
+import index_stream
+import thumbnail_cache
+
+# Liczba rekordów, dla których miniatury są pobierane jednym wywołaniem
+TILE_BATCH_SIZE = 500
 
 
 def sanitize_path_for_foldername(path_str):
@@ -71,8 +78,12 @@ def generate_breadcrumb(relative_path_from_scanned_root, gallery_root_name):
     return parts, depth
 
 
-def should_regenerate_gallery(index_json_path, output_html_path):
-    """Sprawdza czy galeria powinna być wygenerowana ponownie."""
+def should_regenerate_gallery(index_json_path, output_html_path, source_mtime=None):
+    """
+    Sprawdza czy galeria powinna być wygenerowana ponownie.
+    source_mtime: czas zapisu danych folderu (np. z katalogu); domyślnie
+    mtime pliku index_json_path.
+    """
     if not os.path.exists(output_html_path):
         return True
 
@@ -95,7 +106,65 @@ def should_regenerate_gallery(index_json_path, output_html_path):
         ) > os.path.getmtime(output_html_path):
             return True
 
-    return os.path.getmtime(index_json_path) > os.path.getmtime(output_html_path)
+    if source_mtime is None:
+        source_mtime = os.path.getmtime(index_json_path)
+    return source_mtime > os.path.getmtime(output_html_path)
+
+
+def build_subfolder_entry(name, folder_info):
+    """
+    Zwraca dane kafelka podfolderu na podstawie jego folder_info
+    (sumy rekurencyjne, a w starszych indeksach - statystyki samego folderu).
+    """
+    stats = folder_info.get("recursive") or folder_info
+    return {
+        "name": name,
+        "link": f"{name}/index.html",
+        "total_size_readable": stats.get("total_size_readable", "0 B"),
+        "file_count": stats.get("file_count", 0),
+        "subdir_count": stats.get("subdir_count", 0),
+        "without_previews_count": stats.get("without_previews_count", 0),
+    }
+
+
+def read_subfolders_from_folder_info(folder_info, folder_rules=None):
+    """
+    Zwraca kafelki podfolderów z folder_info["subfolders"] folderu (sumy
+    zapisane przez skaner) albo None, gdy indeks ich nie zawiera.
+    """
+    entries = folder_info.get("subfolders")
+    if entries is None:
+        return None
+    return [
+        build_subfolder_entry(entry["name"], entry)
+        for entry in entries
+        if not (folder_rules and folder_rules.is_ignored(entry["name"], True))
+    ]
+
+
+def read_subfolders_from_index_files(folder_abs_path, ignore_matcher=None):
+    """
+    Zbiera podfoldery z index.json (gdy folder nie jest w katalogu),
+    z pominięciem folderów wykluczonych regułami ignore_matcher.
+    """
+    folder_rules = (
+        ignore_matcher.get_folder_rules(folder_abs_path) if ignore_matcher else None
+    )
+    subfolders = []
+    for entry in os.scandir(folder_abs_path):
+        if folder_rules and folder_rules.is_ignored(entry.name, True):
+            continue
+        if entry.is_dir():
+            if os.path.exists(os.path.join(entry.path, "index.json")):
+                # Wczytaj statystyki z index.json podfolderu
+                try:
+                    folder_info = index_stream.read_folder_info(
+                        os.path.join(entry.path, "index.json")
+                    )
+                    subfolders.append(build_subfolder_entry(entry.name, folder_info))
+                except:
+                    subfolders.append(build_subfolder_entry(entry.name, {}))
+    return subfolders
 
 
 def process_single_index_json(
@@ -104,19 +173,103 @@ def process_single_index_json(
     gallery_output_base_path,
     template_env,
     progress_callback=None,
+    thumbnails=None,
+    ignore_matcher=None,
+    config=None,
 ):
     if progress_callback:
         progress_callback(f"Generowanie galerii dla: {index_json_path}")
 
     try:
-        with open(index_json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        # Sekcje rekordów są czytane z pliku dopiero przy renderowaniu
+        data = index_stream.load_index(index_json_path)
     except Exception as e:
         if progress_callback:
             progress_callback(f"Błąd odczytu {index_json_path}: {e}")
         return None
 
     current_folder_abs_path = os.path.dirname(index_json_path)
+    return render_folder_gallery(
+        current_folder_abs_path,
+        data,
+        scanned_root_path,
+        gallery_output_base_path,
+        template_env,
+        progress_callback,
+        source_mtime=os.path.getmtime(index_json_path),
+        thumbnails=thumbnails,
+        ignore_matcher=ignore_matcher,
+        config=config,
+    )
+
+
+def process_catalog_folder(
+    folder_catalog,
+    folder_abs_path,
+    scanned_root_path,
+    gallery_output_base_path,
+    template_env,
+    progress_callback=None,
+    source_mtime=None,
+    thumbnails=None,
+    ignore_matcher=None,
+    config=None,
+):
+    """Generuje stronę galerii folderu na podstawie katalogu skanowania."""
+    if source_mtime is None:
+        source_mtime = folder_catalog.get_updated_at(folder_abs_path) or time.time()
+    if progress_callback:
+        progress_callback(f"Generowanie galerii dla: {folder_abs_path}")
+
+    data = folder_catalog.get_index_data(folder_abs_path)
+    if data is None:
+        if progress_callback:
+            progress_callback(f"Brak folderu w katalogu: {folder_abs_path}")
+        return None
+
+    folder_rules = (
+        ignore_matcher.get_folder_rules(folder_abs_path) if ignore_matcher else None
+    )
+    subfolders = [
+        build_subfolder_entry(name, folder_info)
+        for name, folder_info in folder_catalog.get_subfolders(folder_abs_path)
+        if not (folder_rules and folder_rules.is_ignored(name, True))
+    ]
+    return render_folder_gallery(
+        folder_abs_path,
+        data,
+        scanned_root_path,
+        gallery_output_base_path,
+        template_env,
+        progress_callback,
+        source_mtime=source_mtime,
+        subfolders=subfolders,
+        thumbnails=thumbnails,
+        config=config,
+    )
+
+
+def render_folder_gallery(
+    current_folder_abs_path,
+    data,
+    scanned_root_path,
+    gallery_output_base_path,
+    template_env,
+    progress_callback=None,
+    source_mtime=None,
+    subfolders=None,
+    thumbnails=None,
+    ignore_matcher=None,
+    config=None,
+):
+    """
+    Renderuje index.html galerii jednego folderu z danych w formacie index.json.
+    subfolders: gotowe kafelki podfolderów; None = z folder_info["subfolders"]
+    albo (starsze indeksy) z index.json podfolderów.
+    thumbnails: ThumbnailCache - kafelki wskazują miniatury zamiast oryginałów.
+    ignore_matcher: IgnoreMatcher - pomijane podfoldery nie dostają kafelków.
+    config: migawka konfiguracji generowania galerii (None = bieżąca).
+    """
     relative_path_from_scanned_root = os.path.relpath(
         current_folder_abs_path, scanned_root_path
     )
@@ -132,22 +285,41 @@ def process_single_index_json(
     os.makedirs(current_gallery_html_dir, exist_ok=True)
 
     output_html_file = os.path.join(current_gallery_html_dir, "index.html")
+    manifest_file = os.path.join(
+        current_gallery_html_dir, thumbnail_cache.PAGE_MANIFEST_NAME
+    )
 
-    # Użyj inteligentnego cachowania
-    if os.path.exists(output_html_file) and not should_regenerate_gallery(
-        index_json_path, output_html_file
+    # Użyj inteligentnego cachowania - aktualna strona wymaga jeszcze
+    # miniatur z ostatniego renderowania (mogły wygasnąć); źródła podglądów
+    # nie są przy tym odczytywane
+    if (
+        os.path.exists(output_html_file)
+        and not should_regenerate_gallery(None, output_html_file, source_mtime)
+        and (thumbnails is None or thumbnails.is_page_current(manifest_file))
     ):
         if progress_callback:
             progress_callback(f"Galeria {output_html_file} jest aktualna, pomijam.")
         return output_html_file
 
     template = template_env.get_template("gallery_template.html")
+    # Kolory archiwów pobierane raz na stronę, nie dla każdego kafelka
+    archive_colors = config_manager.get_config_value("archive_colors", {}, config)
+    # Miniatury użyte przez kafelki - manifest strony
+    page_thumbnails = {"thumbnails": [], "unresolved": 0}
 
     template_data = {
         "folder_info": data.get("folder_info", {}),
-        "files_with_previews": [],
-        "files_without_previews": [],
-        "other_images": [],
+        "files_with_previews": lazy_tiles(
+            data.get("files_with_previews", []),
+            lambda items: build_preview_tiles(
+                items, thumbnails, archive_colors, page_thumbnails
+            ),
+        ),
+        "files_without_previews": lazy_tiles(
+            data.get("files_without_previews", []),
+            lambda items: build_file_tiles(items, archive_colors),
+        ),
+        "other_images": lazy_tiles(data.get("other_images", []), build_image_tiles),
         "subfolders": [],
         "current_folder_display_name": (
             os.path.basename(current_folder_abs_path)
@@ -163,98 +335,329 @@ def process_single_index_json(
         relative_path_from_scanned_root, gallery_root_name
     )
 
-    # Subfolders - dodaj statystyki
-    for entry in os.scandir(current_folder_abs_path):
-        if entry.is_dir():
-            if os.path.exists(os.path.join(entry.path, "index.json")):
-                # Wczytaj statystyki z index.json podfolderu
-                try:
-                    with open(
-                        os.path.join(entry.path, "index.json"), "r", encoding="utf-8"
-                    ) as f:
-                        subfolder_data = json.load(f)
-                        folder_info = subfolder_data.get("folder_info", {})
-                        template_data["subfolders"].append(
-                            {
-                                "name": entry.name,
-                                "link": f"{entry.name}/index.html",
-                                "total_size_readable": folder_info.get(
-                                    "total_size_readable", "0 B"
-                                ),
-                                "file_count": folder_info.get("file_count", 0),
-                                "subdir_count": folder_info.get("subdir_count", 0),
-                            }
-                        )
-                except:
-                    template_data["subfolders"].append(
-                        {
-                            "name": entry.name,
-                            "link": f"{entry.name}/index.html",
-                            "total_size_readable": "0 B",
-                            "file_count": 0,
-                            "subdir_count": 0,
-                        }
-                    )
+    # Subfolders - dodaj statystyki (z własnego indeksu, a w starszych
+    # indeksach - z index.json każdego podfolderu)
+    if subfolders is None:
+        folder_rules = (
+            ignore_matcher.get_folder_rules(current_folder_abs_path)
+            if ignore_matcher
+            else None
+        )
+        subfolders = read_subfolders_from_folder_info(
+            template_data["folder_info"], folder_rules
+        )
+    if subfolders is None:
+        subfolders = read_subfolders_from_index_files(
+            current_folder_abs_path, ignore_matcher
+        )
+    template_data["subfolders"].extend(subfolders)
 
-    # Files with previews - używaj bezpośrednich ścieżek
-    for item in data.get("files_with_previews", []):
-        copied_item = item.copy()
-        copied_item["archive_link"] = f"file:///{item['path_absolute']}"
-        if item.get("preview_path_absolute"):
-            copied_item["preview_relative_path"] = (
-                f"file:///{item['preview_path_absolute']}"
+    # Strona jest zapisywana w trakcie renderowania (kafelki powstają przy
+    # iteracji szablonu), przez plik tymczasowy - błąd nie zostawia połowy strony
+    temp_html_file = f"{output_html_file}.{os.getpid()}.tmp"
+    try:
+        template.stream(template_data).dump(temp_html_file, encoding="utf-8")
+        os.replace(temp_html_file, output_html_file)
+        if thumbnails is not None:
+            thumbnails.write_page_manifest(
+                manifest_file,
+                page_thumbnails["thumbnails"],
+                complete=not page_thumbnails["unresolved"],
             )
+        elif os.path.exists(manifest_file):
+            # Strona bez miniatur - manifest nie może jej uznać za aktualną
+            # po ponownym włączeniu miniatur
+            os.remove(manifest_file)
+        if progress_callback:
+            progress_callback(f"Zapisano galerię: {output_html_file}")
+    except Exception as e:
+        if os.path.exists(temp_html_file):
+            os.remove(temp_html_file)
+        if progress_callback:
+            progress_callback(
+                f"Błąd generowania HTML dla {current_folder_abs_path}: {e}"
+            )
+        return None
+
+    return output_html_file
 
-        # DODAJ KOLOR ARCHIWUM NA PODSTAWIE ROZSZERZENIA
-        file_name = item.get("name", "")
-        file_ext = os.path.splitext(file_name)[1].lower()
-        copied_item["archive_color"] = config_manager.get_archive_color(file_ext)
 
-        template_data["files_with_previews"].append(copied_item)
+def lazy_tiles(items, build_tiles):
+    """Sekcja kafelków szablonu tworzonych z items przy każdej iteracji."""
+    return index_stream.LazySection(lambda: build_tiles(items), lambda: len(items))
 
-    # Files without previews
-    for item in data.get("files_without_previews", []):
+
+def get_tile_archive_color(item, archive_colors=None):
+    # DODAJ KOLOR ARCHIWUM NA PODSTAWIE ROZSZERZENIA
+    # (skaner zapisuje rozszerzenie z obsługą .tar.gz itp.)
+    file_name = item.get("name", "")
+    file_ext = item.get("extension") or os.path.splitext(file_name)[1].lower()
+    return config_manager.get_archive_color(file_ext, archive_colors)
+
+
+def build_preview_tiles(
+    items, thumbnails=None, archive_colors=None, page_thumbnails=None
+):
+    """
+    Kafelki plików z podglądem - używaj bezpośrednich ścieżek. Miniatury
+    są pobierane porcjami po TILE_BATCH_SIZE rekordów, z kluczem z rozmiaru
+    i mtime podglądu zapisanych w rekordzie.
+    archive_colors: sekcja archive_colors konfiguracji (None = odczyt).
+    page_thumbnails: {"thumbnails": [], "unresolved": 0} - uzupełniane
+    użytymi miniaturami i liczbą obrazów bez miniatury ani znacznika.
+    """
+    for batch in index_stream.iter_batches(items, TILE_BATCH_SIZE):
+        tile_thumbnails = {}
+        if thumbnails is not None:
+            tile_thumbnails, unresolved = thumbnails.get_many(
+                (
+                    item["preview_path_absolute"],
+                    item.get("preview_size_bytes"),
+                    item.get("preview_mtime_ns"),
+                )
+                for item in batch
+                if item.get("preview_path_absolute")
+            )
+            if page_thumbnails is not None:
+                page_thumbnails["thumbnails"].extend(tile_thumbnails.values())
+                page_thumbnails["unresolved"] += unresolved
+        for item in batch:
+            copied_item = item.copy()
+            copied_item["archive_link"] = f"file:///{item['path_absolute']}"
+            if item.get("preview_path_absolute"):
+                copied_item["preview_relative_path"] = (
+                    f"file:///{item['preview_path_absolute']}"
+                )
+                thumbnail_path = tile_thumbnails.get(item["preview_path_absolute"])
+                if thumbnail_path:
+                    copied_item["thumbnail_path"] = f"file:///{thumbnail_path}"
+            copied_item["archive_color"] = get_tile_archive_color(
+                item, archive_colors
+            )
+            yield copied_item
+
+
+def build_file_tiles(items, archive_colors=None):
+    """Kafelki plików bez podglądu."""
+    for item in items:
         copied_item = item.copy()
         copied_item["archive_link"] = f"file:///{item['path_absolute']}"
+        copied_item["archive_color"] = get_tile_archive_color(item, archive_colors)
+        yield copied_item
 
-        # DODAJ KOLOR ARCHIWUM
-        file_name = item.get("name", "")
-        file_ext = os.path.splitext(file_name)[1].lower()
-        copied_item["archive_color"] = config_manager.get_archive_color(file_ext)
 
-        template_data["files_without_previews"].append(copied_item)
-
-    # Other images - używaj bezpośrednich ścieżek
-    for item in data.get("other_images", []):
+def build_image_tiles(items):
+    """Kafelki pozostałych obrazów - używaj bezpośrednich ścieżek."""
+    for item in items:
         copied_item = item.copy()
         copied_item["file_link"] = f"file:///{item['path_absolute']}"
         if item.get("path_absolute"):
             copied_item["image_relative_path"] = f"file:///{item['path_absolute']}"
-        template_data["other_images"].append(copied_item)
+        yield copied_item
 
-    try:
-        html_content = template.render(template_data)
-        with open(output_html_file, "w", encoding="utf-8") as f:
-            f.write(html_content)
-        if progress_callback:
-            progress_callback(f"Zapisano galerię: {output_html_file}")
-    except Exception as e:
+
+def generate_folder_pages(
+    scanned_root_path,
+    gallery_output_base_path,
+    template_env,
+    progress_callback=None,
+    should_stop=None,
+    config=None,
+):
+    """
+    Generuje strony galerii wszystkich folderów i zwraca ścieżkę strony
+    głównej. Foldery są brane z katalogu skanowania (bez przechodzenia
+    drzewa); bez katalogu - z plików index.json znalezionych przez os.walk.
+    Kafelki wskazują miniatury z _gallery_cache/_thumbnails (jeśli
+    performance.cache_previews); na końcu stare miniatury są usuwane.
+    should_stop: opcjonalna funkcja przerywająca generowanie.
+    config: migawka konfiguracji - domyślnie pobierana raz na początku,
+    więc zmiany config.json w trakcie generowania go nie dotyczą.
+    """
+    if config is None:
+        config = config_manager.get_config_snapshot()
+    with thumbnail_cache.open_thumbnail_cache(
+        gallery_output_base_path, config=config
+    ) as thumbnails:
+        return _generate_folder_pages(
+            scanned_root_path,
+            gallery_output_base_path,
+            template_env,
+            progress_callback,
+            should_stop,
+            thumbnails,
+            config,
+        )
+
+
+def _generate_folder_pages(
+    scanned_root_path,
+    gallery_output_base_path,
+    template_env,
+    progress_callback,
+    should_stop,
+    thumbnails,
+    config,
+):
+    root_gallery_html_path = None
+    scanned_root_abs = os.path.abspath(scanned_root_path)
+    # Te same reguły pomijania co przy skanowaniu (starsze wyniki skanowania
+    # mogą jeszcze zawierać foldery wykluczone później)
+    ignore_matcher = ignore_rules.get_ignore_matcher(scanned_root_abs, config)
+
+    folder_catalog = catalog.find_catalog(scanned_root_path)
+    if folder_catalog is not None:
+        for folder_path, updated_at in folder_catalog.get_folders(scanned_root_abs):
+            if should_stop and should_stop():
+                return root_gallery_html_path
+            if ignore_matcher.is_ignored_path(folder_path):
+                continue
+            generated_html = process_catalog_folder(
+                folder_catalog,
+                folder_path,
+                scanned_root_abs,
+                gallery_output_base_path,
+                template_env,
+                progress_callback,
+                source_mtime=updated_at,
+                thumbnails=thumbnails,
+                ignore_matcher=ignore_matcher,
+                config=config,
+            )
+            if folder_path == scanned_root_abs and generated_html:
+                root_gallery_html_path = generated_html
+        return root_gallery_html_path
+
+    for dirpath, dirnames, filenames in os.walk(scanned_root_path):
+        if should_stop and should_stop():
+            break
+        # Pominięte poddrzewa nie są przechodzone
+        folder_rules = ignore_matcher.get_folder_rules(
+            dirpath, ignore_rules.IGNORE_FILE_NAME in filenames
+        )
+        if folder_rules:
+            dirnames[:] = [
+                name for name in dirnames if not folder_rules.is_ignored(name, True)
+            ]
+        if "index.json" in filenames:
+            index_json_file = os.path.join(dirpath, "index.json")
+            generated_html = process_single_index_json(
+                index_json_file,
+                scanned_root_path,
+                gallery_output_base_path,
+                template_env,
+                progress_callback,
+                thumbnails=thumbnails,
+                ignore_matcher=ignore_matcher,
+                config=config,
+            )
+            if (
+                dirpath == scanned_root_path and generated_html
+            ):  # This is the root index.html for the gallery
+                root_gallery_html_path = generated_html
+    return root_gallery_html_path
+
+
+def find_template_dir():
+    """Zwraca folder szablonów (obok skryptu albo w bieżącym katalogu) lub None."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    template_dir = os.path.join(script_dir, "templates")
+    if os.path.isdir(template_dir):
+        return template_dir
+    if os.path.isdir("templates"):
+        return "templates"
+    return None
+
+
+def regenerate_folder_pages(
+    scanned_root_path, folder_paths, gallery_output_base_path, progress_callback=None
+):
+    """
+    Generuje ponownie strony galerii tylko dla podanych folderów (np. po
+    zmianach wykrytych przez obserwator). Foldery z katalogu skanowania są
+    renderowane z niego, pozostałe przez process_single_index_json.
+    Zwraca listę zapisanych plików HTML.
+    """
+    template_dir = find_template_dir()
+    if template_dir is None:
         if progress_callback:
-            progress_callback(f"Błąd generowania HTML dla {index_json_path}: {e}")
-        return None
+            progress_callback("Nie znaleziono folderu szablonów ('templates').")
+        return []
+    env = Environment(loader=FileSystemLoader(template_dir))
 
-    return output_html_file
+    config = config_manager.get_config_snapshot()
+    scanned_root_abs = os.path.abspath(scanned_root_path)
+    ignore_matcher = ignore_rules.get_ignore_matcher(scanned_root_abs, config)
+    folder_catalog = catalog.find_catalog(scanned_root_path)
+    generated_pages = []
+    # Bez usuwania starych miniatur - to robi pełne generowanie galerii
+    with thumbnail_cache.open_thumbnail_cache(
+        gallery_output_base_path, evict=False, config=config
+    ) as thumbnails:
+        for folder_path in folder_paths:
+            folder_path = os.path.abspath(folder_path)
+            if ignore_matcher.is_ignored_path(folder_path):
+                continue
+            if folder_catalog is not None and folder_catalog.has_folder(folder_path):
+                generated_html = process_catalog_folder(
+                    folder_catalog,
+                    folder_path,
+                    scanned_root_abs,
+                    gallery_output_base_path,
+                    env,
+                    progress_callback,
+                    thumbnails=thumbnails,
+                    ignore_matcher=ignore_matcher,
+                    config=config,
+                )
+            elif os.path.exists(os.path.join(folder_path, "index.json")):
+                generated_html = process_single_index_json(
+                    os.path.join(folder_path, "index.json"),
+                    scanned_root_abs,
+                    gallery_output_base_path,
+                    env,
+                    progress_callback,
+                    thumbnails=thumbnails,
+                    ignore_matcher=ignore_matcher,
+                    config=config,
+                )
+            else:
+                continue
+            if generated_html:
+                generated_pages.append(generated_html)
+    return generated_pages
+
+
+def has_scan_data(scanned_root_path):
+    """Sprawdza, czy folder był już skanowany (katalog albo jakikolwiek index.json)."""
+    if catalog.find_catalog(scanned_root_path) is not None:
+        return True
+    for _, _, files in os.walk(scanned_root_path):
+        if "index.json" in files:
+            return True
+    return False
 
 
-def generate_full_gallery(scanned_root_path, gallery_cache_root_dir="."):
+def generate_full_gallery(
+    scanned_root_path,
+    gallery_cache_root_dir=".",
+    progress_callback=print,
+    should_stop=None,
+):
     """
     Generates the full gallery.
     scanned_root_path: The original directory that was scanned (e.g. W:/3Dsky/ARCHITECTURE)
     gallery_cache_root_dir: The base directory where all galleries are stored (e.g. _gallery_cache)
+    progress_callback: receives status messages (print by default)
+    should_stop: optional function that stops generation when it returns True
     """
     if not os.path.isdir(scanned_root_path):
-        print(f"Error: Scanned root path {scanned_root_path} is not a directory.")
+        progress_callback(
+            f"Error: Scanned root path {scanned_root_path} is not a directory."
+        )
         return None
+    # Configuration snapshot taken once for the whole run
+    config = config_manager.get_config_snapshot()
 
     sanitized_folder_name = sanitize_path_for_foldername(scanned_root_path)
     gallery_output_base_path = os.path.join(
@@ -269,14 +672,14 @@ def generate_full_gallery(scanned_root_path, gallery_cache_root_dir="."):
     template_dir = os.path.join(script_dir, "templates")
 
     if not os.path.isdir(template_dir):
-        print(f"Error: Template directory not found at {template_dir}")
+        progress_callback(f"Error: Template directory not found at {template_dir}")
         # Fallback if running from a different context (e.g. bundled app)
         # This might need adjustment based on how the app is packaged/run
         alt_template_dir = "templates"
         if os.path.isdir(alt_template_dir):
             template_dir = alt_template_dir
         else:
-            print("Cannot locate templates directory.")
+            progress_callback("Cannot locate templates directory.")
             return None
 
     env = Environment(loader=FileSystemLoader(template_dir))
@@ -287,27 +690,25 @@ def generate_full_gallery(scanned_root_path, gallery_cache_root_dir="."):
         try:
             shutil.copy2(css_src_path, css_dest_path)
         except Exception as e:
-            print(f"Could not copy gallery_styles.css: {e}")
+            progress_callback(f"Could not copy gallery_styles.css: {e}")
     else:
-        print(f"Warning: gallery_styles.css not found at {css_src_path}")
+        progress_callback(f"Warning: gallery_styles.css not found at {css_src_path}")
 
-    root_gallery_html_path = None
-
-    for dirpath, _, filenames in os.walk(scanned_root_path):
-        if "index.json" in filenames:
-            index_json_file = os.path.join(dirpath, "index.json")
-            generated_html = process_single_index_json(
-                index_json_file, scanned_root_path, gallery_output_base_path, env, print
-            )
-            if (
-                dirpath == scanned_root_path and generated_html
-            ):  # This is the root index.html for the gallery
-                root_gallery_html_path = generated_html
+    root_gallery_html_path = generate_folder_pages(
+        scanned_root_path,
+        gallery_output_base_path,
+        env,
+        progress_callback,
+        should_stop=should_stop,
+        config=config,
+    )
 
     if root_gallery_html_path:
-        print(f"Gallery generation complete. Root HTML at: {root_gallery_html_path}")
+        progress_callback(
+            f"Gallery generation complete. Root HTML at: {root_gallery_html_path}"
+        )
     else:
-        print("Gallery generation failed or no index.json found at root.")
+        progress_callback("Gallery generation failed or no index.json found at root.")
     return root_gallery_html_path
 
 
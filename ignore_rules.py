@@ -0,0 +1,272 @@
+# ignore_rules.py
+"""
+Reguły pomijania folderów i plików w stylu .gitignore: globalne z sekcji
+ignore w config.json (względem folderu roboczego) i lokalne z plików
+.3dindexignore (względem folderu, w którym leży plik; dotyczą całego
+poddrzewa). Pominięty folder nie jest listowany ani indeksowany.
+
+Obsługiwana składnia .gitignore: komentarze (#), negacja (!), wzorce
+tylko dla folderów (końcowe /), zakotwiczenie przez / w środku lub na
+początku wzorca, *, ?, [...] i **. Wielkość liter nie ma znaczenia
+(udziały Windows). Późniejsza reguła wygrywa, reguły głębszego pliku
+.3dindexignore wygrywają z regułami folderów nadrzędnych.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+
+import config_manager
+
+logger = logging.getLogger(__name__)
+
+IGNORE_FILE_NAME = ".3dindexignore"
+DEFAULT_PATTERNS = (".git/", "$RECYCLE.BIN/", "System Volume Information/")
+
+
+def get_ignore_settings(config=None):
+    """
+    Zwraca ustawienia z sekcji ignore konfiguracji
+    (config: migawka konfiguracji przebiegu, None = bieżąca).
+    """
+    settings = config_manager.get_config_value("ignore", {}, config) or {}
+    return {
+        "patterns": list(settings.get("patterns", DEFAULT_PATTERNS) or ()),
+        "use_ignore_files": bool(settings.get("use_ignore_files", True)),
+    }
+
+
+def translate_glob(pattern):
+    """Zamienia wzorzec .gitignore (bez ! i końcowego /) na wyrażenie regularne."""
+    parts = []
+    i = 0
+    length = len(pattern)
+    while i < length:
+        char = pattern[i]
+        if char == "*":
+            if pattern.startswith("**", i) and (i == 0 or pattern[i - 1] == "/"):
+                if pattern.startswith("**/", i):
+                    parts.append("(?:.*/)?")  # dowolna liczba folderów
+                    i += 3
+                    continue
+                if i + 2 == length:
+                    parts.append(".*")  # wszystko poniżej
+                    i += 2
+                    continue
+            while i < length and pattern[i] == "*":
+                i += 1
+            parts.append("[^/]*")
+            continue
+        if char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 1)
+            if end <= i + 1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1 : end].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append(f"[{body}]")
+                i = end
+        elif char == "\\" and i + 1 < length:
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts)
+
+
+class IgnoreRule:
+    """Pojedyncza skompilowana reguła."""
+
+    __slots__ = ("pattern", "regex", "negate", "directory_only")
+
+    def __init__(self, pattern, regex, negate, directory_only):
+        self.pattern = pattern
+        self.regex = regex
+        self.negate = negate
+        self.directory_only = directory_only
+
+    @classmethod
+    def parse(cls, line):
+        """Zwraca regułę z wiersza pliku albo None (pusty wiersz, komentarz)."""
+        pattern = line.rstrip("\r\n")
+        if pattern.endswith("\\ "):
+            pattern = pattern.rstrip(" ") + " "
+        else:
+            pattern = pattern.rstrip()
+        if not pattern or pattern.startswith("#"):
+            return None
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        elif pattern.startswith(("\\#", "\\!")):
+            pattern = pattern[1:]
+        directory_only = pattern.endswith("/")
+        glob = pattern.rstrip("/")
+        if not glob:
+            return None
+        anchored = "/" in glob
+        regex = translate_glob(glob.lstrip("/"))
+        if not anchored:
+            regex = "(?:.*/)?" + regex
+        return cls(
+            line.strip(),
+            re.compile(f"{regex}\\Z", re.IGNORECASE | re.DOTALL),
+            negate,
+            directory_only,
+        )
+
+
+class IgnoreRules:
+    """Reguły jednego źródła (konfiguracja albo plik) względem base_path."""
+
+    def __init__(self, base_path, lines, source):
+        self.base_path = base_path
+        self.source = source
+        self.rules = [rule for rule in map(IgnoreRule.parse, lines) if rule]
+
+    def match(self, relative_path, is_dir):
+        """
+        True - pomiń, False - uwzględnij (negacja), None - żadna reguła
+        nie pasuje. relative_path: ścieżka względem base_path z "/".
+        """
+        for rule in reversed(self.rules):
+            if rule.directory_only and not is_dir:
+                continue
+            if rule.regex.match(relative_path):
+                return not rule.negate
+        return None
+
+    def describe(self):
+        patterns = "\n".join(rule.pattern for rule in self.rules)
+        return f"{self.source}|{self.base_path}\n{patterns}"
+
+
+def read_ignore_file(folder_path):
+    """Wczytuje .3dindexignore folderu jako IgnoreRules (None, gdy pusty)."""
+    ignore_file_path = os.path.join(folder_path, IGNORE_FILE_NAME)
+    try:
+        with open(ignore_file_path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning(f"Nie można odczytać {ignore_file_path}: {e}")
+        return None
+    rules = IgnoreRules(folder_path, lines, ignore_file_path)
+    return rules if rules.rules else None
+
+
+class FolderIgnoreRules:
+    """
+    Reguły obowiązujące wpisy jednego folderu: łańcuch IgnoreRules od
+    konfiguracji do .3dindexignore tego folderu. Fałszywy, gdy pusty.
+    """
+
+    def __init__(self, folder_path, chain):
+        self.folder_path = folder_path
+        self.chain = chain
+        # Przedrostki ścieżek wpisów folderu względem bazy każdego źródła
+        self._prefixes = []
+        for rules in chain:
+            relative = os.path.relpath(folder_path, rules.base_path)
+            prefix = "" if relative == "." else relative.replace(os.sep, "/") + "/"
+            self._prefixes.append((rules, prefix))
+        self._prefixes.reverse()
+        self.digest = (
+            hashlib.md5(
+                "\n\n".join(rules.describe() for rules in chain).encode("utf-8")
+            ).hexdigest()
+            if chain
+            else None
+        )
+
+    def __bool__(self):
+        return bool(self.chain)
+
+    def is_ignored(self, name, is_dir):
+        """Czy wpis name tego folderu ma zostać pominięty."""
+        for rules, prefix in self._prefixes:
+            result = rules.match(prefix + name, is_dir)
+            if result is not None:
+                return result
+        return False
+
+
+class IgnoreMatcher:
+    """
+    Reguły pomijania dla drzewa root_path. Pliki .3dindexignore są
+    wczytywane raz na folder i zapamiętywane (bezpieczne dla wielu wątków).
+    """
+
+    def __init__(self, root_path, patterns=(), use_ignore_files=True):
+        self.root_path = os.path.abspath(root_path)
+        self.use_ignore_files = use_ignore_files
+        global_rules = IgnoreRules(self.root_path, patterns, "config")
+        self._global_chain = (global_rules,) if global_rules.rules else ()
+        self._lock = threading.Lock()
+        self._chains = {}
+        self._ignored_paths = {}
+
+    def _is_within_root(self, path):
+        return path == self.root_path or path.startswith(
+            self.root_path.rstrip(os.sep) + os.sep
+        )
+
+    def _get_chain(self, folder_path, has_ignore_file=None):
+        with self._lock:
+            chain = self._chains.get(folder_path)
+        if chain is not None:
+            return chain
+
+        parent_path = os.path.dirname(folder_path)
+        if folder_path == self.root_path:
+            chain = self._global_chain
+        elif parent_path != folder_path and self._is_within_root(parent_path):
+            chain = self._get_chain(parent_path)
+        else:
+            chain = ()  # folder poza drzewem - tylko jego własny plik
+
+        if self.use_ignore_files and has_ignore_file is not False:
+            own_rules = read_ignore_file(folder_path)
+            if own_rules is not None:
+                chain = chain + (own_rules,)
+        with self._lock:
+            return self._chains.setdefault(folder_path, chain)
+
+    def get_folder_rules(self, folder_path, has_ignore_file=None):
+        """
+        Zwraca FolderIgnoreRules dla wpisów folder_path. has_ignore_file:
+        czy w folderze jest .3dindexignore (np. z listowania), None = sprawdź.
+        """
+        folder_path = os.path.abspath(folder_path)
+        return FolderIgnoreRules(
+            folder_path, self._get_chain(folder_path, has_ignore_file)
+        )
+
+    def is_ignored_path(self, path, is_dir=True):
+        """Czy ścieżka lub któryś z jej folderów nadrzędnych jest pomijany."""
+        path = os.path.abspath(path)
+        if path == self.root_path or not self._is_within_root(path):
+            return False
+        with self._lock:
+            ignored = self._ignored_paths.get((path, is_dir))
+        if ignored is not None:
+            return ignored
+        parent_path = os.path.dirname(path)
+        ignored = self.is_ignored_path(parent_path) or self.get_folder_rules(
+            parent_path
+        ).is_ignored(os.path.basename(path), is_dir)
+        with self._lock:
+            self._ignored_paths[(path, is_dir)] = ignored
+        return ignored
+
+
+def get_ignore_matcher(root_path, config=None):
+    """Zwraca IgnoreMatcher drzewa root_path według ustawień ignore."""
+    settings = get_ignore_settings(config)
+    return IgnoreMatcher(root_path, settings["patterns"], settings["use_ignore_files"])
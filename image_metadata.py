@@ -0,0 +1,259 @@
+# image_metadata.py
+import json
+import logging
+import os
+import struct
+from datetime import datetime
+from pathlib import Path
+
+import config_manager
+import file_cache
+
+logger = logging.getLogger(__name__)
+
+# Wersja wyników odczytu - zmiana unieważnia pamięć metadanych i sygnatury
+# folderów (v2: nierozpoznane formaty nie są już oznaczane jako uszkodzone)
+METADATA_VERSION = 2
+METADATA_CACHE_FILE = f"image_metadata_v{METADATA_VERSION}.sqlite"
+HEADER_READ_SIZE = 64  # nagłówki PNG/GIF/WebP/BMP mieszczą się w 64 bajtach
+TAIL_READ_SIZE = 1024  # koniec pliku - do wykrywania obcięcia
+
+# Znaczniki SOF JPEG (bez DHT/JPG/DAC: C4, C8, CC) i te z kodowaniem progresywnym
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7}
+JPEG_SOF_MARKERS |= {0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+JPEG_PROGRESSIVE_MARKERS = {0xC2, 0xC6, 0xCA, 0xCE}
+# Znaczniki JPEG bez pola długości
+JPEG_STANDALONE_MARKERS = {0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7}
+
+
+class ImageHeaderError(ValueError):
+    """Nagłówek obrazu jest nieczytelny lub niepełny."""
+
+
+def is_metadata_enabled(config=None):
+    """Czy odczytywać metadane podglądów (image_metadata.enabled)."""
+    return bool(
+        config_manager.get_config_value("image_metadata.enabled", True, config)
+    )
+
+
+def _read_exact(f, count, what):
+    data = f.read(count)
+    if len(data) < count:
+        raise ImageHeaderError(f"niepełny {what}")
+    return data
+
+
+def _parse_jpeg(f):
+    # Przejście po segmentach do pierwszego SOF (długie segmenty APP
+    # z EXIF są przeskakiwane przez seek, bez czytania ich zawartości)
+    f.seek(2)
+    while True:
+        if _read_exact(f, 1, "segment JPEG") != b"\xff":
+            raise ImageHeaderError("uszkodzona struktura segmentów JPEG")
+        marker = _read_exact(f, 1, "segment JPEG")[0]
+        while marker == 0xFF:  # bajty wypełnienia
+            marker = _read_exact(f, 1, "segment JPEG")[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise ImageHeaderError("brak znacznika SOF przed danymi obrazu")
+        (segment_length,) = struct.unpack(">H", _read_exact(f, 2, "segment JPEG"))
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">xHH", _read_exact(f, 5, "segment SOF"))
+            return "jpeg", width, height, marker in JPEG_PROGRESSIVE_MARKERS
+        f.seek(segment_length - 2, os.SEEK_CUR)
+
+
+def _parse_png(header):
+    if len(header) < 29 or header[12:16] != b"IHDR":
+        raise ImageHeaderError("brak nagłówka IHDR")
+    width, height = struct.unpack(">II", header[16:24])
+    # Przeplot Adam7 to odpowiednik JPEG progresywnego
+    return "png", width, height, header[28] == 1
+
+
+def _parse_gif(header):
+    if len(header) < 10:
+        raise ImageHeaderError("niepełny nagłówek GIF")
+    width, height = struct.unpack("<HH", header[6:10])
+    return "gif", width, height, False
+
+
+def _parse_webp(header):
+    chunk = header[12:16]
+    if chunk == b"VP8 " and len(header) >= 30:
+        width, height = struct.unpack("<HH", header[26:30])
+        return "webp", width & 0x3FFF, height & 0x3FFF, False
+    if chunk == b"VP8L" and len(header) >= 25:
+        b0, b1, b2, b3 = header[21:25]
+        width = 1 + (((b1 & 0x3F) << 8) | b0)
+        height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        return "webp", width, height, False
+    if chunk == b"VP8X" and len(header) >= 30:
+        width = 1 + int.from_bytes(header[24:27], "little")
+        height = 1 + int.from_bytes(header[27:30], "little")
+        return "webp", width, height, False
+    raise ImageHeaderError("nieobsługiwany nagłówek WebP")
+
+
+def _parse_bmp(header):
+    if len(header) < 26:
+        raise ImageHeaderError("niepełny nagłówek BMP")
+    (dib_size,) = struct.unpack("<I", header[14:18])
+    if dib_size == 12:  # BITMAPCOREHEADER
+        width, height = struct.unpack("<HH", header[18:22])
+    else:
+        width, height = struct.unpack("<ii", header[18:26])
+    return "bmp", abs(width), abs(height), False
+
+
+def _is_truncated(image_format, header, tail, size_bytes):
+    """Sprawdza zakończenie pliku właściwe dla formatu."""
+    if image_format == "jpeg":
+        return b"\xff\xd9" not in tail
+    if image_format == "png":
+        return b"IEND" not in tail
+    if image_format == "gif":
+        return not tail.endswith(b"\x3b")
+    if image_format == "webp":
+        (riff_size,) = struct.unpack("<I", header[4:8])
+        return size_bytes < riff_size + 8
+    if image_format == "bmp":
+        (declared_size,) = struct.unpack("<I", header[2:6])
+        return 0 < size_bytes < declared_size
+    return False
+
+
+def read_image_metadata(image_path, size_bytes=None):
+    """
+    Odczytuje format, wymiary, flagę progresywności i obcięcie obrazu
+    z samego nagłówka i końcówki pliku (bez dekodowania pikseli).
+    Format jest rozpoznawany po sygnaturze, nie po rozszerzeniu.
+    Zwraca słownik; corrupt=True oznacza podgląd, którego nie da się
+    poprawnie wyświetlić (pusty, nieczytelny lub obcięty plik).
+    Formaty, których moduł nie parsuje (SVG, TIFF, AVIF, HEIC, ICO...),
+    dają format=None bez wymiarów i nie są uznawane za uszkodzone.
+    """
+    metadata = {
+        "format": None,
+        "width": None,
+        "height": None,
+        "progressive": False,
+        "truncated": False,
+        "corrupt": False,
+    }
+    try:
+        if size_bytes is None:
+            size_bytes = os.path.getsize(image_path)
+        if size_bytes == 0:
+            raise ImageHeaderError("pusty plik")
+
+        with open(image_path, "rb") as f:
+            header = f.read(HEADER_READ_SIZE)
+            if header.startswith(b"\xff\xd8"):
+                parsed = _parse_jpeg(f)
+            elif header.startswith(b"\x89PNG\r\n\x1a\n"):
+                parsed = _parse_png(header)
+            elif header[:6] in (b"GIF87a", b"GIF89a"):
+                parsed = _parse_gif(header)
+            elif header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+                parsed = _parse_webp(header)
+            elif header[:2] == b"BM":
+                parsed = _parse_bmp(header)
+            else:
+                # Nieznana sygnatura to nie uszkodzenie - brak tylko wymiarów
+                return metadata
+
+            f.seek(max(0, size_bytes - TAIL_READ_SIZE))
+            tail = f.read(TAIL_READ_SIZE)
+
+        image_format, width, height, progressive = parsed
+        metadata.update(
+            format=image_format,
+            width=width,
+            height=height,
+            progressive=progressive,
+            truncated=_is_truncated(image_format, header, tail, size_bytes),
+        )
+        if not width or not height:
+            raise ImageHeaderError("zerowe wymiary obrazu")
+        metadata["corrupt"] = metadata["truncated"]
+    except (ImageHeaderError, struct.error) as e:
+        metadata["corrupt"] = True
+        metadata["error"] = str(e) or "nieczytelny nagłówek"
+    except OSError as e:
+        metadata["corrupt"] = True
+        metadata["error"] = f"błąd odczytu: {e}"
+    return metadata
+
+
+def get_metadata_cache():
+    """Zwraca współdzieloną pamięć metadanych obrazów (w katalogu baz)."""
+    return file_cache.get_file_cache(METADATA_CACHE_FILE)
+
+
+def read_images_metadata(image_entries, metadata_cache=None):
+    """
+    Zwraca {ścieżka: metadane} dla wpisów migawki folderu (słowniki z path,
+    size_bytes i mtime_ns). Obrazy z ważnym wpisem w pamięci nie są
+    otwierane ponownie.
+    """
+    return file_cache.read_with_cache(
+        image_entries,
+        read_image_metadata,
+        metadata_cache,
+        is_flagged=lambda metadata: metadata["corrupt"],
+    )
+
+
+def write_corrupt_previews_report(root_folder_path, metadata_cache, log_dir="logs"):
+    """
+    Zapisuje listę uszkodzonych podglądów poddrzewa (z pamięci metadanych,
+    więc obejmuje też foldery pominięte przez skanowanie przyrostowe).
+    Wpisy usuniętych plików są przy okazji czyszczone.
+    Zwraca ścieżkę raportu albo None, gdy uszkodzonych podglądów nie ma.
+    """
+    corrupt_previews = []
+    for image_path, metadata in metadata_cache.get_flagged(root_folder_path):
+        if not os.path.exists(image_path):
+            metadata_cache.remove(image_path)
+            continue
+        corrupt_previews.append({"path": image_path, **metadata})
+    logger.info(f"Uszkodzone podglądy: {len(corrupt_previews)}")
+    if not corrupt_previews:
+        return None
+
+    log_path = Path(log_dir)
+    log_path.mkdir(exist_ok=True)
+    now = datetime.now()
+    report_file = log_path / f"corrupt_previews_{now.strftime('%Y%m%d_%H%M%S')}.json"
+    report = {
+        "root": os.path.abspath(root_folder_path),
+        "created": now.strftime("%Y-%m-%d %H:%M:%S"),
+        "count": len(corrupt_previews),
+        "previews": corrupt_previews,
+    }
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    logger.info(f"Zapisano raport uszkodzonych podglądów: {report_file}")
+    return str(report_file)
+
+
+if __name__ == "__main__":
+    # Testowanie: nierozpoznany format nie jest uszkodzony, pusty i obcięty są
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as test_dir:
+        samples = {
+            "preview.svg": b'<svg xmlns="http://www.w3.org/2000/svg" width="1"/>',
+            "empty.png": b"",
+            "truncated.png": b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+            + struct.pack(">II", 10, 10)
+            + b"\x08\x02\x00\x00\x00",
+        }
+        for name, content in samples.items():
+            sample_path = os.path.join(test_dir, name)
+            with open(sample_path, "wb") as f:
+                f.write(content)
+            print(name, read_image_metadata(sample_path))
@@ -0,0 +1,358 @@
+# index_stream.py
+"""
+Strumieniowy zapis i odczyt danych indeksu folderu (format index.json).
+
+Foldery z dziesiątkami tysięcy plików nie są trzymane w pamięci jako
+listy słowników: skaner dopisuje rekordy do RecordSpool (wiersze JSON,
+powyżej progu w pliku tymczasowym) w chwili klasyfikacji, index.json
+jest składany rekord po rekordzie, a galeria czyta sekcje przez
+IndexFileReader bez wczytywania całego dokumentu.
+"""
+import hashlib
+import itertools
+import json
+import os
+import tempfile
+import threading
+
+INDEX_SECTIONS = ("files_with_previews", "files_without_previews", "other_images")
+# Pola folder_info zmieniające się przy każdym skanowaniu - pomijane w skrócie
+VOLATILE_FOLDER_INFO_FIELDS = ("scan_date", "content_hash")
+
+SPOOL_MAX_MEMORY = 1024 * 1024  # większe sekcje trafiają do pliku tymczasowego
+READ_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\r\n"
+
+
+# --- Skrót treści ---
+
+
+def _record_hash_bytes(record):
+    return json.dumps(record, sort_keys=True, ensure_ascii=False).encode("utf-8")
+
+
+def compute_section_digest(records):
+    """Skrót sekcji rekordów (kolejność rekordów ma znaczenie)."""
+    digest = hashlib.md5()
+    for record in records:
+        digest.update(_record_hash_bytes(record))
+        digest.update(b"\n")
+    return digest.digest()
+
+
+def compute_index_hash(index_data):
+    """
+    Zwraca skrót treści indeksu z pominięciem pól zmiennych (scan_date):
+    folder_info i skróty kolejnych sekcji. Sekcje RecordSpool mają skrót
+    liczony przy dopisywaniu, więc nie są czytane ponownie.
+    """
+    folder_info = index_data.get("folder_info") or {}
+    digest = hashlib.md5()
+    digest.update(
+        _record_hash_bytes(
+            {
+                key: value
+                for key, value in folder_info.items()
+                if key not in VOLATILE_FOLDER_INFO_FIELDS
+            }
+        )
+    )
+    for section in INDEX_SECTIONS:
+        records = index_data.get(section) or ()
+        digest.update(section.encode("utf-8"))
+        if isinstance(records, RecordSpool):
+            digest.update(records.digest())
+        else:
+            digest.update(compute_section_digest(records))
+    return digest.hexdigest()
+
+
+# --- Bufor rekordów ---
+
+
+class RecordSpool:
+    """
+    Sekcja rekordów indeksu zapisywana na bieżąco jako wiersze JSON.
+    Do SPOOL_MAX_MEMORY bajtów w pamięci, potem w pliku tymczasowym
+    (usuwanym przy zamknięciu lub zwolnieniu obiektu). Zachowuje się jak
+    lista tylko do dopisywania: append, len i wielokrotna iteracja - także
+    równoległa (np. zapis katalogu w innym wątku niż zapis index.json).
+    """
+
+    def __init__(self, records=(), max_memory=SPOOL_MAX_MEMORY):
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory, mode="w+b")
+        self._lock = threading.Lock()
+        self._digest = hashlib.md5()
+        self._count = 0
+        for record in records:
+            self.append(record)
+
+    def append(self, record):
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(line + b"\n")
+            self._digest.update(_record_hash_bytes(record))
+            self._digest.update(b"\n")
+            self._count += 1
+
+    def digest(self):
+        """Skrót sekcji jak compute_section_digest(self)."""
+        with self._lock:
+            return self._digest.copy().digest()
+
+    def __len__(self):
+        return self._count
+
+    def __bool__(self):
+        return self._count > 0
+
+    def __iter__(self):
+        offset = 0
+        while True:
+            with self._lock:
+                self._file.seek(offset)
+                lines = self._file.readlines(READ_CHUNK_SIZE)
+                offset = self._file.tell()
+            if not lines:
+                return
+            for line in lines:
+                yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+
+
+class LazySection:
+    """
+    Sekcja rekordów czytana na żądanie przy każdej iteracji, np. z bazy
+    katalogu albo z index.json. count: funkcja zwracająca liczbę rekordów
+    (domyślnie liczona jednym przebiegiem i zapamiętywana).
+    """
+
+    def __init__(self, iterate, count=None):
+        self._iterate = iterate
+        self._count_function = count
+        self._count = None
+
+    def __iter__(self):
+        return iter(self._iterate())
+
+    def __len__(self):
+        if self._count is None:
+            if self._count_function is not None:
+                self._count = self._count_function()
+            else:
+                self._count = sum(1 for _ in self._iterate())
+        return self._count
+
+    def __bool__(self):
+        if self._count is not None:
+            return self._count > 0
+        return any(True for _ in itertools.islice(self._iterate(), 1))
+
+
+def iter_batches(records, batch_size):
+    """Dzieli strumień rekordów na listy po batch_size elementów."""
+    records = iter(records)
+    while True:
+        batch = list(itertools.islice(records, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# --- Zapis ---
+
+
+def _dumps(value, compact, level):
+    if compact:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    text = json.dumps(value, indent=4, ensure_ascii=False)
+    return text.replace("\n", "\n" + "    " * level)
+
+
+def _dump_records(records, f, compact):
+    records = iter(records)
+    first = next(records, None)
+    if first is None:
+        f.write("[]")
+        return
+    f.write("[" if compact else "[\n")
+    for position, record in enumerate(itertools.chain((first,), records)):
+        if position:
+            f.write("," if compact else ",\n")
+        if not compact:
+            f.write("        ")
+        f.write(_dumps(record, compact, 2))
+    f.write("]" if compact else "\n    ]")
+
+
+def dump_index(index_data, f, compact=False):
+    """
+    Zapisuje index_data do otwartego pliku tekstowego - wynik jak
+    json.dump(indent=4) lub zwarty (compact=True), ale sekcje rekordów
+    (listy, RecordSpool, LazySection) są zapisywane rekord po rekordzie.
+    folder_info trafia na początek pliku, więc read_folder_info nie musi
+    czytać sekcji.
+    """
+    keys = sorted(index_data, key=lambda key: key != "folder_info")
+    f.write("{" if compact else "{\n")
+    for position, key in enumerate(keys):
+        if position:
+            f.write("," if compact else ",\n")
+        key_json = json.dumps(key, ensure_ascii=False)
+        f.write(f"{key_json}:" if compact else f"    {key_json}: ")
+        if key in INDEX_SECTIONS:
+            _dump_records(index_data[key], f, compact)
+        else:
+            f.write(_dumps(index_data[key], compact, 1))
+    f.write("}" if compact else "\n}")
+
+
+# --- Odczyt ---
+
+
+class _JsonReader:
+    """Czyta kolejne wartości JSON z pliku tekstowego porcjami READ_CHUNK_SIZE."""
+
+    def __init__(self, f):
+        self._file = f
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self._eof:
+            return False
+        chunk = self._file.read(READ_CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Następny znak poza białymi znakami ("" na końcu pliku)."""
+        while True:
+            buffer = self._buffer
+            while self._pos < len(buffer) and buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(buffer):
+                return buffer[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                f"Niepoprawny JSON: oczekiwano {characters!r}, "
+                f"jest {character or 'koniec pliku'!r}"
+            )
+        self._pos += 1
+        return character
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # Liczba na końcu bufora może mieć dalsze cyfry w kolejnej porcji
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def iter_object_keys(self):
+        """Klucze obiektu; po każdym kluczu wywołujący musi odczytać wartość."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.expect("}")
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("Niepoprawny JSON: klucz obiektu nie jest tekstem")
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def iter_array(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.expect("]")
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+    def skip_value(self):
+        # Tablice element po elemencie - pomijana sekcja nie trafia do pamięci
+        if self.peek() == "[":
+            for _ in self.iter_array():
+                pass
+        else:
+            self.value()
+
+
+class IndexFileReader:
+    """
+    Odczyt index.json bez wczytywania całego pliku: folder_info albo
+    rekordy jednej sekcji (każda iteracja otwiera plik od nowa).
+    Błędy: OSError (odczyt) i ValueError (niepoprawny JSON).
+    """
+
+    def __init__(self, index_json_path):
+        self.index_json_path = index_json_path
+
+    def read_folder_info(self):
+        """Zwraca folder_info (pusty słownik, gdy go brak)."""
+        with open(self.index_json_path, "r", encoding="utf-8") as f:
+            reader = _JsonReader(f)
+            for key in reader.iter_object_keys():
+                if key == "folder_info":
+                    folder_info = reader.value()
+                    return folder_info if isinstance(folder_info, dict) else {}
+                reader.skip_value()
+        return {}
+
+    def iter_records(self, section):
+        with open(self.index_json_path, "r", encoding="utf-8") as f:
+            reader = _JsonReader(f)
+            for key in reader.iter_object_keys():
+                if key == section and reader.peek() == "[":
+                    yield from reader.iter_array()
+                    return
+                reader.skip_value()
+
+    def section(self, section):
+        return LazySection(lambda: self.iter_records(section))
+
+    def load(self):
+        """
+        Zwraca dane indeksu: folder_info wczytane od razu, sekcje jako
+        LazySection czytane z pliku przy iteracji.
+        """
+        index_data = {"folder_info": self.read_folder_info()}
+        for section in INDEX_SECTIONS:
+            index_data[section] = self.section(section)
+        return index_data
+
+
+def read_folder_info(index_json_path):
+    """Skrót: IndexFileReader(index_json_path).read_folder_info()."""
+    return IndexFileReader(index_json_path).read_folder_info()
+
+
+def load_index(index_json_path):
+    """Skrót: IndexFileReader(index_json_path).load()."""
+    return IndexFileReader(index_json_path).load()
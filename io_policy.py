@@ -0,0 +1,304 @@
+# io_policy.py
+import errno
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import config_manager
+import io_watchdog
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BASE_DELAY = 0.2  # sekundy; kolejne próby: 0.2, 0.4, 0.8...
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_PER_SHARE_LIMIT = 8
+# Co ile sekund oczekujący na miejsce w limicie udziału sprawdza should_stop
+SLOT_WAIT_INTERVAL = 0.5
+
+# Błędy przejściowe (udział sieciowy chwilowo niedostępny lub przeciążony)
+TRANSIENT_ERRNOS = frozenset(
+    code
+    for code in (
+        getattr(errno, name, None)
+        for name in (
+            "EAGAIN",
+            "EBUSY",
+            "EINTR",
+            "EIO",
+            "ETIMEDOUT",
+            "ESTALE",
+            "ECONNRESET",
+            "ECONNABORTED",
+            "ECONNREFUSED",
+            "EHOSTDOWN",
+            "EHOSTUNREACH",
+            "ENETDOWN",
+            "ENETRESET",
+            "ENETUNREACH",
+            "ENOLCK",
+        )
+    )
+    if code is not None
+)
+TRANSIENT_WINERRORS = frozenset(
+    (
+        32,  # ERROR_SHARING_VIOLATION - plik otwarty przez inny proces
+        33,  # ERROR_LOCK_VIOLATION
+        51,  # ERROR_REM_NOT_LIST - zdalny komputer niedostępny
+        53,  # ERROR_BAD_NETPATH
+        59,  # ERROR_UNEXP_NET_ERR
+        64,  # ERROR_NETNAME_DELETED
+        121,  # ERROR_SEM_TIMEOUT
+        1231,  # ERROR_NETWORK_UNREACHABLE
+    )
+)
+
+
+class ShareSlotTimeout(io_watchdog.OperationTimeout):
+    """
+    Brak wolnego miejsca w limicie udziału w wyznaczonym czasie (np. miejsca
+    zajmują operacje porzucone przez watchdog na zawieszonym udziale).
+    """
+
+
+def is_transient_error(error):
+    """Czy błąd I/O warto ponowić (zawieszenie z watchdoga - nie)."""
+    if isinstance(error, io_watchdog.OperationTimeout):
+        return False
+    if not isinstance(error, OSError):
+        return False
+    if getattr(error, "winerror", None) in TRANSIENT_WINERRORS:
+        return True
+    return error.errno in TRANSIENT_ERRNOS
+
+
+_mount_points = {}
+_mount_points_lock = threading.Lock()
+
+
+def get_share_key(path):
+    """
+    Zwraca identyfikator udziału/punktu montowania ścieżki: \\\\serwer\\udział
+    lub literę dysku w Windows, punkt montowania w systemach POSIX
+    (wyniki os.path.ismount są zapamiętywane dla katalogów nadrzędnych).
+    """
+    path = os.path.abspath(path)
+    drive, _ = os.path.splitdrive(path)
+    if drive:
+        return drive.lower()
+
+    visited = []
+    current = path
+    while True:
+        with _mount_points_lock:
+            mount_point = _mount_points.get(current)
+        if mount_point is not None:
+            break
+        visited.append(current)
+        parent = os.path.dirname(current)
+        if parent == current or os.path.ismount(current):
+            mount_point = current
+            break
+        current = parent
+    with _mount_points_lock:
+        for visited_path in visited:
+            _mount_points[visited_path] = mount_point
+    return mount_point
+
+
+class IOPolicy:
+    """
+    Wspólna polityka operacji I/O skanera: ponawia błędy przejściowe
+    z wykładniczym opóźnieniem i losowym rozrzutem (jitter) oraz ogranicza
+    liczbę równoczesnych operacji na jednym udziale/punkcie montowania.
+    Zagnieżdżone wywołania w tym samym wątku korzystają z już zajętego
+    miejsca (np. stat plików w trakcie listowania folderu).
+    """
+
+    def __init__(
+        self,
+        max_retries=DEFAULT_MAX_RETRIES,
+        base_delay=DEFAULT_BASE_DELAY,
+        max_delay=DEFAULT_MAX_DELAY,
+        per_share_limit=DEFAULT_PER_SHARE_LIMIT,
+        share_limits=None,
+    ):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = max(0.0, base_delay)
+        self.max_delay = max(self.base_delay, max_delay)
+        self.per_share_limit = per_share_limit
+        # Limity dla wybranych udziałów: {ścieżka udziału: limit}
+        self.share_limits = {
+            get_share_key(share): limit for share, limit in (share_limits or {}).items()
+        }
+        self._semaphores = {}
+        self._semaphores_lock = threading.Lock()
+        self._held = threading.local()
+
+    def get_share_limit(self, share_key):
+        """Limit równoczesnych operacji udziału (0 = bez ograniczenia)."""
+        return self.share_limits.get(share_key, self.per_share_limit)
+
+    def _get_semaphore(self, share_key):
+        with self._semaphores_lock:
+            semaphore = self._semaphores.get(share_key)
+            if semaphore is None:
+                limit = self.get_share_limit(share_key)
+                if limit <= 0:
+                    return None
+                semaphore = threading.BoundedSemaphore(limit)
+                self._semaphores[share_key] = semaphore
+            return semaphore
+
+    @staticmethod
+    def _acquire(semaphore, timeout, should_stop):
+        """
+        Czeka na miejsce w limicie najwyżej timeout sekund (None = bez
+        limitu), sprawdzając should_stop co SLOT_WAIT_INTERVAL.
+        Zwraca False, gdy miejsca nie udało się zająć.
+        """
+        if timeout is None and should_stop is None:
+            return semaphore.acquire()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = SLOT_WAIT_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return False
+            if semaphore.acquire(timeout=wait):
+                return True
+            if should_stop and should_stop():
+                return False
+
+    @contextmanager
+    def share_slot(self, path, timeout=None, should_stop=None, description=None):
+        """
+        Zajmuje miejsce w limicie udziału ścieżki na czas bloku.
+        timeout: najdłuższe oczekiwanie na miejsce (None lub 0 = bez limitu);
+        po jego upływie albo gdy should_stop() zwróci True - ShareSlotTimeout.
+        """
+        share_key = get_share_key(path)
+        held = getattr(self._held, "shares", None)
+        if held is None:
+            held = self._held.shares = {}
+        semaphore = self._get_semaphore(share_key)
+        if semaphore is None or held.get(share_key):
+            held[share_key] = held.get(share_key, 0) + 1
+            try:
+                yield
+            finally:
+                held[share_key] -= 1
+            return
+
+        if not self._acquire(semaphore, timeout or None, should_stop):
+            raise ShareSlotTimeout(
+                f"oczekiwanie na miejsce w limicie udziału {share_key} "
+                f"({description or path})",
+                timeout or 0,
+            )
+        held[share_key] = 1
+        try:
+            yield
+        finally:
+            held[share_key] = 0
+            semaphore.release()
+
+    def backoff_delay(self, attempt):
+        """Opóźnienie przed ponowieniem numer attempt (od 0), z rozrzutem."""
+        delay = min(self.max_delay, self.base_delay * (2**attempt))
+        # Połowa stała, połowa losowa - równoległe wątki nie wracają naraz
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def call(
+        self,
+        func,
+        *args,
+        path,
+        description=None,
+        should_stop=None,
+        slot_timeout=None,
+        **kwargs,
+    ):
+        """
+        Wywołuje func(*args, **kwargs) w limicie udziału ścieżki path.
+        Błędy przejściowe są ponawiane do max_retries razy (miejsce w limicie
+        jest zwalniane na czas oczekiwania); pozostałe - przekazywane dalej.
+        slot_timeout: najdłuższe oczekiwanie na miejsce w limicie (None = bez
+        limitu); brak miejsca albo should_stop() kończy się ShareSlotTimeout.
+        """
+        description = description or getattr(func, "__name__", "operacja")
+        attempt = 0
+        while True:
+            try:
+                with self.share_slot(path, slot_timeout, should_stop, description):
+                    return func(*args, **kwargs)
+            except OSError as e:
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    raise
+                if should_stop and should_stop():
+                    raise
+                delay = self.backoff_delay(attempt)
+                attempt += 1
+                logger.warning(
+                    f"Błąd przejściowy ({description}): {e} - próba "
+                    f"{attempt}/{self.max_retries} za {delay:.2f} s"
+                )
+                time.sleep(delay)
+
+
+def get_policy_settings():
+    """Zwraca ustawienia polityki I/O z sekcji io_policy."""
+    settings = config_manager.get_config_value("io_policy", {}) or {}
+    return {
+        "max_retries": int(settings.get("max_retries", DEFAULT_MAX_RETRIES)),
+        "base_delay": float(settings.get("base_delay_ms", DEFAULT_BASE_DELAY * 1000))
+        / 1000,
+        "max_delay": float(settings.get("max_delay_ms", DEFAULT_MAX_DELAY * 1000))
+        / 1000,
+        "per_share_limit": int(
+            settings.get("per_share_limit", DEFAULT_PER_SHARE_LIMIT)
+        ),
+        "share_limits": dict(settings.get("share_limits") or {}),
+    }
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_io_policy():
+    """
+    Zwraca wspólną politykę I/O procesu (limity udziałów muszą obejmować
+    skanowanie, haszowanie i obserwatora folderów jednocześnie).
+    """
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = IOPolicy(**get_policy_settings())
+        return _policy
+
+
+def call(
+    func,
+    *args,
+    path,
+    description=None,
+    should_stop=None,
+    slot_timeout=None,
+    **kwargs,
+):
+    """Skrót: get_io_policy().call(...)."""
+    return get_io_policy().call(
+        func,
+        *args,
+        path=path,
+        description=description,
+        should_stop=should_stop,
+        slot_timeout=slot_timeout,
+        **kwargs,
+    )
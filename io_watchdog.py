@@ -0,0 +1,76 @@
+# io_watchdog.py
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class OperationTimeout(TimeoutError):
+    """Operacja I/O nie zakończyła się w wyznaczonym czasie."""
+
+    def __init__(self, description, timeout):
+        super().__init__(f"Przekroczono limit {timeout:g} s: {description}")
+        self.description = description
+        self.timeout = timeout
+
+
+_abandoned_lock = threading.Lock()
+_abandoned_count = 0
+
+
+def get_abandoned_count():
+    """Zwraca liczbę porzuconych (wciąż zawieszonych) operacji."""
+    return _abandoned_count
+
+
+def run_with_deadline(func, *args, timeout=None, description=None, **kwargs):
+    """
+    Uruchamia func w osobnym wątku-demonie i czeka na wynik najwyżej timeout
+    sekund. Po przekroczeniu czasu zgłasza OperationTimeout, a wątek zostaje
+    porzucony - wywołanie zawieszone na martwym udziale sieciowym nie blokuje
+    skanowania ani zamknięcia aplikacji (wątki-demony nie są dołączane).
+    Wyjątki z func są przekazywane dalej. timeout=None wyłącza ograniczenie.
+    """
+    global _abandoned_count
+    if not timeout or timeout <= 0:
+        return func(*args, **kwargs)
+
+    description = description or getattr(func, "__name__", "operacja")
+    result = {}
+    finished = threading.Event()
+    state_lock = threading.Lock()
+
+    def target():
+        global _abandoned_count
+        try:
+            result["value"] = func(*args, **kwargs)
+        except BaseException as e:
+            result["error"] = e
+        finally:
+            with state_lock:
+                finished.set()
+                abandoned = result.get("abandoned", False)
+            if abandoned:
+                with _abandoned_lock:
+                    _abandoned_count -= 1
+                logger.info(f"Zawieszona operacja zakończyła się: {description}")
+
+    worker = threading.Thread(target=target, name="io-watchdog", daemon=True)
+    worker.start()
+
+    if not finished.wait(timeout):
+        with state_lock:
+            if not finished.is_set():
+                result["abandoned"] = True
+                with _abandoned_lock:
+                    _abandoned_count += 1
+        if result.get("abandoned"):
+            logger.warning(
+                f"Timeout ({timeout} s): {description} "
+                f"(porzuconych operacji: {_abandoned_count})"
+            )
+            raise OperationTimeout(description, timeout)
+
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
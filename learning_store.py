@@ -0,0 +1,166 @@
+# learning_store.py
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+LEARNING_FILE = "learning_data.json"
+# Po tylu dopisanych rekordach dziennik jest scalany z plikiem głównym
+COMPACT_EVERY = 50
+
+
+def normalize_learning_record(record):
+    """Uzupełnia rekord o nazwy bazowe (starsze rekordy mają tylko nazwy plików)."""
+    record = dict(record)
+    if not record.get("archive_basename") and record.get("archive_file"):
+        record["archive_basename"] = os.path.splitext(record["archive_file"])[0]
+    if not record.get("image_basename") and record.get("image_file"):
+        record["image_basename"] = os.path.splitext(record["image_file"])[0]
+    return record
+
+
+class LearningStore:
+    """
+    Magazyn nauczonych dopasowań archiwum ↔ podgląd.
+    Dane są trzymane w słowniku po nazwie bazowej archiwum (bez rozróżniania
+    wielkości liter) i wczytywane ponownie tylko po zmianie mtime plików.
+    Nowe dopasowania są dopisywane do dziennika (learning_data.jsonl),
+    który co COMPACT_EVERY rekordów jest scalany z learning_data.json.
+    Późniejsze dopasowanie tego samego archiwum nadpisuje wcześniejsze.
+    """
+
+    def __init__(self, learning_file=LEARNING_FILE, compact_every=COMPACT_EVERY):
+        self.learning_file = learning_file
+        self.journal_file = os.path.splitext(learning_file)[0] + ".jsonl"
+        self.compact_every = compact_every
+        self._lock = threading.RLock()
+        self._matches = {}
+        self._file_state = None
+        self._journal_count = 0
+
+    def _get_file_state(self):
+        """Zwraca (mtime_ns, rozmiar) pliku głównego i dziennika."""
+        state = []
+        for path in (self.learning_file, self.journal_file):
+            try:
+                stat = os.stat(path)
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    def _add_record(self, record):
+        record = normalize_learning_record(record)
+        archive_basename = record.get("archive_basename", "")
+        if archive_basename:
+            self._matches[archive_basename.lower()] = record
+
+    def _load(self, file_state):
+        self._matches = {}
+        self._journal_count = 0
+
+        if file_state[0] is not None:
+            try:
+                with open(self.learning_file, "r", encoding="utf-8") as f:
+                    for record in json.load(f):
+                        self._add_record(record)
+            except Exception as e:
+                logger.error(f"Błąd wczytywania danych uczenia się: {e}")
+
+        if file_state[1] is not None:
+            try:
+                with open(self.journal_file, "r", encoding="utf-8") as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            self._add_record(json.loads(line))
+                            self._journal_count += 1
+                        except ValueError:
+                            logger.warning(
+                                f"Pominięto uszkodzony wpis dziennika: {line}"
+                            )
+            except OSError as e:
+                logger.error(f"Błąd wczytywania dziennika uczenia się: {e}")
+
+        self._file_state = file_state
+        logger.info(f"Wczytano {len(self._matches)} nauczonych dopasowań")
+
+    def refresh(self):
+        """Wczytuje dane ponownie, jeśli pliki zmieniły się od ostatniego odczytu."""
+        with self._lock:
+            file_state = self._get_file_state()
+            if file_state != self._file_state:
+                self._load(file_state)
+        return self
+
+    def get(self, archive_basename):
+        """Zwraca nazwę bazową nauczonego podglądu albo None."""
+        record = self._matches.get(archive_basename.lower())
+        return record.get("image_basename", "") if record else None
+
+    def records(self):
+        """Zwraca listę wszystkich rekordów."""
+        with self._lock:
+            return list(self._matches.values())
+
+    def __len__(self):
+        return len(self._matches)
+
+    def add_match(self, archive_file, image_file, archive_path, image_path):
+        """Dopisuje nowe dopasowanie do dziennika."""
+        record = normalize_learning_record(
+            {
+                "archive_file": archive_file,
+                "image_file": image_file,
+                "archive_path": archive_path,
+                "image_path": image_path,
+                "timestamp": datetime.now().isoformat(),
+            }
+        )
+        with self._lock:
+            self.refresh()
+            with open(self.journal_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._add_record(record)
+            self._journal_count += 1
+            self._file_state = self._get_file_state()
+
+            if self._journal_count >= self.compact_every:
+                self.compact()
+        return record
+
+    def compact(self):
+        """Scala dziennik z plikiem głównym i usuwa dziennik."""
+        with self._lock:
+            self.refresh()
+            temp_file = self.learning_file + ".tmp"
+            with open(temp_file, "w", encoding="utf-8") as f:
+                json.dump(
+                    list(self._matches.values()), f, indent=2, ensure_ascii=False
+                )
+            os.replace(temp_file, self.learning_file)
+            try:
+                os.remove(self.journal_file)
+            except FileNotFoundError:
+                pass
+            self._journal_count = 0
+            self._file_state = self._get_file_state()
+            logger.info(f"Scalono dziennik uczenia się: {len(self._matches)} dopasowań")
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_learning_store():
+    """Zwraca współdzielony magazyn dopasowań, odświeżony po zmianie plików."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = LearningStore()
+    return _default_store.refresh()
@@ -0,0 +1,178 @@
+# link_guard.py
+import logging
+import os
+import stat
+import threading
+
+import config_manager
+
+logger = logging.getLogger(__name__)
+
+# Zasady przechodzenia do folderów będących dowiązaniami (symlink, junction)
+FOLLOW_NEVER = "never"  # dowiązania są pomijane
+FOLLOW_ONCE = "once"  # każdy folder docelowy indeksowany raz, pod jedną ścieżką
+FOLLOW_ALWAYS = "always"  # dowiązania zawsze, pomijane tylko pętle
+FOLLOW_POLICIES = (FOLLOW_NEVER, FOLLOW_ONCE, FOLLOW_ALWAYS)
+DEFAULT_FOLLOW_POLICY = FOLLOW_ONCE
+
+# Powody pominięcia zapisywane w folder_info["skipped_links"]
+REASON_LINKS_DISABLED = "links_disabled"
+REASON_BROKEN = "broken_link"
+REASON_TARGET_IN_TREE = "target_in_tree"  # cel indeksowany pod własną ścieżką
+REASON_LOOP = "loop"
+REASON_DUPLICATE = "duplicate"  # ten sam folder (urządzenie, i-węzeł) już był
+
+# Dowiązania folderów w Windows (junction to punkt montowania NTFS)
+WINDOWS_LINK_TAGS = frozenset(
+    (
+        getattr(stat, "IO_REPARSE_TAG_SYMLINK", 0xA000000C),
+        getattr(stat, "IO_REPARSE_TAG_MOUNT_POINT", 0xA0000003),
+    )
+)
+
+
+def get_follow_policy(config=None):
+    """
+    Zwraca zasadę links.follow z konfiguracji (never/once/always);
+    config: migawka konfiguracji skanowania (None = bieżąca).
+    """
+    policy = config_manager.get_config_value(
+        "links.follow", DEFAULT_FOLLOW_POLICY, config
+    )
+    if policy not in FOLLOW_POLICIES:
+        logger.warning(
+            f"Nieznana wartość links.follow: {policy!r}, używam "
+            f"{DEFAULT_FOLLOW_POLICY!r}"
+        )
+        return DEFAULT_FOLLOW_POLICY
+    return policy
+
+
+def is_link_entry(entry):
+    """
+    Czy wpis DirEntry jest dowiązaniem symbolicznym albo junction.
+    W Windows typ punktu ponownej analizy pochodzi z danych listowania
+    (bez dodatkowego zapytania); foldery OneDrive i inne punkty
+    niebędące dowiązaniami nie są traktowane jak dowiązania.
+    """
+    if entry.is_symlink():
+        return True
+    if os.name != "nt":
+        return False
+    entry_stat = entry.stat(follow_symlinks=False)
+    return getattr(entry_stat, "st_reparse_tag", 0) in WINDOWS_LINK_TAGS
+
+
+def get_folder_identity(path):
+    """
+    Zwraca (urządzenie, i-węzeł) folderu docelowego albo None, gdy system
+    plików nie podaje numerów i-węzłów (np. część udziałów sieciowych).
+    """
+    folder_stat = os.stat(path)
+    if not folder_stat.st_ino:
+        return None
+    return folder_stat.st_dev, folder_stat.st_ino
+
+
+def is_path_within(path, root_path):
+    path = os.path.normcase(path)
+    root_path = os.path.normcase(root_path)
+    return path == root_path or path.startswith(root_path.rstrip(os.sep) + os.sep)
+
+
+class LinkGuard:
+    """
+    Pilnuje przechodzenia drzewa folderów: zapamiętuje odwiedzone foldery
+    (urządzenie, i-węzeł), więc pętle dowiązań i drzewa zamontowane
+    dwukrotnie nie są indeksowane wielokrotnie. Dowiązania są przechodzone
+    według zasady follow_policy. Bezpieczna dla wielu wątków.
+    """
+
+    def __init__(self, root_path=None, follow_policy=None):
+        self.root_path = os.path.realpath(root_path) if root_path else None
+        self.follow_policy = follow_policy or get_follow_policy()
+        self._lock = threading.Lock()
+        self._paths_by_identity = {}
+        self._identities_by_path = {}
+
+    def _register(self, path, identity):
+        """Zapisuje folder; zwraca ścieżkę, pod którą był już odwiedzony."""
+        with self._lock:
+            self._identities_by_path[path] = identity
+            if identity is None:
+                return path
+            return self._paths_by_identity.setdefault(identity, path)
+
+    def _ancestor_identities(self, folder_path):
+        identities = set()
+        current = folder_path
+        with self._lock:
+            while True:
+                identity = self._identities_by_path.get(current)
+                if identity is not None:
+                    identities.add(identity)
+                parent = os.path.dirname(current)
+                if parent == current or current not in self._identities_by_path:
+                    return identities
+                current = parent
+
+    def _ensure_registered(self, folder_path):
+        with self._lock:
+            if folder_path in self._identities_by_path:
+                return
+        try:
+            identity = get_folder_identity(folder_path)
+        except OSError:
+            identity = None
+        self._register(folder_path, identity)
+
+    def _check(self, folder_path, path, is_link):
+        """Zwraca (powód pominięcia, cel) albo (None, None) dla folderu path."""
+        if is_link and self.follow_policy == FOLLOW_NEVER:
+            return REASON_LINKS_DISABLED, os.path.realpath(path)
+        try:
+            identity = get_folder_identity(path)
+        except OSError:
+            if is_link:
+                return REASON_BROKEN, os.path.realpath(path)
+            return None, None  # błąd zostanie zgłoszony przy skanowaniu folderu
+
+        target = os.path.realpath(path) if is_link else None
+        if identity is not None and identity in self._ancestor_identities(
+            folder_path
+        ):
+            return REASON_LOOP, target or path
+        if (
+            is_link
+            and self.follow_policy == FOLLOW_ONCE
+            and self.root_path
+            and is_path_within(target, self.root_path)
+        ):
+            return REASON_TARGET_IN_TREE, target
+
+        first_path = self._register(path, identity)
+        if first_path == path or self.follow_policy == FOLLOW_ALWAYS:
+            return None, None
+        return REASON_DUPLICATE, first_path
+
+    def filter_subdirectories(self, folder_path, subdirectories, link_paths=()):
+        """
+        Dzieli podfoldery folder_path na przechodzone i pominięte.
+        link_paths: ścieżki podfolderów będących dowiązaniami.
+        Zwraca (ścieżki do przejścia, [{name, target, reason}] pominiętych).
+        """
+        self._ensure_registered(folder_path)
+        link_paths = set(link_paths)
+        followed = []
+        skipped = []
+        for path in subdirectories:
+            reason, target = self._check(folder_path, path, path in link_paths)
+            if reason is None:
+                followed.append(path)
+                continue
+            logger.debug(f"Pominięto folder {path} ({reason}): {target}")
+            skipped.append(
+                {"name": os.path.basename(path), "target": target, "reason": reason}
+            )
+        skipped.sort(key=lambda link: link["name"])
+        return followed, skipped
@@ -5,7 +5,6 @@ import re
 import shutil
 import sys
 import webbrowser
-from datetime import datetime
 
 import qdarktheme
 import send2trash  # pip install send2trash
@@ -30,23 +29,39 @@ from PyQt6.QtWidgets import (
 )
 
 # Importy z naszych modułów
+import catalog
 import config_manager
+import folder_watcher
 import gallery_generator
+import learning_store
 import scanner_logic
 
 
 # --- Klasy ScannerWorker i GalleryWorker pozostają bez zmian ---
 class ScannerWorker(QThread):
     progress_signal = pyqtSignal(str)
+    progress_event_signal = pyqtSignal(object)
     finished_signal = pyqtSignal()
 
-    def __init__(self, root_folder):
+    def __init__(self, root_folder, incremental=False):
         super().__init__()
         self.root_folder = root_folder
+        self.incremental = incremental
+        self.control = scanner_logic.ScanControl()
+        # Zgłaszanie zapisów index.json obserwatorowi folderów (opcjonalne)
+        self.on_index_written = None
 
     def run(self):
         try:
-            scanner_logic.start_scanning(self.root_folder, self.emit_progress)
+            # Komunikaty tekstowe docierają do UI w zdarzeniach postępu,
+            # łączone co kilkaset ms zamiast jednego sygnału na plik
+            scanner_logic.start_scanning(
+                self.root_folder,
+                incremental=self.incremental,
+                control=self.control,
+                progress_event_callback=self.emit_progress_event,
+                on_index_written=self.on_index_written,
+            )
         except Exception as e:
             self.progress_signal.emit(f"Wystąpił krytyczny błąd skanowania: {e}")
         finally:
@@ -55,6 +70,9 @@ class ScannerWorker(QThread):
     def emit_progress(self, message):
         self.progress_signal.emit(message)
 
+    def emit_progress_event(self, event):
+        self.progress_event_signal.emit(event)
+
 
 class GalleryWorker(QThread):
     progress_signal = pyqtSignal(str)
@@ -64,6 +82,7 @@ class GalleryWorker(QThread):
         super().__init__()
         self.scanned_root_path = scanned_root_path
         self.gallery_cache_root = gallery_cache_root
+        self.control = scanner_logic.ScanControl()
 
     def run(self):
         root_html_path = None
@@ -103,18 +122,16 @@ class GalleryWorker(QThread):
                     f"Ostrzeżenie: Plik gallery_styles.css nie znaleziony w {template_dir}"
                 )
 
-            for dirpath, _, filenames in os.walk(self.scanned_root_path):
-                if "index.json" in filenames:
-                    index_json_file = os.path.join(dirpath, "index.json")
-                    generated_html = gallery_generator.process_single_index_json(
-                        index_json_file,
-                        self.scanned_root_path,
-                        gallery_output_base_path,
-                        env,
-                        self.emit_progress,
-                    )
-                    if dirpath == self.scanned_root_path and generated_html:
-                        root_html_path = generated_html
+            # Foldery z katalogu skanowania (bez przechodzenia drzewa)
+            root_html_path = gallery_generator.generate_folder_pages(
+                self.scanned_root_path,
+                gallery_output_base_path,
+                env,
+                self.emit_progress,
+                should_stop=self.control.should_stop,
+            )
+            if self.control.is_cancelled():
+                self.progress_signal.emit("Generowanie galerii przerwane.")
 
             if root_html_path:
                 self.progress_signal.emit(
@@ -169,6 +186,10 @@ class CustomWebEnginePage(QWebEnginePage):
 
 class MainWindow(QMainWindow):
     GALLERY_CACHE_DIR = "_gallery_cache"
+    # Strony galerii odświeżone przez obserwator folderów (z jego wątku)
+    watcher_pages_updated = pyqtSignal(list)
+    # Nowa migawka konfiguracji (słuchacz config_manager, dowolny wątek)
+    config_changed = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
@@ -182,6 +203,10 @@ class MainWindow(QMainWindow):
         self.current_gallery_root_html = None
         self.learning_timer = None
         self.file_operations_timer = None
+        self.folder_watcher = None
+        self.config_timer = None
+        self.config_listener = None
+        self.config_snapshot = config_manager.get_config_snapshot()
 
         # DEBUGGING
         print(f"🔍 INIT - current_work_directory: {self.current_work_directory}")
@@ -192,6 +217,9 @@ class MainWindow(QMainWindow):
         self.update_gallery_buttons_state()
         self.setup_learning_bridge()
         self.setup_file_operations_bridge()
+        self.watcher_pages_updated.connect(self.on_watcher_pages_updated)
+        self.setup_config_watch()
+        self.start_folder_watcher()
 
         if self.current_work_directory:
             print(f"🔍 INIT - Sprawdzanie galerii dla: {self.current_work_directory}")
@@ -303,6 +331,41 @@ class MainWindow(QMainWindow):
         )
         controls_layout.addWidget(self.clear_gallery_cache_button)
 
+        # Przerwanie i wstrzymanie bieżącej operacji
+        self.pause_button = QPushButton("⏸️ Pauza")
+        self.pause_button.setStyleSheet(
+            """
+            QPushButton {
+                padding: 8px 16px;
+                border-radius: 6px;
+            }
+            QPushButton:hover {
+                background-color: #2d5aa0;
+            }
+        """
+        )
+        self.pause_button.setMinimumWidth(90)
+        self.pause_button.setEnabled(False)
+        self.pause_button.clicked.connect(self.toggle_pause_operation)
+        controls_layout.addWidget(self.pause_button)
+
+        self.stop_button = QPushButton("⏹️ Zatrzymaj")
+        self.stop_button.setStyleSheet(
+            """
+            QPushButton {
+                padding: 8px 16px;
+                border-radius: 6px;
+            }
+            QPushButton:hover {
+                background-color: #c62d42;
+            }
+        """
+        )
+        self.stop_button.setMinimumWidth(90)
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.cancel_running_operation)
+        controls_layout.addWidget(self.stop_button)
+
         main_layout.addWidget(controls_widget)
 
         # Pasek postępu
@@ -531,6 +594,7 @@ class MainWindow(QMainWindow):
             self.update_status_label()
             self.current_gallery_root_html = self.get_current_gallery_index_html()
             self.update_gallery_buttons_state()
+            self.start_folder_watcher()
 
             # POTEM AUTOMATYCZNE OTWIERANIE GALERII PO WYBORZE FOLDERU
             if self.current_gallery_root_html and os.path.exists(
@@ -565,6 +629,43 @@ class MainWindow(QMainWindow):
             )
         )
 
+        self.pause_button.setEnabled(processing)
+        self.stop_button.setEnabled(processing)
+        if not processing:
+            self.pause_button.setText("⏸️ Pauza")
+
+    def get_running_workers(self):
+        """Zwraca uruchomione wątki skanowania i generowania galerii"""
+        return [
+            worker
+            for worker in (self.scanner_thread, self.gallery_thread)
+            if worker and worker.isRunning()
+        ]
+
+    def cancel_running_operation(self):
+        """Przerywa bieżące skanowanie lub generowanie galerii"""
+        workers = self.get_running_workers()
+        for worker in workers:
+            worker.control.cancel()
+        if workers:
+            self.log_message("⏹️ Przerywanie operacji...")
+
+    def toggle_pause_operation(self):
+        """Wstrzymuje lub wznawia bieżące skanowanie lub generowanie galerii"""
+        workers = self.get_running_workers()
+        if not workers:
+            return
+        if any(worker.control.is_paused() for worker in workers):
+            for worker in workers:
+                worker.control.resume()
+            self.pause_button.setText("⏸️ Pauza")
+            self.log_message("▶️ Wznowiono operację")
+        else:
+            for worker in workers:
+                worker.control.pause()
+            self.pause_button.setText("▶️ Wznów")
+            self.log_message("⏸️ Wstrzymano operację")
+
     def start_scan(self):
         if not self.current_work_directory:
             QMessageBox.warning(self, "Błąd", "Najpierw wybierz folder roboczy!")
@@ -579,16 +680,28 @@ class MainWindow(QMainWindow):
         self.progress_bar.setRange(0, 0)  # Indeterminate
 
         self.scanner_thread = ScannerWorker(self.current_work_directory)
+        self.pause_folder_watcher_for(self.scanner_thread)
         self.scanner_thread.progress_signal.connect(self.log_message)
+        self.scanner_thread.progress_event_signal.connect(self.on_scan_progress_event)
         self.scanner_thread.finished_signal.connect(self.scan_finished)
         self.scanner_thread.start()
 
         self.set_buttons_for_processing(True)
 
+    def on_scan_progress_event(self, event):
+        """Aktualizuje pasek postępu i status na podstawie ProgressEvent."""
+        if event.total_final:
+            self.progress_bar.setRange(0, max(event.folders_total, 1))
+            self.progress_bar.setValue(event.folders_done)
+        self.statusBar.setText(event.describe())
+
     def scan_finished(self):
         self.progress_bar.setVisible(False)
         self.set_buttons_for_processing(False)
 
+        if self.scanner_thread and self.scanner_thread.control.is_cancelled():
+            QMessageBox.information(self, "Przerwano", "Skanowanie zostało przerwane.")
+            return
         QMessageBox.information(self, "Sukces", "Skanowanie zakończone pomyślnie!")
 
     def rebuild_gallery(self, auto_show_after_build=True):  # Dodano argument
@@ -609,13 +722,7 @@ class MainWindow(QMainWindow):
             )
             return
 
-        has_index_files = False
-        for _, _, files in os.walk(self.current_work_directory):
-            if "index.json" in files:
-                has_index_files = True
-                break
-
-        if not has_index_files:
+        if not gallery_generator.has_scan_data(self.current_work_directory):
             QMessageBox.warning(
                 self,
                 "Brak danych",
@@ -724,6 +831,86 @@ class MainWindow(QMainWindow):
                     self, "Błąd usuwania", f"Nie udało się usunąć folderu cache: {e}"
                 )
 
+    def start_folder_watcher(self):
+        """Uruchamia obserwator folderu roboczego (zatrzymuje poprzedni)."""
+        self.stop_folder_watcher()
+        if not self.current_work_directory or not os.path.isdir(
+            self.current_work_directory
+        ):
+            return
+        try:
+            self.folder_watcher = folder_watcher.FolderWatcher.from_config(
+                self.current_work_directory, on_reindexed=self.regenerate_watched_pages
+            )
+            if self.folder_watcher:
+                self.folder_watcher.start()
+                print(f"👁️ Obserwowanie zmian ({self.folder_watcher.mode})")
+        except Exception as e:
+            self.folder_watcher = None
+            print(f"❌ Błąd uruchamiania obserwatora folderów: {e}")
+
+    def stop_folder_watcher(self):
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+
+    def pause_folder_watcher_for(self, worker):
+        """
+        Wstrzymuje obserwator na czas pracy skanera (zmiany czekają w kolejce).
+        Zapisy index.json skanera są zgłaszane obserwatorowi, żeby nie
+        trafiały do kolejki jako zmiany folderów.
+        """
+        if self.folder_watcher:
+            watcher = self.folder_watcher
+            watcher.pause()
+            worker.on_index_written = watcher.index_written
+            worker.finished.connect(watcher.resume)
+
+    def regenerate_watched_pages(self, folder_paths):
+        """Wywoływane w wątku obserwatora po ponownym zindeksowaniu folderów."""
+        gallery_path = self.get_current_gallery_path()
+        if not gallery_path:
+            return
+        pages = gallery_generator.regenerate_folder_pages(
+            self.current_work_directory,
+            folder_paths,
+            gallery_path,
+            lambda msg: print(f"👁️ {msg}"),
+        )
+        if pages:
+            self.watcher_pages_updated.emit(pages)
+
+    def on_watcher_pages_updated(self, pages):
+        self.log_message(f"👁️ Odświeżono {len(pages)} stron galerii po zmianach")
+        current_page = self.web_view.url().toLocalFile()
+        if current_page and os.path.abspath(current_page) in {
+            os.path.abspath(page) for page in pages
+        }:
+            self.web_view.reload()
+
+    def setup_config_watch(self):
+        """
+        Reaguje na zmiany config.json: słuchacz config_manager przekazuje
+        nową migawkę sygnałem do wątku UI, a timer co kilka sekund sprawdza
+        mtime pliku (edycje z zewnątrz, gdy nic innego nie czyta konfiguracji).
+        """
+        self.config_changed.connect(self.on_config_changed)
+        self.config_listener = self.config_changed.emit
+        config_manager.add_config_listener(self.config_listener)
+        self.config_timer = QTimer()
+        self.config_timer.timeout.connect(config_manager.get_config_snapshot)
+        self.config_timer.start(3000)
+
+    def on_config_changed(self, snapshot):
+        previous, self.config_snapshot = self.config_snapshot, snapshot
+        self.log_message("⚙️ Wczytano zmienioną konfigurację")
+        # Obserwator wstrzymany na czas skanowania jest zmieniany dopiero po nim
+        watcher_changed = snapshot.get("watcher") != previous.get(
+            "watcher"
+        ) or snapshot.get("ignore") != previous.get("ignore")
+        if watcher_changed and not self.get_running_workers():
+            self.start_folder_watcher()
+
     def closeEvent(self, event):
         if (self.scanner_thread and self.scanner_thread.isRunning()) or (
             self.gallery_thread and self.gallery_thread.isRunning()
@@ -736,14 +923,19 @@ class MainWindow(QMainWindow):
                 QMessageBox.StandardButton.No,
             )
             if reply == QMessageBox.StandardButton.Yes:
-                if self.scanner_thread:
-                    self.scanner_thread.wait(1000)
-                if self.gallery_thread:
-                    self.gallery_thread.wait(1000)
+                # Przerwij operacje i poczekaj, aż wątki dojdą do punktu kontrolnego
+                for worker in self.get_running_workers():
+                    worker.control.cancel()
+                for worker in self.get_running_workers():
+                    worker.wait(5000)
+                self.stop_folder_watcher()
+                config_manager.remove_config_listener(self.config_listener)
                 event.accept()
             else:
                 event.ignore()
         else:
+            self.stop_folder_watcher()
+            config_manager.remove_config_listener(self.config_listener)
             event.accept()
 
     def update_tile_size(self):
@@ -897,9 +1089,15 @@ class MainWindow(QMainWindow):
             if not self.current_work_directory:
                 return
 
-            # Uruchom skanowanie w wątku
-            self.scanner_thread = ScannerWorker(self.current_work_directory)
+            # Uruchom skanowanie przyrostowe w wątku - tylko zmienione foldery
+            self.scanner_thread = ScannerWorker(
+                self.current_work_directory, incremental=True
+            )
+            self.pause_folder_watcher_for(self.scanner_thread)
             self.scanner_thread.progress_signal.connect(self.log_message)
+            self.scanner_thread.progress_event_signal.connect(
+                lambda event: self.statusBar.setText(event.describe())
+            )
             self.scanner_thread.finished_signal.connect(
                 lambda: self.gallery_rebuilt_silently(None)
             )
@@ -943,32 +1141,11 @@ class MainWindow(QMainWindow):
             if not all([archive_file, image_file, archive_path, image_path]):
                 return
 
-            # Zapisz do pliku JSON
-            learning_file = "learning_data.json"
-            learning_data = []
-
-            if os.path.exists(learning_file):
-                try:
-                    with open(learning_file, "r", encoding="utf-8") as f:
-                        learning_data = json.load(f)
-                except:
-                    pass
-
-            # Dodaj nowe dopasowanie
-            learning_data.append(
-                {
-                    "archive_file": archive_file,
-                    "image_file": image_file,
-                    "archive_path": archive_path,
-                    "image_path": image_path,
-                    "timestamp": datetime.now().isoformat(),
-                }
+            # Dopisz dopasowanie do dziennika nauki
+            learning_store.get_learning_store().add_match(
+                archive_file, image_file, archive_path, image_path
             )
 
-            # Zapisz
-            with open(learning_file, "w", encoding="utf-8") as f:
-                json.dump(learning_data, f, indent=2, ensure_ascii=False)
-
         except Exception as e:
             print(f"❌ Błąd save_learning_data: {e}")
 
@@ -1566,6 +1743,9 @@ class MainWindow(QMainWindow):
             if reply != QMessageBox.StandardButton.Yes:
                 return
 
+            archive_exts = [".rar", ".zip", ".7z", ".tar", ".gz", ".bz2", ".xz"]
+            image_exts = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"]
+
             # NOWA DEFINICJA pustego folderu
             def is_empty_folder(folder_path):
                 """
@@ -1597,24 +1777,6 @@ class MainWindow(QMainWindow):
                         if os.path.isfile(item_path):
                             # Sprawdź czy to plik archiwalny lub obraz
                             ext = os.path.splitext(item)[1].lower()
-                            archive_exts = [
-                                ".rar",
-                                ".zip",
-                                ".7z",
-                                ".tar",
-                                ".gz",
-                                ".bz2",
-                                ".xz",
-                            ]
-                            image_exts = [
-                                ".jpg",
-                                ".jpeg",
-                                ".png",
-                                ".gif",
-                                ".bmp",
-                                ".webp",
-                            ]
-
                             if ext in archive_exts or ext in image_exts:
                                 return False  # Zawiera content, nie jest pusty
 
@@ -1628,12 +1790,28 @@ class MainWindow(QMainWindow):
             deleted_count = 0
             errors = []
 
-            # Idź od najgłębszych folderów
-            for root, dirs, files in os.walk(
-                self.current_work_directory, topdown=False
-            ):
-                if root == self.current_work_directory:  # Nie usuwaj głównego folderu
-                    continue
+            # Kandydaci z katalogu skanowania (liście bez archiwów i obrazów),
+            # bez katalogu - wszystkie foldery; od najgłębszych folderów
+            folder_catalog = catalog.find_catalog(self.current_work_directory)
+            if folder_catalog is not None:
+                candidates = folder_catalog.get_empty_folder_candidates(
+                    self.current_work_directory, archive_exts + image_exts
+                )
+            else:
+                candidates = [
+                    root
+                    for root, _, _ in os.walk(
+                        self.current_work_directory, topdown=False
+                    )
+                ]
+
+            work_directory = os.path.abspath(self.current_work_directory)
+            checked = set()
+            while candidates:
+                root = candidates.pop(0)
+                if os.path.abspath(root) == work_directory or root in checked:
+                    continue  # Nie usuwaj głównego folderu
+                checked.add(root)
 
                 try:
                     if is_empty_folder(root):
@@ -1647,6 +1825,10 @@ class MainWindow(QMainWindow):
 
                             send2trash.send2trash(root)  # Użyj kosza zamiast os.rmdir
                             deleted_count += 1
+                            if folder_catalog is not None:
+                                folder_catalog.remove_folder(root)
+                                # Rodzic mógł właśnie stać się pusty
+                                candidates.append(os.path.dirname(root))
                             self.log_message(
                                 f"✅ Usunięto pusty folder: {os.path.basename(root)}"
                             )
@@ -1675,13 +1857,9 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Błąd", f"Błąd usuwania pustych folderów: {e}")
 
     def load_learning_data(self):
-        """Wczytuje dane uczenia się z pliku JSON"""
+        """Wczytuje dane uczenia się (magazyn odświeżany po zmianie pliku)"""
         try:
-            learning_file = "learning_data.json"
-            if os.path.exists(learning_file):
-                with open(learning_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            return []
+            return learning_store.get_learning_store()
         except Exception as e:
             print(f"❌ [CRITICAL] Błąd wczytywania danych uczenia się: {e}")
             return []
@@ -0,0 +1,273 @@
+# scan_progress.py
+import logging
+import os
+import threading
+import time
+
+import ignore_rules
+import io_policy
+import link_guard
+
+logger = logging.getLogger(__name__)
+
+# Domyślna częstotliwość zdarzeń postępu (sekundy między zdarzeniami)
+DEFAULT_EMIT_INTERVAL = 0.25
+
+
+def format_duration(seconds):
+    """Formatuje czas w sekundach jako H:MM:SS lub M:SS."""
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+class ProgressEvent:
+    """Migawka postępu skanowania przekazywana do UI."""
+
+    __slots__ = (
+        "folders_done",
+        "folders_total",
+        "total_final",
+        "files",
+        "bytes",
+        "current_path",
+        "elapsed",
+        "message",
+        "finished",
+    )
+
+    def __init__(
+        self,
+        folders_done,
+        folders_total,
+        total_final,
+        files,
+        bytes,
+        current_path,
+        elapsed,
+        message=None,
+        finished=False,
+    ):
+        self.folders_done = folders_done
+        self.folders_total = folders_total
+        self.total_final = total_final
+        self.files = files
+        self.bytes = bytes
+        self.current_path = current_path
+        self.elapsed = elapsed
+        self.message = message
+        self.finished = finished
+
+    @property
+    def folders_per_second(self):
+        return self.folders_done / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self):
+        """Szacowany czas do końca; None, dopóki liczba folderów nie jest znana."""
+        if not self.total_final or self.folders_per_second <= 0:
+            return None
+        remaining = max(0, self.folders_total - self.folders_done)
+        return remaining / self.folders_per_second
+
+    def as_dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["folders_per_second"] = self.folders_per_second
+        data["bytes_per_second"] = self.bytes_per_second
+        data["eta_seconds"] = self.eta_seconds
+        return data
+
+    def describe(self):
+        """Zwraca jednowierszowy opis postępu dla paska statusu."""
+        from scanner_logic import get_file_size_readable
+
+        total = f"{self.folders_total}" if self.total_final else f"~{self.folders_total}"
+        parts = [
+            f"Foldery {self.folders_done}/{total}",
+            f"{self.files} plików",
+            get_file_size_readable(self.bytes),
+            f"{self.folders_per_second:.1f} folderów/s",
+        ]
+        if self.eta_seconds is not None and not self.finished:
+            parts.append(f"ETA {format_duration(self.eta_seconds)}")
+        if self.message:
+            parts.append(self.message)
+        elif self.current_path:
+            parts.append(self.current_path)
+        return " | ".join(parts)
+
+
+def list_subdirectories(folder_path, folder_link_guard=None, ignore_matcher=None):
+    """
+    Zwraca ścieżki podfolderów (jeden przebieg os.scandir), z pominięciem
+    pętli i dowiązań odrzuconych przez folder_link_guard (LinkGuard)
+    oraz folderów pomijanych przez ignore_matcher (IgnoreMatcher) -
+    pomijane poddrzewa nie są listowane.
+    """
+    subdirectories = []
+    link_paths = []
+    with os.scandir(folder_path) as entries:
+        folder_rules = None
+        if ignore_matcher is not None:
+            # Obecność .3dindexignore wynika z listowania - bez osobnego stat
+            entries = list(entries)
+            folder_rules = ignore_matcher.get_folder_rules(
+                folder_path,
+                any(entry.name == ignore_rules.IGNORE_FILE_NAME for entry in entries),
+            )
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    if folder_rules and folder_rules.is_ignored(entry.name, True):
+                        continue
+                    subdirectories.append(entry.path)
+                    if link_guard.is_link_entry(entry):
+                        link_paths.append(entry.path)
+            except OSError:
+                continue
+    if folder_link_guard is not None:
+        subdirectories, _ = folder_link_guard.filter_subdirectories(
+            folder_path, subdirectories, link_paths
+        )
+    return subdirectories
+
+
+class ScanProgress:
+    """
+    Zbiera postęp skanowania z wielu wątków i przekazuje go jako ProgressEvent
+    nie częściej niż co emit_interval sekund (zdarzenia pośrednie są łączone).
+    Liczba wszystkich folderów pochodzi z szybkiego wstępnego przebiegu,
+    który listuje tylko katalogi i działa równolegle ze skanowaniem.
+    """
+
+    def __init__(self, event_callback, emit_interval=DEFAULT_EMIT_INTERVAL):
+        self.event_callback = event_callback
+        self.emit_interval = emit_interval
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+        self._last_emit = 0.0
+        self._folders_done = 0
+        self._folders_total = 1
+        self._total_final = False
+        self._files = 0
+        self._bytes = 0
+        self._current_path = None
+        self._message = None
+
+    def start_precount(
+        self, root_folder_path, control=None, ignore_matcher=None, follow_policy=None
+    ):
+        """
+        Uruchamia w tle liczenie folderów (tylko katalogi, bez plików).
+        ignore_matcher: reguły pomijania skanowania - pomijane poddrzewa
+        nie są liczone ani listowane. follow_policy: zasada dowiązań
+        skanowania (None = z konfiguracji).
+        """
+        worker = threading.Thread(
+            target=self._precount,
+            args=(root_folder_path, control, ignore_matcher, follow_policy),
+            name="scan-precount",
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def _precount(self, root_folder_path, control, ignore_matcher, follow_policy):
+        folder_stack = [root_folder_path]
+        found = 0
+        # Własny rejestr odwiedzonych folderów - te same zasady co skanowanie
+        folder_link_guard = link_guard.LinkGuard(root_folder_path, follow_policy)
+        while folder_stack:
+            if control and control.is_cancelled():
+                return
+            folder_path = folder_stack.pop()
+            try:
+                # Liczenie mieści się w limicie operacji na udział (io_policy)
+                subdirectories = io_policy.call(
+                    list_subdirectories,
+                    folder_path,
+                    folder_link_guard,
+                    ignore_matcher,
+                    path=folder_path,
+                    description=f"liczenie folderów {folder_path}",
+                )
+            except OSError as e:
+                logger.debug(f"Pominięto przy liczeniu folderów {folder_path}: {e}")
+                continue
+            folder_stack.extend(subdirectories)
+            found += len(subdirectories)
+
+            if found >= 100:
+                self._add_total(found)
+                found = 0
+
+        self._add_total(found)
+        with self._lock:
+            self._total_final = True
+        logger.info(f"Liczba folderów do skanowania: {self._folders_total}")
+
+    def _add_total(self, count):
+        if count:
+            with self._lock:
+                self._folders_total += count
+
+    def folder_started(self, folder_path):
+        with self._lock:
+            self._current_path = folder_path
+        self._maybe_emit()
+
+    def add_files(self, file_count, size_bytes):
+        with self._lock:
+            self._files += file_count
+            self._bytes += size_bytes
+
+    def folder_done(self, folder_path):
+        with self._lock:
+            self._folders_done += 1
+            # Foldery spoza wstępnego liczenia (np. utworzone w trakcie)
+            self._folders_total = max(self._folders_total, self._folders_done)
+        self._maybe_emit()
+
+    def message(self, text):
+        """Zapamiętuje ostatni komunikat - trafi do UI z najbliższym zdarzeniem."""
+        with self._lock:
+            self._message = text
+        self._maybe_emit()
+
+    def finish(self, message=None):
+        """Wysyła końcowe zdarzenie niezależnie od ograniczenia częstotliwości."""
+        with self._lock:
+            if message:
+                self._message = message
+            self._total_final = True
+            self._folders_total = self._folders_done
+        self._maybe_emit(force=True, finished=True)
+
+    def _build_event(self, finished=False):
+        return ProgressEvent(
+            self._folders_done,
+            self._folders_total,
+            self._total_final,
+            self._files,
+            self._bytes,
+            self._current_path,
+            time.monotonic() - self._start_time,
+            self._message,
+            finished,
+        )
+
+    def _maybe_emit(self, force=False, finished=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_emit < self.emit_interval:
+                return
+            self._last_emit = now
+            event = self._build_event(finished)
+        self.event_callback(event)
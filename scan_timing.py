@@ -0,0 +1,158 @@
+# scan_timing.py
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Fazy przetwarzania folderu w kolejności wykonywania
+SCAN_PHASES = (
+    "scandir",  # sprawdzenie dostępu + listowanie (os.scandir + stat)
+    "signature",  # sygnatura folderu dla trybu przyrostowego
+    "classification",  # budowanie rekordów plików i obrazów
+    "matching",  # dopasowywanie podglądów (PreviewMatcher)
+    "fuzzy_matching",  # dopasowanie przybliżone niesparowanych (FuzzyMatcher)
+    "archive_preview",  # wyciąganie podglądów z archiwów bez obrazu obok
+    "metadata",  # odczyt nagłówków podglądów (wymiary, uszkodzenia)
+    "archive_inspect",  # spis zawartości archiwów z nagłówków ZIP/7z/RAR
+    "folder_stats",  # get_folder_stats
+    "catalog_write",  # dodanie folderu do partii katalogu SQLite
+    "index_write",  # zapis index.json
+)
+
+DEFAULT_SLOWEST_FOLDERS = 20
+
+
+class FolderTiming:
+    """Czasy faz i liczniki jednego folderu."""
+
+    __slots__ = ("folder_path", "phases", "counters", "_started")
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.phases = dict.fromkeys(SCAN_PHASES, 0.0)
+        self.counters = {}
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """Mierzy czas bloku i dolicza go do fazy name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self._started
+
+    def as_dict(self, total_seconds):
+        return {
+            "path": self.folder_path,
+            "total_seconds": round(total_seconds, 6),
+            "phases": {name: round(sec, 6) for name, sec in self.phases.items()},
+            "counters": dict(self.counters),
+        }
+
+
+class ScanTimings:
+    """
+    Zbiera czasy faz ze wszystkich folderów skanowania (bezpieczne dla wątków).
+    Sumy są liczone na bieżąco, a szczegóły przechowywane tylko dla
+    slowest_count najwolniejszych folderów, więc pamięć nie rośnie z drzewem.
+    """
+
+    def __init__(self, root_folder_path, slowest_count=DEFAULT_SLOWEST_FOLDERS):
+        self.root_folder_path = root_folder_path
+        self.slowest_count = slowest_count
+        self._lock = threading.Lock()
+        self._started_at = datetime.now()
+        self._start_time = time.perf_counter()
+        self._phases = dict.fromkeys(SCAN_PHASES, 0.0)
+        self._counters = {}
+        self._folder_count = 0
+        self._slowest = []  # kopiec (czas, numer, słownik) - najszybszy na górze
+
+    def start_folder(self, folder_path):
+        return FolderTiming(folder_path)
+
+    def finish_folder(self, folder_timing):
+        """Dolicza czasy folderu do sum i listy najwolniejszych."""
+        total_seconds = folder_timing.total_seconds
+        with self._lock:
+            self._folder_count += 1
+            for name, seconds in folder_timing.phases.items():
+                self._phases[name] = self._phases.get(name, 0.0) + seconds
+            for name, value in folder_timing.counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+
+            if self.slowest_count <= 0:
+                return
+            item = (
+                total_seconds,
+                self._folder_count,
+                folder_timing.as_dict(total_seconds),
+            )
+            if len(self._slowest) < self.slowest_count:
+                heapq.heappush(self._slowest, item)
+            elif total_seconds > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    def as_dict(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self._start_time
+            phase_sum = sum(self._phases.values())
+            return {
+                "root": os.path.abspath(self.root_folder_path),
+                "started": self._started_at.strftime("%Y-%m-%d %H:%M:%S"),
+                "elapsed_seconds": round(elapsed, 6),
+                "folder_count": self._folder_count,
+                "totals": {
+                    "phases": {
+                        name: round(seconds, 6)
+                        for name, seconds in self._phases.items()
+                    },
+                    # Udział faz w sumie czasu wszystkich wątków
+                    "phase_share": {
+                        name: round(seconds / phase_sum, 4) if phase_sum else 0.0
+                        for name, seconds in self._phases.items()
+                    },
+                    "counters": dict(self._counters),
+                },
+                "slowest_folders": [
+                    item[2] for item in sorted(self._slowest, reverse=True)
+                ],
+            }
+
+    def write_report(self, log_dir="logs"):
+        """Zapisuje raport JSON w log_dir i zwraca ścieżkę pliku."""
+        log_path = Path(log_dir)
+        log_path.mkdir(exist_ok=True)
+        report_file = (
+            log_path / f"scan_timing_{self._started_at.strftime('%Y%m%d_%H%M%S')}.json"
+        )
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=4, ensure_ascii=False)
+        logger.info(f"Zapisano raport czasów skanowania: {report_file}")
+        return str(report_file)
+
+    def summary(self):
+        """Zwraca jednowierszowe podsumowanie faz do logu."""
+        with self._lock:
+            parts = [
+                f"{name} {seconds:.2f} s" for name, seconds in self._phases.items()
+            ]
+        return ", ".join(parts)
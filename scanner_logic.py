@@ -1,12 +1,33 @@
 # scanner_logic.py
-import json
+import hashlib
+import bisect
+import functools
 import logging
 import os
+import re
+import threading
 import time  # Dodane dla retry mechanism
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
 
+import archive_inspector
+import archive_preview
+import catalog
 import config_manager
+import content_hash
+import folder_totals
+import fuzzy_matcher
+import ignore_rules
+import image_metadata
+import index_stream
+import io_policy
+import io_watchdog
+import link_guard
+from learning_store import LearningStore, get_learning_store
+from scan_progress import ScanProgress
+from scan_timing import DEFAULT_SLOWEST_FOLDERS, FolderTiming, ScanTimings
 
 
 # Konfiguracja loggera
@@ -74,6 +95,27 @@ IMAGE_EXTENSIONS = (
     ".heif",  # HEIC/HEIF (Apple)
 )
 
+# Zbiór do szybkiego sprawdzania rozszerzeń obrazów
+IMAGE_SUFFIXES = frozenset(IMAGE_EXTENSIONS)
+
+# Końcówki dopuszczalne po wariancie nazwy przy dopasowaniu dokładnym
+# (np. "nazwa_001", "nazwa preview", "nazwa1")
+PREVIEW_SUFFIX_TAILS = frozenset(
+    separator + suffix
+    for separator in ["_", "-", " ", ""]
+    for suffix in ["001", "preview", "thumb", "1", "2", "3", "0"]
+    if separator or suffix.isdigit()
+)
+
+# Ile razy ponawiać foldery, których listowanie przekroczyło limit czasu
+FOLDER_TIMEOUT_RETRIES = 1
+
+# Pliki tymczasowe atomowego zapisu index.json (pomijane przy skanowaniu)
+INDEX_TEMP_PREFIX = ".index.json."
+
+# Rozszerzenia wieloczłonowe rozpoznawane jako całość
+MULTI_DOT_EXTENSIONS = frozenset((".tar.gz", ".tar.bz2", ".tar.xz"))
+
 
 def get_file_size_readable(size_bytes):
     """Konwertuje rozmiar pliku w bajtach na czytelny format."""
@@ -90,172 +132,445 @@ def get_file_size_readable(size_bytes):
     return result
 
 
-def get_folder_stats(folder_path):
-    """Zbiera podstawowe statystyki dotyczące folderu."""
-    logger.info(f"Zbieranie statystyk dla folderu: {folder_path}")
-    total_size_bytes = 0
-    file_count = 0
-    subdir_count = 0
-    archive_count = 0
+def get_file_extension(file_name):
+    """
+    Zwraca rozszerzenie pliku małymi literami.
+    Rozszerzenia wieloczłonowe (np. .tar.gz) są zwracane w całości.
+    """
+    name_lower = file_name.lower()
+    dot_index = name_lower.rfind(".")
+    if dot_index == -1:
+        return ""
+    prev_dot_index = name_lower.rfind(".", 0, dot_index)
+    if prev_dot_index != -1 and name_lower[prev_dot_index:] in MULTI_DOT_EXTENSIONS:
+        return name_lower[prev_dot_index:]
+    return name_lower[dot_index:]
+
+
+def is_index_file_name(file_name):
+    """Czy plik to index.json albo plik tymczasowy jego zapisu."""
+    file_name = file_name.lower()
+    return file_name == "index.json" or (
+        file_name.startswith(INDEX_TEMP_PREFIX) and file_name.endswith(".tmp")
+    )
+
+
+class FolderSnapshot:
+    """
+    Migawka folderu zbudowana z jednego przebiegu os.scandir.
+    Przechowuje typ, rozmiar i mtime wpisów odczytane z DirEntry, dzięki czemu
+    podział na obrazy i inne pliki, rekordy indeksu i statystyki folderu
+    nie wymagają kolejnych wywołań stat (na udziałach SMB każde to zapytanie
+    sieciowe).
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        self.image_files = []
+        self.other_files = []
+        self.subdirectories = []
+        self.link_paths = []  # podfoldery będące dowiązaniami (symlink, junction)
+        self.skipped_links = []  # podfoldery pominięte przez LinkGuard
+        self.signature_entries = []
+        self.entry_count = 0
+        self.ignored_count = 0  # wpisy pominięte regułami ignore_rules
+        self.ignore_digest = None  # skrót reguł obowiązujących w folderze
+
+    def add_entry(self, entry):
+        """Dodaje wpis DirEntry do migawki."""
+        self.entry_count += 1
+        if entry.name == ignore_rules.IGNORE_FILE_NAME:
+            return  # treść reguł trafia do sygnatury przez ignore_digest
+        if entry.is_dir():
+            self.subdirectories.append(entry.path)
+            if link_guard.is_link_entry(entry):
+                self.link_paths.append(entry.path)
+            self.signature_entries.append((entry.name, 0, 0))
+            return
+        if not entry.is_file():
+            return
+
+        try:
+            entry_stat = io_policy.call(
+                entry.stat, path=self.folder_path, description=f"stat {entry.path}"
+            )
+            size_bytes = entry_stat.st_size
+            mtime_ns = entry_stat.st_mtime_ns
+        except OSError as e:
+            logger.error(f"Błąd dostępu do pliku {entry.name}: {e}")
+            size_bytes = 0
+            mtime_ns = 0
+
+        extension = get_file_extension(entry.name)
+        file_entry = {
+            "name": entry.name,
+            "path": entry.path,
+            "size_bytes": size_bytes,
+            "mtime_ns": mtime_ns,
+            "extension": extension,
+        }
+        if is_index_file_name(entry.name):
+            return
+        if extension in IMAGE_SUFFIXES:
+            self.image_files.append(file_entry)
+        else:
+            self.other_files.append(file_entry)
+        self.signature_entries.append((entry.name, size_bytes, mtime_ns))
+
+    def get_folder_stats(self):
+        """Zwraca statystyki folderu w formacie folder_info."""
+        files = self.image_files + self.other_files
+        total_size_bytes = sum(f["size_bytes"] for f in files)
+        stats = {
+            "path": os.path.abspath(self.folder_path),
+            "total_size_bytes": total_size_bytes,
+            "total_size_readable": get_file_size_readable(total_size_bytes),
+            "file_count": len(files),
+            "subdir_count": len(self.subdirectories) + len(self.skipped_links),
+            "archive_count": len(files),
+            "scan_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if self.skipped_links:
+            stats["skipped_links"] = self.skipped_links
+        return stats
 
-    try:
-        for entry in os.scandir(folder_path):
-            if entry.is_file() and entry.name.lower() != "index.json":
-                try:
-                    stat = entry.stat()
-                    file_size = stat.st_size
-                    file_count += 1
-                    total_size_bytes += file_size
-                    archive_count += 1
-                    logger.debug(f"Znaleziono plik: {entry.name} ({file_size} bajtów)")
-                except OSError as e:
-                    logger.error(f"Błąd dostępu do pliku {entry.name}: {e}")
-            elif entry.is_dir():
-                subdir_count += 1
-                logger.debug(f"Znaleziono podfolder: {entry.name}")
-    except OSError as e:
-        logger.error(f"Błąd podczas skanowania folderu {folder_path}: {e}")
-
-    # Przygotuj podstawowe statystyki
-    stats = {
-        "path": os.path.abspath(folder_path),
-        "total_size_bytes": total_size_bytes,
-        "total_size_readable": get_file_size_readable(total_size_bytes),
-        "file_count": file_count,
-        "subdir_count": subdir_count,
-        "archive_count": archive_count,
-        "scan_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-    }
 
+def build_folder_snapshot(folder_path, progress_callback=None, ignore_matcher=None):
+    """
+    Buduje migawkę folderu w jednym przebiegu os.scandir.
+    ignore_matcher (IgnoreMatcher): pasujące pliki i podfoldery są pomijane
+    przed stat, a podfoldery nie trafiają do kolejki skanowania.
+    Błędy dostępu do samego folderu (OSError) są przekazywane dalej.
+    """
+    snapshot = FolderSnapshot(folder_path)
+    with os.scandir(folder_path) as entries:
+        folder_rules = None
+        if ignore_matcher is not None:
+            # Obecność .3dindexignore wynika z listowania - bez osobnego stat
+            entries = list(entries)
+            folder_rules = ignore_matcher.get_folder_rules(
+                folder_path,
+                any(entry.name == ignore_rules.IGNORE_FILE_NAME for entry in entries),
+            )
+            snapshot.ignore_digest = folder_rules.digest
+        for entry in entries:
+            try:
+                if folder_rules and folder_rules.is_ignored(
+                    entry.name, entry.is_dir()
+                ):
+                    snapshot.ignored_count += 1
+                    continue
+                snapshot.add_entry(entry)
+            except OSError as e:
+                if progress_callback:
+                    progress_callback(f"Błąd dostępu do pliku {entry.name}: {e}")
+                continue
+            if progress_callback and snapshot.entry_count % 100 == 0:
+                progress_callback(
+                    f"Przetworzono {snapshot.entry_count} plików w {folder_path}"
+                )
+    return snapshot
+
+
+def get_folder_stats(folder_path, snapshot=None):
+    """
+    Zbiera podstawowe statystyki dotyczące folderu.
+    Jeśli podano migawkę, folder nie jest skanowany ponownie.
+    """
+    logger.info(f"Zbieranie statystyk dla folderu: {folder_path}")
+    if snapshot is None:
+        try:
+            snapshot = build_folder_snapshot(folder_path)
+        except OSError as e:
+            logger.error(f"Błąd podczas skanowania folderu {folder_path}: {e}")
+            snapshot = FolderSnapshot(folder_path)
+
+    stats = snapshot.get_folder_stats()
     logger.info(f"Statystyki folderu {folder_path}: {stats}")
     return stats
 
 
+def totals_with_readable(totals):
+    """Sumy rekurencyjne z czytelnym rozmiarem (format folder_info)."""
+    return dict(
+        totals, total_size_readable=get_file_size_readable(totals["total_size_bytes"])
+    )
+
+
+def build_subfolder_totals(subfolders):
+    """Zwraca wpisy folder_info["subfolders"] z [(nazwa, sumy)]."""
+    return [
+        {"name": name, "recursive": totals_with_readable(totals)}
+        for name, totals in subfolders
+    ]
+
+
+def set_folder_totals(folder_info, subdirectories, previous_info=None):
+    """
+    Ustawia sumy rekurencyjne w folder_info przed zapisem indeksu.
+    Folder bez podfolderów ma je od razu kompletne; pozostałe zachowują
+    sumy z poprzedniego indeksu do czasu zgłoszenia się podfolderów
+    (przy niezmienionym drzewie indeks nie jest zapisywany drugi raz).
+    """
+    if not subdirectories:
+        folder_info["recursive"] = totals_with_readable(
+            folder_totals.own_totals(folder_info)
+        )
+        folder_info["subfolders"] = []
+    elif previous_info:
+        for key in ("recursive", "subfolders"):
+            if key in previous_info:
+                folder_info[key] = previous_info[key]
+
+
 def load_learning_data():
     """Wczytuje dane uczenia się z pliku JSON"""
     try:
-        learning_file = "learning_data.json"
-        if os.path.exists(learning_file):
-            with open(learning_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+        return get_learning_store().records()
     except Exception as e:
         logger.error(f"Błąd wczytywania danych uczenia się: {e}")
         return []
 
 
 def find_learned_match(archive_basename, learning_data):
-    """Sprawdza czy istnieje nauczone dopasowanie dla danego pliku archiwum"""
+    """
+    Sprawdza czy istnieje nauczone dopasowanie dla danego pliku archiwum.
+    learning_data: LearningStore (wyszukiwanie w słowniku) albo lista rekordów.
+    """
+    if isinstance(learning_data, LearningStore):
+        return learning_data.get(archive_basename)
     for match in learning_data:
         if match.get("archive_basename", "").lower() == archive_basename.lower():
             return match.get("image_basename", "")
     return None
 
 
-def find_matching_preview_for_file(
-    base_filename, image_files_in_folder, learning_data=None
+def compute_folder_signature(
+    signature_entries,
+    learning_data=None,
+    ignore_digest=None,
+    fuzzy_settings=None,
+    metadata_version=None,
 ):
     """
-    Szuka pasującego pliku podglądu dla dowolnego pliku.
-    NOWA FUNKCJONALNOŚĆ: Najpierw sprawdza nauczone dopasowania!
+    Wylicza sygnaturę folderu na potrzeby skanowania przyrostowego.
+    signature_entries: lista krotek (nazwa, rozmiar, mtime_ns) bez index.json;
+    podfoldery mają rozmiar i mtime równe 0.
+    ignore_digest: skrót reguł pomijania folderu - zmiana reguł wymusza skan.
+    fuzzy_settings: ustawienia dopasowania przybliżonego (None = wyłączone) -
+    ich zmiana też wymusza skan.
+    metadata_version: wersja odczytu metadanych podglądów (None = wyłączony) -
+    metadane zapisane w indeksie starszą wersją są odczytywane ponownie.
+    Zamiast mtime katalogu używany jest skrót nazw wpisów - mtime katalogu
+    zmienia się przy każdym utworzeniu index.json, więc nie nadaje się
+    do porównania z poprzednim skanem.
     """
-    if not base_filename:
-        return None
+    names = sorted(name for name, _, _ in signature_entries)
+    names_hash = hashlib.md5("\n".join(names).encode("utf-8")).hexdigest()
 
-    # PIERWSZEŃSTWO: Sprawdź nauczone dopasowania
+    # Nauczone dopasowania dotyczące plików z tego folderu też wpływają na indeks
+    learned_pairs = []
     if learning_data:
-        learned_image = find_learned_match(base_filename, learning_data)
-        if learned_image:
-            # Szukaj dokładnego dopasowania nazwy z nauki
-            for img_path in image_files_in_folder:
-                img_name = os.path.basename(img_path)
-                img_base, img_ext = os.path.splitext(img_name)
-
-                if img_ext.lower() in IMAGE_EXTENSIONS:
-                    if img_base.lower() == learned_image.lower():
-                        logger.info(
-                            f"🎓 NAUCZONE dopasowanie: '{base_filename}' ↔ '{img_name}'"
-                        )
-                        return img_path
+        basenames = {os.path.splitext(name)[0].lower() for name in names}
+        for basename in basenames:
+            learned_image = find_learned_match(basename, learning_data)
+            if learned_image is not None:
+                learned_pairs.append(f"{basename}|{learned_image}")
+    learned_hash = hashlib.md5(
+        "\n".join(sorted(learned_pairs)).encode("utf-8")
+    ).hexdigest()
+
+    signature = {
+        "entry_count": len(signature_entries),
+        "names_hash": names_hash,
+        "files_size_sum": sum(size for _, size, _ in signature_entries),
+        "files_mtime_sum": sum(mtime for _, _, mtime in signature_entries),
+        "learned_hash": learned_hash,
+    }
+    if ignore_digest:
+        signature["ignore_hash"] = ignore_digest
+    if fuzzy_settings:
+        signature["fuzzy_matching"] = (
+            f"{fuzzy_settings['threshold']}:{fuzzy_settings['margin']}"
+        )
+    if metadata_version:
+        signature["metadata_version"] = metadata_version
+    return signature
 
-    # FALLBACK: Użyj standardowego algorytmu jeśli nie ma nauki
-    base_name = base_filename.lower().strip()
 
-    # Twórz różne warianty nazwy bazowej
-    name_variants = set()
+def load_folder_info(folder_path, folder_catalog=None):
+    """
+    Odczytuje folder_info z katalogu skanowania, a jeśli go nie ma -
+    z istniejącego index.json folderu. Zwraca None, gdy folder nie ma indeksu.
+    """
+    if folder_catalog is not None:
+        folder_info = folder_catalog.get_folder_info(folder_path)
+        if folder_info is not None:
+            return folder_info
+    index_json_path = os.path.join(folder_path, "index.json")
+    try:
+        # Tylko początek pliku - folder_info jest zapisywane przed rekordami
+        return index_stream.read_folder_info(index_json_path)
+    except (OSError, ValueError, AttributeError):
+        return None
 
-    # Podstawowy wariant
-    name_variants.add(base_name)
 
-    # Zamiana podkreśleń na spacje i odwrotnie
-    name_variants.add(base_name.replace("_", " "))
-    name_variants.add(base_name.replace(" ", "_"))
-    name_variants.add(base_name.replace("-", " "))
-    name_variants.add(base_name.replace(" ", "-"))
-    name_variants.add(base_name.replace("_", "-"))
-    name_variants.add(base_name.replace("-", "_"))
+def load_folder_signature(folder_path, folder_catalog=None):
+    """
+    Odczytuje sygnaturę folderu z katalogu skanowania, a jeśli go nie ma -
+    z istniejącego index.json folderu.
+    """
+    folder_info = load_folder_info(folder_path, folder_catalog)
+    return folder_info.get("signature") if folder_info else None
 
-    # Usuń wielokrotne spacje/podkreślenia
-    cleaned_variants = set()
-    for variant in name_variants:
-        # Normalizuj wielokrotne separatory
-        import re
 
-        normalized = re.sub(r"[\s_-]+", " ", variant).strip()
-        cleaned_variants.add(normalized)
-        cleaned_variants.add(normalized.replace(" ", "_"))
-        cleaned_variants.add(normalized.replace(" ", "-"))
+def normalize_name_separators(name):
+    """Zamienia ciągi spacji, podkreśleń i myślników na pojedynczą spację."""
+    return re.sub(r"[\s_-]+", " ", name).strip()
 
-    name_variants.update(cleaned_variants)
 
-    # Dodaj warianty z typowymi sufiksami
-    extended_variants = set(name_variants)
-    for variant in name_variants:
-        for separator in ["_", "-", " ", ""]:
-            for suffix in ["001", "preview", "thumb", "1", "2", "3", "0"]:
-                if separator or suffix.isdigit():
-                    extended_variants.add(variant + separator + suffix)
+def build_name_variants(base_name):
+    """
+    Tworzy warianty nazwy bazowej (małe litery, bez spacji na końcach)
+    z zamienionymi separatorami.
+    """
+    # Zamiana podkreśleń na spacje i odwrotnie
+    name_variants = {
+        base_name,
+        base_name.replace("_", " "),
+        base_name.replace(" ", "_"),
+        base_name.replace("-", " "),
+        base_name.replace(" ", "-"),
+        base_name.replace("_", "-"),
+        base_name.replace("-", "_"),
+    }
 
-    logger.debug(
-        f"Szukam podglądu dla '{base_filename}' z {len(extended_variants)} wariantami"
-    )
+    # Wszystkie warianty różnią się tylko separatorami, więc mają tę samą
+    # postać znormalizowaną
+    normalized = normalize_name_separators(base_name)
+    name_variants.add(normalized)
+    name_variants.add(normalized.replace(" ", "_"))
+    name_variants.add(normalized.replace(" ", "-"))
+    return name_variants, normalized
 
-    for img_path in image_files_in_folder:
-        img_name = os.path.basename(img_path)
-        img_base, img_ext = os.path.splitext(img_name)
 
-        # Sprawdź czy to obsługiwane rozszerzenie obrazu
-        if img_ext.lower() not in IMAGE_EXTENSIONS:
-            continue
+def image_matches_name_variants(img_base_clean, name_variants):
+    """
+    Sprawdza czy nazwa obrazu pasuje do któregoś z wariantów:
+    dokładnie, z typowym sufiksem (_001, preview, cyfra...) albo jako prefiks
+    zakończony separatorem lub cyfrą.
+    """
+    # Dokładne dopasowanie (również z typowym sufiksem)
+    if img_base_clean in name_variants:
+        return True
+    for variant in name_variants:
+        if (
+            img_base_clean.startswith(variant)
+            and img_base_clean[len(variant) :] in PREVIEW_SUFFIX_TAILS
+        ):
+            return True
 
-        img_base_clean = img_base.lower().strip()
+    # Obraz zaczyna się od wariantu + separator/cyfra
+    for variant in name_variants:
+        if len(variant) >= 3:  # Minimalna długość dla bezpiecznego dopasowania
+            if img_base_clean.startswith(variant) and len(img_base_clean) > len(
+                variant
+            ):
+                next_char = img_base_clean[len(variant)]
+                if next_char in " _-" or next_char.isdigit():
+                    return True
+    return False
 
-        # Dokładne dopasowanie
-        if img_base_clean in extended_variants:
-            logger.debug(f"✅ Dokładne dopasowanie: '{img_name}' dla '{base_filename}'")
-            return img_path
 
-        # Sprawdzenie czy obraz zaczyna się od któregoś z wariantów
-        for variant in name_variants:
-            if len(variant) >= 3:  # Minimalna długość dla bezpiecznego dopasowania
-                # Obraz zaczyna się od wariantu + separator/cyfra
-                if (
-                    img_base_clean.startswith(variant + " ")
-                    or img_base_clean.startswith(variant + "_")
-                    or img_base_clean.startswith(variant + "-")
-                    or (
-                        img_base_clean.startswith(variant)
-                        and len(img_base_clean) > len(variant)
-                        and img_base_clean[len(variant) :][0].isdigit()
-                    )
-                ):
-                    logger.debug(
-                        f"✅ Dopasowanie z prefiksem: '{img_name}' dla '{base_filename}' (wariant: '{variant}')"
+class PreviewMatcher:
+    """
+    Indeks obrazów jednego folderu do wyszukiwania podglądów.
+    Budowany raz na folder: nazwy obrazów są normalizowane (separatory
+    zamienione na spację) i posortowane, więc dla każdego pliku wystarczy
+    wyszukiwanie binarne prefiksu zamiast porównywania z każdym obrazem.
+    Wyniki są identyczne z porównywaniem obrazów po kolei - każda pasująca
+    nazwa po normalizacji zaczyna się od znormalizowanej nazwy pliku.
+    """
+
+    def __init__(self, image_files_in_folder):
+        self.image_files = list(image_files_in_folder)
+        self.clean_names = {}  # indeks obrazu -> nazwa małymi literami
+        self.learned_names = {}  # nazwa do nauczonych dopasowań -> indeks
+        normalized_keys = []
+
+        for index, img_path in enumerate(self.image_files):
+            img_name = os.path.basename(img_path)
+            img_base, img_ext = os.path.splitext(img_name)
+
+            # Sprawdź czy to obsługiwane rozszerzenie obrazu
+            if img_ext.lower() not in IMAGE_SUFFIXES:
+                continue
+
+            img_base_clean = img_base.lower().strip()
+            self.clean_names[index] = img_base_clean
+            self.learned_names.setdefault(img_base.lower(), index)
+            normalized_keys.append((normalize_name_separators(img_base_clean), index))
+
+        normalized_keys.sort()
+        self.normalized_keys = [key for key, _ in normalized_keys]
+        self.normalized_indexes = [index for _, index in normalized_keys]
+
+    def find_learned(self, learned_image):
+        """Zwraca obraz o nazwie z nauczonego dopasowania."""
+        index = self.learned_names.get(learned_image.lower())
+        return self.image_files[index] if index is not None else None
+
+    def candidate_indexes(self, normalized_prefix):
+        """Zwraca indeksy obrazów, których znormalizowana nazwa ma dany prefiks."""
+        position = bisect.bisect_left(self.normalized_keys, normalized_prefix)
+        candidates = []
+        while position < len(self.normalized_keys) and self.normalized_keys[
+            position
+        ].startswith(normalized_prefix):
+            candidates.append(self.normalized_indexes[position])
+            position += 1
+        return sorted(candidates)
+
+    def find(self, base_filename, learning_data=None):
+        """Szuka podglądu dla pliku o podanej nazwie bazowej."""
+        if not base_filename:
+            return None
+
+        # PIERWSZEŃSTWO: Sprawdź nauczone dopasowania
+        if learning_data:
+            learned_image = find_learned_match(base_filename, learning_data)
+            if learned_image:
+                img_path = self.find_learned(learned_image)
+                if img_path:
+                    logger.info(
+                        f"🎓 NAUCZONE dopasowanie: '{base_filename}' ↔ '{os.path.basename(img_path)}'"
                     )
                     return img_path
 
-    logger.debug(f"❌ Nie znaleziono podglądu dla: '{base_filename}'")
-    return None
+        # FALLBACK: Użyj standardowego algorytmu jeśli nie ma nauki
+        name_variants, normalized = build_name_variants(base_filename.lower().strip())
+
+        for index in self.candidate_indexes(normalized):
+            if image_matches_name_variants(self.clean_names[index], name_variants):
+                img_path = self.image_files[index]
+                logger.debug(
+                    f"✅ Dopasowanie: '{os.path.basename(img_path)}' dla '{base_filename}'"
+                )
+                return img_path
+
+        logger.debug(f"❌ Nie znaleziono podglądu dla: '{base_filename}'")
+        return None
+
+
+def find_matching_preview_for_file(
+    base_filename, image_files_in_folder, learning_data=None
+):
+    """
+    Szuka pasującego pliku podglądu dla dowolnego pliku.
+    NOWA FUNKCJONALNOŚĆ: Najpierw sprawdza nauczone dopasowania!
+    Przy wielu plikach z jednego folderu lepiej zbudować PreviewMatcher raz.
+    """
+    return PreviewMatcher(image_files_in_folder).find(base_filename, learning_data)
 
 
 def debug_name_matching(base_filename, image_files_in_folder):
@@ -363,206 +678,971 @@ def log_file_matching_debug(folder_path, progress_callback=None):
         logger.error(f"Błąd podczas debugowania: {e}")
 
 
-def process_folder(folder_path, progress_callback=None):
+def get_folder_timeout(config=None):
     """
-    Przetwarza pojedynczy folder: zbiera informacje i generuje index.json.
-    NOWA FUNKCJONALNOŚĆ: Używa danych uczenia się.
+    Zwraca limit czasu listowania folderu z performance.folder_timeout_seconds
+    (config: migawka konfiguracji skanowania, None = bieżąca).
     """
-    logger.info(f"Rozpoczęcie przetwarzania folderu: {folder_path}")
+    try:
+        return float(
+            config_manager.get_config_value(
+                "performance.folder_timeout_seconds", 30, config
+            )
+        )
+    except (TypeError, ValueError):
+        logger.warning("Nieprawidłowa wartość folder_timeout_seconds, używam 30")
+        return 30.0
 
-    if progress_callback:
-        progress_callback(f"Przetwarzanie folderu: {folder_path}")
 
-    # WCZYTAJ DANE UCZENIA SIĘ
-    learning_data = load_learning_data()
-    if learning_data:
-        logger.info(f"Wczytano {len(learning_data)} nauczonych dopasowań")
-        if progress_callback:
-            progress_callback(f"Zastosowano {len(learning_data)} nauczonych dopasowań")
+def get_timing_report_folders(config=None):
+    """
+    Zwraca liczbę najwolniejszych folderów w raporcie czasów skanowania
+    (performance.timing_report_folders, 0 wyłącza raport).
+    """
+    try:
+        return int(
+            config_manager.get_config_value(
+                "performance.timing_report_folders", DEFAULT_SLOWEST_FOLDERS, config
+            )
+        )
+    except (TypeError, ValueError):
+        logger.warning("Nieprawidłowa wartość timing_report_folders, używam 20")
+        return DEFAULT_SLOWEST_FOLDERS
 
-    # DODAJ DEBUG MATCHING (opcjonalnie, tylko dla problemów)
-    # log_file_matching_debug(folder_path, progress_callback)
 
-    # ZABEZPIECZENIE PRZED ZAWIESZENIEM
+def write_timing_report(timings, log_dir="logs"):
+    """Loguje podsumowanie faz i zapisuje raport najwolniejszych folderów."""
+    logger.info(f"Czasy faz skanowania: {timings.summary()}")
+    if timings.slowest_count <= 0:
+        return None
     try:
-        # Sprawdź czy folder jest dostępny w rozsądnym czasie
-        if not os.path.exists(folder_path):
-            msg = f"Folder nie istnieje: {folder_path}"
-            logger.error(msg)
-            if progress_callback:
-                progress_callback(msg)
-            return
+        return timings.write_report(log_dir)
+    except OSError as e:
+        logger.error(f"Błąd zapisu raportu czasów skanowania: {e}")
+        return None
 
-        if not os.access(folder_path, os.R_OK):
-            msg = f"Brak dostępu do folderu: {folder_path}"
-            logger.error(msg)
-            if progress_callback:
-                progress_callback(msg)
-            return
+
+def load_duplicate_map(folder_path, config=None):
+    """
+    Zwraca {ścieżka: duplicate_of} z ostatniego etapu haszowania dla
+    poddrzewa folder_path ({} gdy etap jest wyłączony), aby ponowne
+    skanowanie nie gubiło pola duplicate_of w indeksach.
+    """
+    if not content_hash.get_hashing_settings(config)["enabled"]:
+        return {}
+    try:
+        return content_hash.get_hash_cache().get_duplicates(folder_path)
     except Exception as e:
-        msg = f"Błąd dostępu do folderu {folder_path}: {e}"
-        logger.error(msg)
-        if progress_callback:
-            progress_callback(msg)
-        return
+        logger.error(f"Nie można wczytać listy duplikatów: {e}")
+        return {}
 
-    index_data = {
-        "folder_info": None,  # Będzie zaktualizowane na końcu
-        "files_with_previews": [],
-        "files_without_previews": [],
-        "other_images": [],  # Obrazy, które nie są podglądami niczego
-    }
 
-    all_items_in_dir = []
-    subdirectories = []
+def open_metadata_cache(config=None):
+    """
+    Zwraca pamięć metadanych podglądów albo None, gdy odczyt metadanych
+    jest wyłączony lub bazy nie da się otworzyć (metadane są wtedy
+    odczytywane bez zapamiętywania).
+    """
+    if not image_metadata.is_metadata_enabled(config):
+        return None
+    try:
+        return image_metadata.get_metadata_cache()
+    except Exception as e:
+        logger.error(f"Nie można otworzyć pamięci metadanych obrazów: {e}")
+        return None
+
+
+def open_archive_cache(config=None):
+    """
+    Zwraca pamięć zawartości archiwów albo None, gdy inspekcja archiwów
+    jest wyłączona lub bazy nie da się otworzyć.
+    """
+    if not archive_inspector.get_inspector_settings(config)["enabled"]:
+        return None
+    try:
+        return archive_inspector.get_archive_cache()
+    except Exception as e:
+        logger.error(f"Nie można otworzyć pamięci zawartości archiwów: {e}")
+        return None
+
 
+def open_archive_preview_cache(config=None):
+    """
+    Zwraca pamięć podglądów wyciąganych z archiwów albo None, gdy funkcja
+    jest wyłączona lub bazy nie da się otworzyć.
+    """
+    if not archive_preview.get_preview_settings(config)["enabled"]:
+        return None
     try:
-        # TIMEOUT dla skanowania foldera - maksymalnie 30 sekund na folder
-        import threading
-        import time
+        return archive_preview.get_archive_preview_cache()
+    except Exception as e:
+        logger.error(f"Nie można otworzyć pamięci podglądów z archiwów: {e}")
+        return None
+
+
+def check_folder_access(folder_path):
+    """Zwraca opis problemu z dostępem do folderu albo None."""
+    if not os.path.exists(folder_path):
+        return f"Folder nie istnieje: {folder_path}"
+    if not os.access(folder_path, os.R_OK):
+        return f"Brak dostępu do folderu: {folder_path}"
+    return None
+
 
-        class TimeoutError(Exception):
+def read_folder(
+    folder_path, progress_callback=None, folder_link_guard=None, ignore_matcher=None
+):
+    """
+    Sprawdza dostęp do folderu i buduje jego migawkę (jeden przebieg scandir),
+    z pominięciem wpisów pasujących do reguł ignore_matcher.
+    folder_link_guard (LinkGuard): podfoldery-pętle, powtórzenia i dowiązania
+    wykluczone zasadą links.follow trafiają do snapshot.skipped_links
+    zamiast do snapshot.subdirectories.
+    Zwraca (komunikat błędu, None) albo (None, migawka).
+    """
+    access_error = check_folder_access(folder_path)
+    if access_error:
+        return access_error, None
+    snapshot = build_folder_snapshot(folder_path, progress_callback, ignore_matcher)
+    if folder_link_guard is not None:
+        snapshot.subdirectories, snapshot.skipped_links = (
+            folder_link_guard.filter_subdirectories(
+                folder_path, snapshot.subdirectories, snapshot.link_paths
+            )
+        )
+    return None, snapshot
+
+
+def get_compact_index_json(config=None):
+    """Czy zapisywać index.json bez wcięć (performance.compact_index_json)."""
+    return bool(
+        config_manager.get_config_value(
+            "performance.compact_index_json", False, config
+        )
+    )
+
+
+def set_index_hash(index_data):
+    """Zapisuje skrót treści w folder_info["content_hash"] i zwraca go."""
+    content_hash = index_stream.compute_index_hash(index_data)
+    index_data["folder_info"]["content_hash"] = content_hash
+    return content_hash
+
+
+def read_index_hash(index_json_path):
+    """Zwraca skrót treści istniejącego index.json albo None."""
+    try:
+        reader = index_stream.IndexFileReader(index_json_path)
+        folder_info = reader.read_folder_info()
+        return folder_info.get("content_hash") or index_stream.compute_index_hash(
+            reader.load()
+        )
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def write_index_json(index_json_path, index_data, compact=False):
+    """
+    Zapisuje dane indeksu do pliku index.json, tylko jeśli treść (bez
+    scan_date) różni się od zapisanej - niezmieniony plik zachowuje mtime,
+    więc galeria nie jest renderowana ponownie.
+    Zapis idzie przez plik tymczasowy i os.replace, więc czytelnik nigdy
+    nie zobaczy połowy pliku. compact=True zapisuje JSON bez wcięć.
+    Sekcje rekordów są zapisywane strumieniowo (index_stream.dump_index).
+    Zwraca True po zapisie, False gdy plik był aktualny.
+    """
+    content_hash = index_data["folder_info"].get("content_hash") or set_index_hash(
+        index_data
+    )
+    if read_index_hash(index_json_path) == content_hash:
+        return False
+
+    # Nazwa unikalna dla procesu i wątku; zwykłe open() zachowuje domyślne
+    # uprawnienia pliku (w przeciwieństwie do tempfile.mkstemp)
+    temp_path = os.path.join(
+        os.path.dirname(index_json_path),
+        f"{INDEX_TEMP_PREFIX}{os.getpid()}.{threading.get_ident()}.tmp",
+    )
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            index_stream.dump_index(index_data, f, compact)
+        os.replace(temp_path, index_json_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
             pass
+        raise
+    return True
 
-        def timeout_handler():
-            raise TimeoutError(f"Timeout podczas skanowania {folder_path}")
 
-        timer = threading.Timer(30.0, timeout_handler)  # 30 sekund timeout
-        timer.start()
+def run_folder_io(context, func, *args, path, description):
+    """
+    Wykonuje operację I/O folderu według polityki I/O (ponowienia, limit
+    udziału) pod watchdogiem - czas oczekiwania na miejsce w limicie
+    i ponowienia wliczają się do context.folder_timeout. Porzucony wątek
+    też przestaje czekać na miejsce po folder_timeout.
+    """
+    operation = functools.partial(
+        call_folder_io, context, func, *args, path=path, description=description
+    )
+    return io_watchdog.run_with_deadline(
+        operation, timeout=context.folder_timeout, description=description
+    )
+
+
+def call_folder_io(context, func, *args, path, description=None):
+    """
+    Wykonuje operację I/O folderu według polityki I/O bez watchdoga (np.
+    odczyt nagłówków wszystkich podglądów). Oczekiwanie na miejsce w limicie
+    udziału jest ograniczone do context.folder_timeout i przerywane przez
+    should_stop - miejsca zajęte przez porzucone operacje na zawieszonym
+    udziale kończą się io_policy.ShareSlotTimeout zamiast zawieszenia.
+    """
+    return context.io_policy.call(
+        func,
+        *args,
+        path=path,
+        description=description,
+        should_stop=context.should_stop,
+        slot_timeout=context.folder_timeout,
+    )
+
 
+def load_index_copy(folder_path, folder_catalog=None):
+    """
+    Zwraca kopię danych folderu z katalogu albo z index.json (sekcje
+    przepisane do index_stream.RecordSpool) albo None, gdy folder nie ma
+    indeksu. Błędy odczytu istniejącego index.json są przekazywane dalej.
+    """
+    index_data = None
+    if folder_catalog is not None:
+        index_data = folder_catalog.get_index_data(folder_path)
+    if index_data is None:
         try:
-            with os.scandir(folder_path) as entries:
-                for entry in entries:
-                    try:
-                        all_items_in_dir.append(entry.name)
-                        if entry.is_dir():
-                            subdirectories.append(entry.path)
-                        if progress_callback and len(all_items_in_dir) % 100 == 0:
-                            progress_callback(
-                                f"Przetworzono {len(all_items_in_dir)} plików w {folder_path}"
-                            )
-                    except (OSError, PermissionError) as e:
-                        if progress_callback:
-                            progress_callback(
-                                f"Błąd dostępu do pliku {entry.name}: {e}"
-                            )
-                        continue
-        finally:
-            timer.cancel()  # Wyłącz timeout
+            index_data = index_stream.load_index(
+                os.path.join(folder_path, "index.json")
+            )
+        except FileNotFoundError:
+            return None
+    copied_data = {"folder_info": dict(index_data.get("folder_info") or {})}
+    for key in index_stream.INDEX_SECTIONS:
+        records = copied_data[key] = index_stream.RecordSpool()
+        for file_info in index_data.get(key, []):
+            records.append(file_info)
+    return copied_data
 
-    except TimeoutError as e:
-        if progress_callback:
-            progress_callback(f"TIMEOUT: {e}")
-        return
-    except (OSError, PermissionError) as e:
-        if progress_callback:
-            progress_callback(f"Błąd dostępu do folderu {folder_path}: {e}")
+
+def write_timed_out_index(folder_path, context):
+    """
+    Oznacza indeks folderu (index.json i wpis katalogu) jako timed_out
+    i usuwa z niego sygnaturę, więc skanowanie przyrostowe zawsze spróbuje
+    ten folder ponownie. Rekordy poprzedniego indeksu są zachowane - wolny
+    folder nie traci zawartości do czasu udanego skanowania. Folder bez
+    indeksu dostaje pusty indeks z oznaczeniem; gdy poprzedniego indeksu
+    nie da się odczytać, nic nie jest zapisywane.
+    """
+    if context.catalog is not None:
+        context.catalog.flush()  # indeks folderu może czekać w partii
+    try:
+        index_data = run_folder_io(
+            context,
+            load_index_copy,
+            folder_path,
+            context.catalog,
+            path=folder_path,
+            description=f"odczyt poprzedniego indeksu {folder_path}",
+        )
+    except (OSError, ValueError, io_watchdog.OperationTimeout) as e:
+        logger.error(f"Nie udało się oznaczyć folderu jako timed_out: {e}")
         return
+    if index_data is None:
+        index_data = {
+            "folder_info": FolderSnapshot(folder_path).get_folder_stats(),
+            "files_with_previews": [],
+            "files_without_previews": [],
+            "other_images": [],
+        }
+    folder_info = index_data["folder_info"]
+    folder_info.pop("signature", None)
+    folder_info["timed_out"] = True
+    try:
+        save_index_data(folder_path, index_data, context)
+    except (OSError, io_watchdog.OperationTimeout) as e:
+        logger.error(f"Nie udało się oznaczyć folderu jako timed_out: {e}")
 
-    # Podziel pliki na obrazy i inne pliki
-    image_filenames = [
-        f
-        for f in all_items_in_dir
-        if os.path.isfile(os.path.join(folder_path, f))
-        and any(f.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)
-    ]
-    other_filenames = [
-        f
-        for f in all_items_in_dir
-        if os.path.isfile(os.path.join(folder_path, f))
-        and not any(f.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)
-        and f.lower() != "index.json"
-    ]
 
-    full_path_image_files = [
-        os.path.join(folder_path, img_name) for img_name in image_filenames
-    ]
-    found_previews_paths = set()
+class ScanControl:
+    """
+    Znacznik przerwania i wstrzymania skanowania.
+    UI ustawia go z wątku głównego, a pętle skanowania sprawdzają go
+    kooperacyjnie - między folderami i w trakcie dopasowywania plików.
+    """
 
-    for file_name in other_filenames:
-        file_path = os.path.join(folder_path, file_name)
-        file_basename, _ = os.path.splitext(file_name)
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
 
+    def cancel(self):
+        self._cancelled.set()
+        self._resumed.set()  # Obudź wstrzymane wątki, żeby mogły się zakończyć
+
+    def pause(self):
+        if not self._cancelled.is_set():
+            self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def is_paused(self):
+        return not self._resumed.is_set()
+
+    def should_stop(self):
+        """Czeka w czasie pauzy; zwraca True, jeśli skanowanie przerwano."""
+        self._resumed.wait()
+        return self._cancelled.is_set()
+
+
+class ScanContext:
+    """
+    Stan jednego skanowania współdzielony przez wszystkie foldery:
+    ustawienia, dane uczenia się, znacznik przerwania, licznik postępu
+    i katalog, do którego trafiają wyniki.
+    Jeśli podano progress (ScanProgress), komunikaty tekstowe trafiają
+    również do niego i są łączone w zdarzenia o stałej częstotliwości.
+    """
+
+    def __init__(
+        self,
+        progress_callback=None,
+        incremental=False,
+        learning_data=None,
+        control=None,
+        folder_timeout=None,
+        progress=None,
+        timings=None,
+        folder_catalog=None,
+        export_index_json=True,
+        compact_index_json=False,
+        duplicate_map=None,
+        preview_metadata=False,
+        metadata_cache=None,
+        inspect_archives=False,
+        archive_cache=None,
+        archive_previews=False,
+        archive_preview_cache=None,
+        folder_link_guard=None,
+        ignore_matcher=None,
+        fuzzy_settings=None,
+        on_index_written=None,
+        config=None,
+    ):
+        # Migawka konfiguracji pobrana raz na skanowanie - zmiany config.json
+        # w trakcie skanowania nie zmieniają limitów ani ustawień w połowie
+        self.config = (
+            config if config is not None else config_manager.get_config_snapshot()
+        )
+        if progress is not None:
+            text_callback = progress_callback
+
+            def progress_callback(message):
+                progress.message(message)
+                if text_callback:
+                    text_callback(message)
+
+        self.progress_callback = progress_callback
+        self.incremental = incremental
+        # DANE UCZENIA SIĘ - wczytywane raz na skanowanie
+        self.learning_data = (
+            learning_data if learning_data is not None else get_learning_store()
+        )
+        self.control = control
+        self.folder_timeout = (
+            folder_timeout
+            if folder_timeout is not None
+            else get_folder_timeout(self.config)
+        )
+        # Ponowienia błędów przejściowych i limity operacji na udział
+        self.io_policy = io_policy.get_io_policy()
+        self.progress = progress
+        self.timings = timings
+        # Katalog SQLite skanowania; index.json jest opcjonalnym eksportem
+        self.catalog = folder_catalog
+        self.export_index_json = export_index_json or folder_catalog is None
+        self.compact_index_json = compact_index_json
+        # {ścieżka pliku: ścieżka oryginału} z ostatniego etapu haszowania
+        self.duplicate_map = duplicate_map or {}
+        # Metadane podglądów z nagłówków (wymiary, format, uszkodzenia)
+        self.preview_metadata = preview_metadata
+        self.metadata_cache = metadata_cache
+        # Podsumowanie zawartości archiwów z nagłówków (bez rozpakowywania)
+        self.inspect_archives = inspect_archives
+        self.archive_cache = archive_cache
+        # Podglądy wyciągane z archiwów bez obrazu obok
+        self.archive_previews = archive_previews
+        self.archive_preview_cache = archive_preview_cache
+        # Odwiedzone foldery (urządzenie, i-węzeł) i zasada dowiązań
+        self.link_guard = (
+            folder_link_guard
+            if folder_link_guard is not None
+            else link_guard.LinkGuard()
+        )
+        # Reguły pomijania (.gitignore) - None = bez reguł
+        self.ignore_matcher = ignore_matcher
+        # Próg i przewaga dopasowania przybliżonego - None = wyłączone
+        self.fuzzy_settings = fuzzy_settings
+        # Sumy rekurencyjne folderów liczone od liści w górę
+        self.totals = folder_totals.FolderTotals(
+            functools.partial(save_folder_totals, self)
+        )
+        self.totals_updated = []  # foldery z przepisanymi sumami rekurencyjnymi
+        # on_index_written(folder, mtime_ns folderu) po zapisie index.json -
+        # obserwator odpytujący nie traktuje własnych zapisów jako zmian
+        self.on_index_written = on_index_written
+
+    def should_stop(self):
+        """Czeka w czasie pauzy; zwraca True, jeśli skanowanie przerwano."""
+        return bool(self.control and self.control.should_stop())
+
+    def is_cancelled(self):
+        return bool(self.control and self.control.is_cancelled())
+
+    def folder_done(self, folder_path):
+        if self.progress:
+            self.progress.folder_done(folder_path)
+
+    def index_written(self, folder_path):
+        """Zgłasza zapis index.json folderu wraz z mtime folderu po zapisie."""
+        if self.on_index_written is None:
+            return
         try:
-            file_size_bytes = os.path.getsize(file_path)
+            mtime_ns = os.stat(folder_path).st_mtime_ns
         except OSError:
-            file_size_bytes = 0
+            return
+        self.on_index_written(os.path.abspath(folder_path), mtime_ns)
+
+    @classmethod
+    def for_folder(
+        cls,
+        folder_path,
+        progress_callback=None,
+        incremental=False,
+        on_index_written=None,
+    ):
+        """Kontekst pojedynczego wywołania z katalogiem, do którego należy folder."""
+        config = config_manager.get_config_snapshot()
+        folder_catalog = catalog.get_catalog_for_folder(folder_path)
+        root_folder_path = (
+            folder_catalog.root_folder_path if folder_catalog else folder_path
+        )
+        return cls(
+            progress_callback,
+            incremental,
+            folder_catalog=folder_catalog,
+            export_index_json=catalog.should_export_index_json(config),
+            compact_index_json=get_compact_index_json(config),
+            duplicate_map=load_duplicate_map(folder_path, config),
+            preview_metadata=image_metadata.is_metadata_enabled(config),
+            metadata_cache=open_metadata_cache(config),
+            inspect_archives=archive_inspector.get_inspector_settings(config)[
+                "enabled"
+            ],
+            archive_cache=open_archive_cache(config),
+            archive_previews=archive_preview.get_preview_settings(config)["enabled"],
+            archive_preview_cache=open_archive_preview_cache(config),
+            folder_link_guard=link_guard.LinkGuard(
+                root_folder_path, link_guard.get_follow_policy(config)
+            ),
+            ignore_matcher=ignore_rules.get_ignore_matcher(root_folder_path, config),
+            fuzzy_settings=fuzzy_matcher.get_fuzzy_settings(config),
+            on_index_written=on_index_written,
+            config=config,
+        )
 
-        file_info = {
-            "name": file_name,
-            "path_absolute": os.path.abspath(file_path),
-            "size_bytes": file_size_bytes,
-            "size_readable": get_file_size_readable(file_size_bytes),
-        }
+    def flush(self):
+        """
+        Kończy sumy rekurencyjne (podfoldery nieprzeskanowane w tym przebiegu
+        z zapisanych indeksów) i zatwierdza oczekujące zapisy katalogu.
+        Po przerwaniu skanowania niekompletne sumy są porzucane.
+        """
+        if self.catalog is not None:
+            self.catalog.flush()
+        if self.is_cancelled():
+            self.totals.discard()
+        else:
+            self.totals.finish_pending(
+                lambda folder_path: load_folder_info(folder_path, self.catalog)
+            )
+        if self.catalog is not None:
+            self.catalog.flush()
 
-        # ULEPSZONE dopasowywanie z NAUKĄ
-        preview_file_path = find_matching_preview_for_file(
-            file_basename, full_path_image_files, learning_data
-        )
+    def start_folder_timing(self, folder_path):
+        if self.timings:
+            return self.timings.start_folder(folder_path)
+        return FolderTiming(folder_path)
+
+    def finish_folder_timing(self, folder_timing):
+        if self.timings:
+            self.timings.finish_folder(folder_timing)
+
+
+def process_folder(
+    folder_path,
+    progress_callback=None,
+    recursive=True,
+    incremental=False,
+    context=None,
+):
+    """
+    Przetwarza folder i (przy recursive=True) jego podfoldery.
+    Podfoldery są przechodzone przez jawną kolejkę zamiast rekurencji,
+    więc głębokość drzewa nie jest ograniczona limitem rekurencji.
+    Foldery, których listowanie przekroczyło limit czasu, są ponawiane
+    raz na końcu kolejki.
+    context: ScanContext skanowania (jeśli podany, zastępuje progress_callback
+    i incremental).
+    Zwraca listę ścieżek podfolderów folderu głównego.
+    """
+    if context is None:
+        context = ScanContext.for_folder(folder_path, progress_callback, incremental)
+        try:
+            return process_folder(folder_path, recursive=recursive, context=context)
+        finally:
+            context.flush()
+
+    if not recursive:
+        return process_single_folder(folder_path, context)
+
+    root_subdirectories = []
+    retried_folders = set()
+    folder_queue = deque([folder_path])
+    while folder_queue:
+        if context.should_stop():
+            logger.info(f"Przerwano przetwarzanie folderu: {folder_path}")
+            break
+        current_folder = folder_queue.popleft()
+        if current_folder != folder_path:
+            logger.info(f"Przetwarzanie podfolderu: {current_folder}")
+        try:
+            subdirectories = process_single_folder(current_folder, context)
+        except io_watchdog.OperationTimeout:
+            if current_folder not in retried_folders:
+                retried_folders.add(current_folder)
+                folder_queue.append(current_folder)
+            continue
+        context.folder_done(current_folder)
+        if current_folder == folder_path:
+            root_subdirectories = subdirectories
+        folder_queue.extend(subdirectories)
+
+    return root_subdirectories
+
+
+def process_single_folder(folder_path, context=None):
+    """
+    Przetwarza pojedynczy folder: zbiera informacje i generuje index.json.
+    NOWA FUNKCJONALNOŚĆ: Używa danych uczenia się (LearningStore z kontekstu
+    skanowania).
+
+    Przy context.incremental=True istniejący index.json jest zachowywany,
+    jeśli sygnatura folderu się nie zmieniła.
+    Po przerwaniu przez context.control index.json nie jest zapisywany.
+    Jeśli listowanie przekroczy context.folder_timeout sekund, folder jest
+    oznaczany w index.json jako timed_out i zgłaszany jest
+    io_watchdog.OperationTimeout.
+    Zwraca listę ścieżek podfolderów (nieprzetworzonych).
+    """
+    if context is None:
+        context = ScanContext()
+    if context.should_stop():
+        return []
+
+    timing = context.start_folder_timing(folder_path)
+    try:
+        return scan_folder_contents(folder_path, context, timing)
+    finally:
+        context.finish_folder_timing(timing)
+
+
+def scan_folder_contents(folder_path, context, timing):
+    """
+    Właściwe przetwarzanie folderu dla process_single_folder.
+    Czas każdej fazy (scandir, sygnatura, dopasowanie, klasyfikacja,
+    statystyki, zapis) jest doliczany do timing.
+    """
+    progress_callback = context.progress_callback
+    learning_data = context.learning_data
+
+    logger.info(f"Rozpoczęcie przetwarzania folderu: {folder_path}")
+
+    if context.progress:
+        context.progress.folder_started(folder_path)
+    if progress_callback:
+        progress_callback(f"Przetwarzanie folderu: {folder_path}")
 
-        if preview_file_path:
-            file_info["preview_found"] = True
-            file_info["preview_name"] = os.path.basename(preview_file_path)
-            file_info["preview_path_absolute"] = os.path.abspath(preview_file_path)
-            index_data["files_with_previews"].append(file_info)
-            found_previews_paths.add(preview_file_path)
-            logger.info(
-                f"✅ Dopasowano: '{file_name}' ↔ '{os.path.basename(preview_file_path)}'"
+    # DODAJ DEBUG MATCHING (opcjonalnie, tylko dla problemów)
+    # log_file_matching_debug(folder_path, progress_callback)
+
+    # ZABEZPIECZENIE PRZED ZAWIESZENIEM - sprawdzenie dostępu i listowanie
+    # pod watchdogiem, zawieszony udział nie blokuje reszty skanowania
+    try:
+        with timing.phase("scandir"):
+            access_error, snapshot = run_folder_io(
+                context,
+                read_folder,
+                folder_path,
+                progress_callback,
+                context.link_guard,
+                context.ignore_matcher,
+                path=folder_path,
+                description=f"listowanie {folder_path}",
             )
-        else:
-            file_info["preview_found"] = False
-            index_data["files_without_previews"].append(file_info)
-            logger.debug(f"❌ Brak podglądu dla: '{file_name}'")
-
-    # Dodaj obrazy, które nie zostały sparowane jako podglądy
-    for img_name in image_filenames:
-        img_path_full = os.path.join(folder_path, img_name)
-        if img_path_full not in found_previews_paths:
-            try:
-                img_size_bytes = os.path.getsize(img_path_full)
-            except OSError:
-                img_size_bytes = 0
-
-            index_data["other_images"].append(
-                {
-                    "name": img_name,
-                    "path_absolute": os.path.abspath(img_path_full),
-                    "size_bytes": img_size_bytes,
-                    "size_readable": get_file_size_readable(img_size_bytes),
-                }
+    except io_watchdog.OperationTimeout as e:
+        msg = f"TIMEOUT: {e}"
+        logger.error(msg)
+        if progress_callback:
+            progress_callback(msg)
+        write_timed_out_index(folder_path, context)
+        raise
+    except (OSError, PermissionError) as e:
+        msg = f"Błąd dostępu do folderu {folder_path}: {e}"
+        logger.error(msg)
+        if progress_callback:
+            progress_callback(msg)
+        context.totals.folder_scanned(folder_path, None, [])
+        return []
+
+    if access_error:
+        logger.error(access_error)
+        if progress_callback:
+            progress_callback(access_error)
+        context.totals.folder_scanned(folder_path, None, [])
+        return []
+
+    # Rekordy trafiają do buforów w chwili klasyfikacji (duże foldery - do
+    # plików tymczasowych), więc pamięć nie rośnie z liczbą plików w folderze
+    index_data = {
+        "folder_info": None,  # Będzie zaktualizowane na końcu
+        "files_with_previews": index_stream.RecordSpool(),
+        "files_without_previews": index_stream.RecordSpool(),
+        "other_images": index_stream.RecordSpool(),  # Obrazy niebędące podglądami
+    }
+
+    folder_files = snapshot.image_files + snapshot.other_files
+    folder_bytes = sum(f["size_bytes"] for f in folder_files)
+    timing.count("files", len(snapshot.other_files))
+    timing.count("images", len(snapshot.image_files))
+    timing.count("subdirectories", len(snapshot.subdirectories))
+    timing.count("ignored", snapshot.ignored_count)
+    timing.count("bytes", folder_bytes)
+    if context.progress:
+        context.progress.add_files(len(folder_files), folder_bytes)
+
+    subdirectories = snapshot.subdirectories
+    with timing.phase("signature"):
+        signature = compute_folder_signature(
+            snapshot.signature_entries,
+            learning_data,
+            snapshot.ignore_digest,
+            context.fuzzy_settings,
+            image_metadata.METADATA_VERSION if context.preview_metadata else None,
+        )
+        # Poprzednie folder_info: sygnatura i sumy rekurencyjne podfolderów
+        previous_info = None
+        if context.incremental or subdirectories:
+            previous_info = load_folder_info(folder_path, context.catalog)
+        unchanged = (
+            context.incremental
+            and previous_info is not None
+            and previous_info.get("signature") == signature
+            # Indeksy sprzed sum rekurencyjnych są skanowane ponownie
+            and "with_previews_count" in previous_info
+        )
+    if unchanged:
+        logger.info(f"Folder bez zmian, pomijam: {folder_path}")
+        timing.count("unchanged_folders")
+        if progress_callback:
+            progress_callback(f"Bez zmian: {folder_path}")
+        context.totals.folder_scanned(folder_path, previous_info, subdirectories)
+        return subdirectories
+
+    with timing.phase("matching"):
+        # Indeks obrazów budowany raz dla całego folderu
+        preview_matcher = PreviewMatcher(img["path"] for img in snapshot.image_files)
+        preview_paths = []
+        for file_entry in snapshot.other_files:
+            if context.should_stop():
+                logger.info(f"Przerwano przed zapisem indeksu: {folder_path}")
+                return []
+            file_basename, _ = os.path.splitext(file_entry["name"])
+            # ULEPSZONE dopasowywanie z NAUKĄ
+            preview_paths.append(preview_matcher.find(file_basename, learning_data))
+
+    # Drugi etap: pliki bez podglądu dopasowywane przybliżenie do obrazów,
+    # które nie zostały jeszcze podglądami
+    fuzzy_scores = {}
+    if context.fuzzy_settings and not all(preview_paths):
+        with timing.phase("fuzzy_matching"):
+            used_previews = set(filter(None, preview_paths))
+            unmatched_positions = [
+                position
+                for position, preview_file_path in enumerate(preview_paths)
+                if not preview_file_path
+            ]
+            fuzzy = fuzzy_matcher.FuzzyMatcher(
+                (
+                    img["path"]
+                    for img in snapshot.image_files
+                    if img["path"] not in used_previews
+                ),
+                **context.fuzzy_settings,
+            )
+            fuzzy_matches = fuzzy.match_all(
+                os.path.splitext(snapshot.other_files[position]["name"])[0]
+                for position in unmatched_positions
             )
+            for match_position, (img_path, score) in fuzzy_matches.items():
+                position = unmatched_positions[match_position]
+                preview_paths[position] = img_path
+                fuzzy_scores[position] = score
+        timing.count("fuzzy_matched", len(fuzzy_scores))
+
+    embedded_previews = {}
+    if context.archive_previews:
+        with timing.phase("archive_preview"):
+            archive_entries = [
+                file_entry
+                for file_entry, preview_file_path in zip(
+                    snapshot.other_files, preview_paths
+                )
+                if not preview_file_path
+                and archive_preview.can_extract(file_entry["extension"])
+            ]
+            if archive_entries and not context.should_stop():
+                embedded_previews = call_folder_io(
+                    context,
+                    archive_preview.extract_previews,
+                    archive_entries,
+                    context.archive_preview_cache,
+                    archive_preview.get_preview_settings(context.config),
+                    path=folder_path,
+                    description=f"podglądy z archiwów w {folder_path}",
+                )
+        timing.count("archive_previews", len(embedded_previews))
+
+    preview_metadata = {}
+    if context.preview_metadata:
+        with timing.phase("metadata"):
+            matched_previews = set(filter(None, preview_paths))
+            preview_entries = [
+                img for img in snapshot.image_files if img["path"] in matched_previews
+            ]
+            preview_entries.extend(embedded_previews.values())
+            preview_metadata = call_folder_io(
+                context,
+                image_metadata.read_images_metadata,
+                preview_entries,
+                context.metadata_cache,
+                path=folder_path,
+                description=f"nagłówki podglądów w {folder_path}",
+            )
+        timing.count(
+            "corrupt_previews",
+            sum(1 for metadata in preview_metadata.values() if metadata["corrupt"]),
+        )
 
-    # Aktualizuj statystyki folderu na końcu
-    index_data["folder_info"] = get_folder_stats(folder_path)
+    archive_contents = {}
+    if context.inspect_archives:
+        with timing.phase("archive_inspect"):
+            archive_entries = [
+                file_entry
+                for file_entry in snapshot.other_files
+                if archive_inspector.is_archive_extension(file_entry["extension"])
+            ]
+            archive_contents = call_folder_io(
+                context,
+                archive_inspector.inspect_archives,
+                archive_entries,
+                context.archive_cache,
+                archive_inspector.get_inspector_settings(context.config),
+                path=folder_path,
+                description=f"zawartość archiwów w {folder_path}",
+            )
+        timing.count("archives", len(archive_contents))
+
+    with timing.phase("classification"):
+        found_previews_paths = set()
+        image_entries = {img["path"]: img for img in snapshot.image_files}
+        for position, (file_entry, preview_file_path) in enumerate(
+            zip(snapshot.other_files, preview_paths)
+        ):
+            file_name = file_entry["name"]
+            file_size_bytes = file_entry["size_bytes"]
+
+            file_info = {
+                "name": file_name,
+                "path_absolute": os.path.abspath(file_entry["path"]),
+                "size_bytes": file_size_bytes,
+                "size_readable": get_file_size_readable(file_size_bytes),
+                "extension": file_entry["extension"],
+            }
+            duplicate_of = context.duplicate_map.get(file_info["path_absolute"])
+            if duplicate_of:
+                file_info["duplicate_of"] = duplicate_of
+            contents = archive_contents.get(file_info["path_absolute"])
+            if contents is not None:
+                if "uncompressed_size_bytes" in contents:
+                    contents = dict(
+                        contents,
+                        uncompressed_size_readable=get_file_size_readable(
+                            contents["uncompressed_size_bytes"]
+                        ),
+                    )
+                file_info["archive_contents"] = contents
+
+            embedded_preview = None
+            if not preview_file_path:
+                embedded_preview = embedded_previews.get(file_info["path_absolute"])
 
-    # Zapisz index.json
+            if preview_file_path:
+                file_info["preview_found"] = True
+                file_info["preview_name"] = os.path.basename(preview_file_path)
+                file_info["preview_path_absolute"] = os.path.abspath(
+                    preview_file_path
+                )
+                # Rozmiar i mtime podglądu z migawki - klucz miniatury galerii
+                # bez ponownego odczytu atrybutów pliku
+                preview_entry = image_entries.get(preview_file_path)
+                if preview_entry is not None:
+                    file_info["preview_size_bytes"] = preview_entry["size_bytes"]
+                    file_info["preview_mtime_ns"] = preview_entry["mtime_ns"]
+                metadata = preview_metadata.get(file_info["preview_path_absolute"])
+                if metadata is not None:
+                    file_info["preview_metadata"] = metadata
+                if position in fuzzy_scores:
+                    # Para z dopasowania przybliżonego - do potwierdzenia w UI
+                    file_info["preview_match"] = "fuzzy"
+                    file_info["preview_match_score"] = round(fuzzy_scores[position], 3)
+                index_data["files_with_previews"].append(file_info)
+                found_previews_paths.add(preview_file_path)
+                logger.info(
+                    f"✅ Dopasowano: '{file_name}' ↔ '{os.path.basename(preview_file_path)}'"
+                )
+            elif embedded_preview:
+                # Podgląd wyciągnięty z archiwum do _gallery_cache
+                file_info["preview_found"] = True
+                file_info["preview_name"] = embedded_preview["entry"]
+                file_info["preview_path_absolute"] = embedded_preview["path"]
+                file_info["preview_source"] = "archive"
+                file_info["preview_size_bytes"] = embedded_preview["size_bytes"]
+                file_info["preview_mtime_ns"] = embedded_preview["mtime_ns"]
+                metadata = preview_metadata.get(embedded_preview["path"])
+                if metadata is not None:
+                    file_info["preview_metadata"] = metadata
+                index_data["files_with_previews"].append(file_info)
+                logger.info(
+                    f"✅ Podgląd z archiwum: '{file_name}' ↔ "
+                    f"'{embedded_preview['entry']}'"
+                )
+            else:
+                file_info["preview_found"] = False
+                index_data["files_without_previews"].append(file_info)
+                logger.debug(f"❌ Brak podglądu dla: '{file_name}'")
+
+        # Dodaj obrazy, które nie zostały sparowane jako podglądy
+        for img_entry in snapshot.image_files:
+            if img_entry["path"] not in found_previews_paths:
+                img_size_bytes = img_entry["size_bytes"]
+                index_data["other_images"].append(
+                    {
+                        "name": img_entry["name"],
+                        "path_absolute": os.path.abspath(img_entry["path"]),
+                        "size_bytes": img_size_bytes,
+                        "size_readable": get_file_size_readable(img_size_bytes),
+                        "extension": img_entry["extension"],
+                    }
+                )
+    timing.count("matched", len(index_data["files_with_previews"]))
+    timing.count("unmatched", len(index_data["files_without_previews"]))
+
+    # Aktualizuj statystyki folderu na końcu
+    with timing.phase("folder_stats"):
+        folder_info = get_folder_stats(folder_path, snapshot)
+        folder_info["with_previews_count"] = len(index_data["files_with_previews"])
+        folder_info["without_previews_count"] = len(
+            index_data["files_without_previews"]
+        )
+        set_folder_totals(folder_info, subdirectories, previous_info)
+    folder_info["signature"] = signature
+    index_data["folder_info"] = folder_info
+    set_index_hash(index_data)
+    # Sumy rekurencyjne są kończone, gdy zgłoszą się wszystkie podfoldery
+    context.totals.folder_scanned(folder_path, folder_info, subdirectories)
+
+    if context.catalog is not None:
+        with timing.phase("catalog_write"):
+            context.catalog.save_folder(folder_path, index_data, subdirectories)
+    if not context.export_index_json:
+        return subdirectories
+
+    # Zapisz index.json (eksport obok katalogu)
     index_json_path = os.path.join(folder_path, "index.json")
     try:
-        with open(index_json_path, "w", encoding="utf-8") as f:
-            json.dump(index_data, f, indent=4, ensure_ascii=False)
-        logger.info(f"Zapisano plik index.json: {index_json_path}")
-        if progress_callback:
-            progress_callback(f"Zapisano: {index_json_path}")
-    except IOError as e:
+        with timing.phase("index_write"):
+            written = run_folder_io(
+                context,
+                write_index_json,
+                index_json_path,
+                index_data,
+                context.compact_index_json,
+                path=folder_path,
+                description=f"zapis {index_json_path}",
+            )
+        if written:
+            context.index_written(folder_path)
+            logger.info(f"Zapisano plik index.json: {index_json_path}")
+            if progress_callback:
+                progress_callback(f"Zapisano: {index_json_path}")
+        else:
+            timing.count("index_unchanged")
+            logger.debug(f"index.json bez zmian, pominięto zapis: {index_json_path}")
+    except (IOError, io_watchdog.OperationTimeout) as e:
         msg = f"Błąd zapisu {index_json_path}: {e}"
         logger.error(msg)
         if progress_callback:
             progress_callback(msg)
 
-    # Przetwarzaj podfoldery
-    for subdir in subdirectories:
-        logger.info(f"Przetwarzanie podfolderu: {subdir}")
-        process_folder(subdir, progress_callback)
+    return subdirectories
 
 
-def process_folder_with_retry(folder_path, max_retries=3, progress_callback=None):
+def process_folder_with_retry(
+    folder_path, max_retries=3, progress_callback=None, recursive=True, context=None
+):
     """Przetwarza folder z mechanizmem ponownych prób w przypadku błędów dostępu."""
     logger.info(f"Rozpoczęcie przetwarzania folderu z mechanizmem retry: {folder_path}")
+    if context is None:
+        context = ScanContext.for_folder(folder_path, progress_callback)
+        try:
+            return process_folder_with_retry(
+                folder_path, max_retries, recursive=recursive, context=context
+            )
+        finally:
+            context.flush()
+    progress_callback = context.progress_callback
 
     for attempt in range(max_retries):
         try:
-            return process_folder(folder_path, progress_callback)
-        except PermissionError as e:
+            return process_folder(folder_path, recursive=recursive, context=context)
+        except OSError as e:
+            # Brak uprawnień ponawiany jak dawniej, inne błędy - gdy przejściowe
+            if not (
+                isinstance(e, PermissionError) or io_policy.is_transient_error(e)
+            ):
+                raise
             logger.warning(f"Próba {attempt + 1}/{max_retries} nie powiodła się: {e}")
             if attempt == max_retries - 1:
                 msg = f"Nie udało się uzyskać dostępu do folderu {folder_path} po {max_retries} próbach"
@@ -574,23 +1654,496 @@ def process_folder_with_retry(folder_path, max_retries=3, progress_callback=None
                 progress_callback(
                     f"Próba {attempt + 1}/{max_retries} nie powiodła się, ponawiam..."
                 )
-            time.sleep(0.5)
+            time.sleep(context.io_policy.backoff_delay(attempt))
+
 
+def get_max_worker_threads(config=None):
+    """Zwraca liczbę wątków skanowania z performance.max_worker_threads."""
+    try:
+        workers = int(
+            config_manager.get_config_value(
+                "performance.max_worker_threads", 4, config
+            )
+        )
+    except (TypeError, ValueError):
+        logger.warning(
+            "Nieprawidłowa wartość performance.max_worker_threads, używam 4"
+        )
+        workers = 4
+    return max(1, workers)
+
+
+def scan_folders_parallel(root_folder_path, context=None, max_workers=None):
+    """
+    Skanuje drzewo folderów w ograniczonej puli wątków.
+    Każdy folder jest osobnym zadaniem - po jego zakończeniu do puli trafiają
+    jego podfoldery, więc oczekiwanie na listowanie katalogów się nakłada.
+    Foldery, których listowanie przekroczyło limit czasu, są ponawiane
+    po przejściu reszty drzewa (FOLDER_TIMEOUT_RETRIES razy).
+    Po przerwaniu przez control nowe foldery nie są dodawane, a oczekujące
+    zadania są anulowane.
+    Zwraca liczbę przetworzonych folderów.
+    """
+    if context is None:
+        context = ScanContext()
+    if max_workers is None:
+        max_workers = get_max_worker_threads(context.config)
+    progress_callback = context.progress_callback
+
+    logger.info(f"Skanowanie równoległe: {max_workers} wątków")
+    processed_count = 0
+    timed_out_folders = []
+    retry_round = 0
+
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="scanner"
+    ) as executor:
+        # Folder główny z mechanizmem retry - jego błąd przerywa skanowanie
+        root_future = executor.submit(
+            process_folder_with_retry,
+            root_folder_path,
+            recursive=False,
+            context=context,
+        )
+        pending = {root_future: root_folder_path}
 
-def start_scanning(root_folder_path, progress_callback=None):
-    """Rozpoczyna skanowanie od podanego folderu głównego."""
+        def submit_folder(folder_path):
+            future = executor.submit(process_single_folder, folder_path, context)
+            pending[future] = folder_path
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder_path = pending.pop(future)
+                try:
+                    subdirectories = future.result() or []
+                except io_watchdog.OperationTimeout:
+                    # Zawieszony folder - ponowienie po reszcie drzewa
+                    timed_out_folders.append(folder_path)
+                    continue
+                except Exception as e:
+                    if future is root_future:
+                        raise
+                    msg = f"Błąd przetwarzania folderu {folder_path}: {e}"
+                    logger.error(msg)
+                    if progress_callback:
+                        progress_callback(msg)
+                    subdirectories = []
+
+                processed_count += 1
+                if context.is_cancelled():
+                    continue
+                context.folder_done(folder_path)
+                for subdir in subdirectories:
+                    logger.info(f"Przetwarzanie podfolderu: {subdir}")
+                    submit_folder(subdir)
+
+            if context.is_cancelled():
+                # Anuluj zadania, które jeszcze nie wystartowały
+                for future in list(pending):
+                    if future.cancel():
+                        pending.pop(future)
+                continue
+
+            if not pending and timed_out_folders:
+                if retry_round >= FOLDER_TIMEOUT_RETRIES:
+                    break
+                retry_round += 1
+                msg = (
+                    f"Ponawianie {len(timed_out_folders)} folderów po timeout "
+                    f"(próba {retry_round}/{FOLDER_TIMEOUT_RETRIES})"
+                )
+                logger.info(msg)
+                if progress_callback:
+                    progress_callback(msg)
+                for folder_path in timed_out_folders:
+                    submit_folder(folder_path)
+                timed_out_folders = []
+
+    for folder_path in timed_out_folders:
+        msg = f"Pominięto folder po przekroczeniu limitu czasu: {folder_path}"
+        logger.error(msg)
+        if progress_callback:
+            progress_callback(msg)
+
+    return processed_count
+
+
+def load_index_data(folder_path, folder_catalog=None):
+    """
+    Zwraca dane folderu z katalogu albo z index.json (None, gdy ich brak).
+    Sekcje rekordów są czytane przy iteracji (index_stream.LazySection),
+    więc błąd odczytu może pojawić się dopiero w trakcie przeglądania.
+    """
+    if folder_catalog is not None:
+        index_data = folder_catalog.get_index_data(folder_path)
+        if index_data is not None:
+            return index_data
+    try:
+        return index_stream.load_index(os.path.join(folder_path, "index.json"))
+    except (OSError, ValueError):
+        return None
+
+
+def collect_indexed_files(root_folder_path, folder_catalog=None):
+    """Zwraca {ścieżka: rozmiar} plików (bez obrazów) z indeksów poddrzewa."""
+    if folder_catalog is not None:
+        rows = folder_catalog.get_files(root_folder_path)
+        if rows:
+            return dict(rows)
+
+    files = {}
+    for dirpath, _, filenames in os.walk(root_folder_path):
+        if "index.json" not in filenames:
+            continue
+        index_data = load_index_data(dirpath) or {}
+        try:
+            for key in ("files_with_previews", "files_without_previews"):
+                for file_info in index_data.get(key, []):
+                    files[file_info["path_absolute"]] = file_info.get("size_bytes", 0)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Pominięto uszkodzony index.json w {dirpath}: {e}")
+    return files
+
+
+def update_duplicate_fields(folder_paths, context):
+    """
+    Ustawia lub usuwa pole duplicate_of w indeksach podanych folderów
+    według context.duplicate_map (katalog i eksport index.json).
+    """
+    for folder_path in sorted(folder_paths):
+        index_data = load_index_data(folder_path, context.catalog)
+        if index_data is None:
+            continue
+        # Rekordy są przepisywane do nowych buforów zamiast zmieniane w miejscu
+        # (sekcje z katalogu i index.json są czytane strumieniowo)
+        updated_data = {"folder_info": dict(index_data.get("folder_info") or {})}
+        changed = False
+        try:
+            for key in index_stream.INDEX_SECTIONS:
+                records = updated_data[key] = index_stream.RecordSpool()
+                for file_info in index_data.get(key, []):
+                    if key != "other_images":
+                        duplicate_of = context.duplicate_map.get(
+                            file_info["path_absolute"]
+                        )
+                        if file_info.get("duplicate_of") != duplicate_of:
+                            if duplicate_of:
+                                file_info["duplicate_of"] = duplicate_of
+                            else:
+                                file_info.pop("duplicate_of", None)
+                            changed = True
+                    records.append(file_info)
+        except (OSError, ValueError) as e:
+            logger.error(f"Błąd odczytu indeksu {folder_path}: {e}")
+            continue
+        if not changed:
+            continue
+
+        try:
+            save_index_data(folder_path, updated_data, context)
+        except (OSError, io_watchdog.OperationTimeout) as e:
+            logger.error(f"Błąd zapisu duplikatów w {folder_path}: {e}")
+    context.flush()
+
+
+def save_index_data(folder_path, index_data, context):
+    """
+    Zapisuje przepisany indeks folderu w katalogu i (przy eksporcie)
+    w index.json. Błędy zapisu index.json są przekazywane dalej.
+    """
+    set_index_hash(index_data)
+    if context.catalog is not None:
+        context.catalog.save_folder(folder_path, index_data)
+    if context.export_index_json:
+        index_json_path = os.path.join(folder_path, "index.json")
+        if run_folder_io(
+            context,
+            write_index_json,
+            index_json_path,
+            index_data,
+            context.compact_index_json,
+            path=folder_path,
+            description=f"zapis {index_json_path}",
+        ):
+            context.index_written(folder_path)
+
+
+def update_folder_totals(folder_path, context, recursive, subfolders, folder_info):
+    """
+    Zapisuje sumy rekurencyjne i wpisy podfolderów w folder_info indeksu
+    folderu, jeśli różnią się od zapisanych w folder_info.
+    Zwraca True po zapisie.
+    """
+    if (
+        folder_info.get("recursive") == recursive
+        and folder_info.get("subfolders") == subfolders
+    ):
+        return False
+    if context.catalog is not None:
+        context.catalog.flush()  # indeks folderu może czekać w partii
+    index_data = load_index_data(folder_path, context.catalog)
+    if index_data is None:
+        return False
+
+    updated_data = {
+        "folder_info": dict(
+            index_data.get("folder_info") or {},
+            recursive=recursive,
+            subfolders=subfolders,
+        )
+    }
+    try:
+        for key in index_stream.INDEX_SECTIONS:
+            records = updated_data[key] = index_stream.RecordSpool()
+            for file_info in index_data.get(key, []):
+                records.append(file_info)
+        save_index_data(folder_path, updated_data, context)
+    except (OSError, ValueError, io_watchdog.OperationTimeout) as e:
+        logger.error(f"Błąd zapisu sum rekurencyjnych w {folder_path}: {e}")
+        return False
+    context.totals_updated.append(folder_path)
+    return True
+
+
+def update_ancestor_totals(folder_path, totals, context):
+    """
+    Przelicza sumy rekurencyjne folderów nadrzędnych nieskanowanych w tym
+    przebiegu (np. po ponownym indeksowaniu jednego folderu przez
+    obserwator) z ich własnych statystyk i zapisanych sum podfolderów.
+    Kończy na pierwszym folderze bez zmian, bez indeksu albo poza katalogiem.
+    """
+    if context.catalog is not None:
+        context.catalog.flush()
+    child_path = os.path.abspath(folder_path)
+    child_totals = totals
+    while True:
+        parent_path = os.path.dirname(child_path)
+        if parent_path == child_path:
+            return
+        if context.catalog is not None and not catalog.is_path_within(
+            parent_path, context.catalog.root_folder_path
+        ):
+            return
+        parent_info = load_folder_info(parent_path, context.catalog)
+        if not parent_info or "subfolders" not in parent_info:
+            return
+
+        child_name = os.path.basename(child_path)
+        subfolders = [
+            (entry["name"], entry["recursive"])
+            for entry in parent_info["subfolders"]
+            if entry.get("name") != child_name
+        ]
+        subfolders.append((child_name, child_totals))
+        subfolders.sort(key=lambda item: item[0])
+        parent_totals = folder_totals.own_totals(parent_info)
+        for _, subfolder_totals in subfolders:
+            folder_totals.add_child_totals(parent_totals, subfolder_totals)
+
+        if not update_folder_totals(
+            parent_path,
+            context,
+            totals_with_readable(parent_totals),
+            build_subfolder_totals(subfolders),
+            parent_info,
+        ):
+            return
+        child_path = parent_path
+        child_totals = parent_totals
+
+
+def save_folder_totals(context, folder_path, totals, subfolders, folder_info, has_parent):
+    """
+    Zapisuje kompletne sumy rekurencyjne folderu (FolderTotals.on_complete).
+    Dla folderu najwyższego w tym przebiegu przelicza też foldery nadrzędne.
+    """
+    update_folder_totals(
+        folder_path,
+        context,
+        totals_with_readable(totals),
+        build_subfolder_totals(subfolders),
+        folder_info,
+    )
+    if not has_parent:
+        # Sumy mogły zmienić się już przy zapisie indeksu (liść) - foldery
+        # nadrzędne porównują wpis podfolderu z własnym folder_info
+        update_ancestor_totals(folder_path, totals, context)
+
+
+def find_duplicates(root_folder_path, context):
+    """
+    Etap haszowania po skanowaniu: haszuje pliki o powtarzającym się
+    rozmiarze (pliki o unikalnym rozmiarze nie mogą być duplikatami),
+    korzystając z trwałej pamięci skrótów, i zapisuje duplicate_of
+    w indeksach folderów, w których wynik się zmienił.
+    Zwraca listę grup duplikatów albo None, jeśli skanowanie przerwano.
+    """
+    settings = content_hash.get_hashing_settings(context.config)
+    files = collect_indexed_files(root_folder_path, context.catalog)
+    by_size = {}
+    for file_path, size_bytes in files.items():
+        if size_bytes > 0:
+            by_size.setdefault(size_bytes, []).append(file_path)
+    candidates = [
+        file_path for paths in by_size.values() if len(paths) > 1 for file_path in paths
+    ]
+
+    msg = f"Szukanie duplikatów: {len(candidates)} z {len(files)} plików do porównania"
+    logger.info(msg)
+    if context.progress_callback:
+        context.progress_callback(msg)
+
+    hash_cache = content_hash.get_hash_cache()
+    hashes = content_hash.hash_files(
+        candidates,
+        hash_cache,
+        workers=settings["workers"],
+        chunk_size=settings["chunk_size"],
+        progress_callback=context.progress_callback,
+        should_stop=context.should_stop,
+    )
+    if context.is_cancelled():
+        return None
+
+    groups = content_hash.find_duplicate_groups(files, hashes)
+    duplicate_map = {
+        file_path: group["files"][0]
+        for group in groups
+        for file_path in group["files"][1:]
+    }
+    previous_map = hash_cache.get_duplicates(root_folder_path)
+    hash_cache.set_duplicates(root_folder_path, duplicate_map, hashes)
+    context.duplicate_map = duplicate_map
+
+    changed_folders = {
+        os.path.dirname(file_path)
+        for file_path in set(previous_map) | set(duplicate_map)
+        if previous_map.get(file_path) != duplicate_map.get(file_path)
+    }
+    update_duplicate_fields(changed_folders, context)
+    return groups
+
+
+def start_scanning(
+    root_folder_path,
+    progress_callback=None,
+    max_workers=None,
+    incremental=False,
+    control=None,
+    progress_event_callback=None,
+    on_index_written=None,
+    config=None,
+):
+    """
+    Rozpoczyna skanowanie od podanego folderu głównego.
+    incremental=True pomija foldery, których sygnatura się nie zmieniła.
+    control: opcjonalny ScanControl, przez który UI może przerwać
+    lub wstrzymać skanowanie.
+    progress_event_callback: opcjonalna funkcja przyjmująca ProgressEvent
+    (liczby folderów, plików, bajtów, ETA) wywoływana ze stałą częstotliwością.
+    on_index_written: opcjonalna funkcja (folder, mtime_ns folderu)
+    wywoływana po każdym zapisie index.json (np. dla obserwatora folderów).
+    config: migawka konfiguracji (ConfigSnapshot) - domyślnie pobierana raz
+    na początku; wszystkie ustawienia skanowania pochodzą z niej.
+    Na końcu skanowania czasy faz (scandir, dopasowanie, statystyki, zapis)
+    najwolniejszych folderów są zapisywane w logs/scan_timing_*.json.
+    Przy włączonym duplicates.enabled pliki są haszowane, a raport
+    duplikatów trafia do logs/duplicates_*.json. Uszkodzone podglądy
+    (puste, obcięte, o nieczytelnym nagłówku) są wypisywane
+    w logs/corrupt_previews_*.json.
+    """
     logger.info(f"Rozpoczęcie skanowania od folderu: {root_folder_path}")
 
+    progress = None
+    if progress_event_callback:
+        progress = ScanProgress(progress_event_callback)
+
+    def report(message):
+        if progress:
+            progress.finish(message)
+        if progress_callback:
+            progress_callback(message)
+
     if not os.path.isdir(root_folder_path):
         msg = f"Błąd: Ścieżka {root_folder_path} nie jest folderem lub nie istnieje."
         logger.error(msg)
-        if progress_callback:
-            progress_callback(msg)
+        report(msg)
+        return
+
+    # Konfiguracja i dane uczenia się wczytane raz dla całego skanowania
+    if config is None:
+        config = config_manager.get_config_snapshot()
+    timings = ScanTimings(root_folder_path, get_timing_report_folders(config))
+    context = ScanContext(
+        progress_callback,
+        incremental,
+        control=control,
+        progress=progress,
+        timings=timings,
+        folder_catalog=catalog.get_catalog_for_folder(root_folder_path),
+        export_index_json=catalog.should_export_index_json(config),
+        compact_index_json=get_compact_index_json(config),
+        duplicate_map=load_duplicate_map(root_folder_path, config),
+        preview_metadata=image_metadata.is_metadata_enabled(config),
+        metadata_cache=open_metadata_cache(config),
+        inspect_archives=archive_inspector.get_inspector_settings(config)["enabled"],
+        archive_cache=open_archive_cache(config),
+        archive_previews=archive_preview.get_preview_settings(config)["enabled"],
+        archive_preview_cache=open_archive_preview_cache(config),
+        folder_link_guard=link_guard.LinkGuard(
+            root_folder_path, link_guard.get_follow_policy(config)
+        ),
+        ignore_matcher=ignore_rules.get_ignore_matcher(root_folder_path, config),
+        fuzzy_settings=fuzzy_matcher.get_fuzzy_settings(config),
+        on_index_written=on_index_written,
+        config=config,
+    )
+    learning_data = context.learning_data
+    if len(learning_data):
+        logger.info(f"Wczytano {len(learning_data)} nauczonych dopasowań")
+        if context.progress_callback:
+            context.progress_callback(
+                f"Zastosowano {len(learning_data)} nauczonych dopasowań"
+            )
+
+    if progress:
+        progress.start_precount(
+            root_folder_path,
+            control,
+            context.ignore_matcher,
+            context.link_guard.follow_policy,
+        )
+
+    try:
+        folder_count = scan_folders_parallel(root_folder_path, context, max_workers)
+    finally:
+        context.flush()
+    logger.info(f"Przetworzono folderów: {folder_count}")
+    write_timing_report(timings)
+    if (
+        content_hash.get_hashing_settings(context.config)["enabled"]
+        and not context.is_cancelled()
+    ):
+        try:
+            groups = find_duplicates(root_folder_path, context)
+            if groups is not None:
+                content_hash.write_duplicates_report(root_folder_path, groups)
+        except Exception as e:
+            logger.error(f"Błąd etapu wyszukiwania duplikatów: {e}")
+    if context.metadata_cache is not None and not context.is_cancelled():
+        try:
+            image_metadata.write_corrupt_previews_report(
+                root_folder_path, context.metadata_cache
+            )
+        except OSError as e:
+            logger.error(f"Błąd zapisu raportu uszkodzonych podglądów: {e}")
+    if context.is_cancelled():
+        logger.info("Skanowanie przerwane przez użytkownika")
+        report("Skanowanie przerwane.")
         return
-    process_folder_with_retry(root_folder_path, progress_callback=progress_callback)
     logger.info("Skanowanie zakończone pomyślnie")
-    if progress_callback:
-        progress_callback("Skanowanie zakończone.")
+    report("Skanowanie zakończone.")
 
 
 def quick_rescan_folder(folder_path, progress_callback=None):
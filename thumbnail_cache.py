@@ -0,0 +1,347 @@
+# thumbnail_cache.py
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import config_manager
+
+try:
+    # pip install Pillow - bez niego galeria wyświetla oryginały
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR_NAME = "_thumbnails"
+THUMBNAIL_FORMATS = ((".jpg", "JPEG"), (".png", "PNG"))
+JPEG_QUALITY = 85
+DEFAULT_MAX_WORKERS = 4
+# Co ile sekund odświeżać czas ostatniego użycia miniatury (os.utime)
+TOUCH_INTERVAL = 3600
+# Pusty plik pod kluczem miniatury: miniatura niepotrzebna (obraz nie większy
+# niż kafelek) albo niemożliwa (nieczytelny obraz) - źródło nie jest dekodowane
+# ponownie, dopóki nie zmieni się jego rozmiar lub mtime
+SKIPPED_EXTENSION = ".none"
+# Miniatury użyte przy ostatnim renderowaniu strony (obok jej index.html)
+PAGE_MANIFEST_NAME = "thumbnails.json"
+
+
+def get_thumbnail_settings(config=None):
+    """
+    Zwraca ustawienia miniatur: thumbnail_size to najkrótszy bok miniatury
+    (kafelek jest kadrowany jak object-fit: cover), preview_size ogranicza
+    dłuższy bok, a performance.* steruje pamięcią podręczną.
+    config: migawka konfiguracji przebiegu (None = bieżąca).
+    """
+    performance = config_manager.get_config_value("performance", {}, config) or {}
+    return {
+        "enabled": bool(performance.get("cache_previews", True)),
+        "min_side": int(config_manager.get_thumbnail_size(config)),
+        "max_side": int(config_manager.get_preview_size(config)),
+        "max_cache_bytes": int(performance.get("max_cache_size_mb", 1024))
+        * 1024
+        * 1024,
+        "ttl_seconds": float(performance.get("cache_ttl_hours", 24)) * 3600,
+        "workers": int(performance.get("max_worker_threads", DEFAULT_MAX_WORKERS)),
+    }
+
+
+def get_thumbnail_dir(gallery_output_base_path):
+    """Folder miniatur wspólny dla wszystkich galerii w _gallery_cache."""
+    gallery_cache_root = os.path.dirname(os.path.abspath(gallery_output_base_path))
+    return os.path.join(gallery_cache_root, THUMBNAIL_DIR_NAME)
+
+
+def get_target_size(width, height, min_side, max_side):
+    """
+    Zwraca wymiary miniatury: krótszy bok = min_side, dłuższy najwyżej
+    max_side. None, jeśli obraz jest już nie większy niż miniatura.
+    """
+    scale = min_side / min(width, height)
+    if max(width, height) * scale > max_side:
+        scale = max_side / max(width, height)
+    if scale >= 1:
+        return None
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def mark_skipped(thumbnail_base):
+    """Zapisuje znacznik SKIPPED_EXTENSION (obraz bez miniatury)."""
+    try:
+        os.makedirs(os.path.dirname(thumbnail_base), exist_ok=True)
+        with open(thumbnail_base + SKIPPED_EXTENSION, "wb"):
+            pass
+    except OSError as e:
+        logger.warning(f"Nie można zapisać znacznika {thumbnail_base}: {e}")
+
+
+def make_thumbnail(source_path, thumbnail_base, min_side, max_side):
+    """
+    Tworzy miniaturę obrazu (uruchamiane w procesie roboczym).
+    Zwraca ścieżkę miniatury albo None, jeśli miniatura nie jest potrzebna
+    lub obrazu nie da się odczytać (kafelek użyje wtedy oryginału) - wtedy
+    zapisuje znacznik SKIPPED_EXTENSION. Błędy wejścia-wyjścia (np. chwilowy
+    brak dostępu do udziału) nie zostawiają znacznika.
+    """
+    try:
+        with Image.open(source_path) as image:
+            target_size = get_target_size(*image.size, min_side, max_side)
+            if target_size is None:
+                mark_skipped(thumbnail_base)
+                return None
+            # JPEG dekodowany od razu w zmniejszonej skali (1/2, 1/4, 1/8)
+            image.draft("RGB", target_size)
+            has_alpha = image.mode in ("RGBA", "LA") or (
+                image.mode == "P" and "transparency" in image.info
+            )
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            image = image.resize(target_size, Image.Resampling.LANCZOS)
+
+            extension, image_format = THUMBNAIL_FORMATS[1 if has_alpha else 0]
+            thumbnail_path = thumbnail_base + extension
+            temp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+            os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+            if image_format == "JPEG":
+                image.save(temp_path, image_format, quality=JPEG_QUALITY, optimize=True)
+            else:
+                image.save(temp_path, image_format, optimize=True)
+            os.replace(temp_path, thumbnail_path)
+            return thumbnail_path
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Nie można utworzyć miniatury {source_path}: {e}")
+        # Błędy dekodowania Pillow (OSError bez errno, ValueError) są trwałe
+        if not isinstance(e, OSError) or e.errno is None:
+            mark_skipped(thumbnail_base)
+        return None
+
+
+class ThumbnailCache:
+    """
+    Pamięć miniatur podglądów w _gallery_cache/_thumbnails. Klucz miniatury
+    to skrót ścieżki, rozmiaru i mtime źródła oraz wymiarów docelowych, więc
+    zmieniony podgląd dostaje nową miniaturę, a stare wpisy wygasają.
+    Rozmiar i mtime pochodzą z rekordów indeksu - pamięć nie odczytuje
+    atrybutów źródeł na udziale sieciowym.
+    Miniatury są tworzone w puli procesów (dekodowanie obrazów nie zwalnia GIL).
+    """
+
+    def __init__(self, thumbnail_dir, min_side, max_side, workers=DEFAULT_MAX_WORKERS):
+        self.thumbnail_dir = thumbnail_dir
+        self.min_side = min_side
+        self.max_side = max_side
+        self.workers = max(1, workers)
+        self._executor = None
+        # Klucze obrazów bez miniatury i bez znacznika (błąd odczytu) -
+        # nie są ponawiane do końca generowania galerii
+        self._skipped = set()
+
+    def _thumbnail_base(self, source_path, size_bytes, mtime_ns):
+        key_source = (
+            f"{source_path}|{size_bytes}|{mtime_ns}|{self.min_side}|{self.max_side}"
+        )
+        key = hashlib.sha1(key_source.encode("utf-8")).hexdigest()
+        return os.path.join(self.thumbnail_dir, key[:2], key)
+
+    @staticmethod
+    def _touch(path, now):
+        """
+        Odświeża czas ostatniego użycia pliku pamięci (mtime, od którego
+        liczone jest wygasanie). Zwraca False, jeśli plik nie istnieje.
+        """
+        try:
+            last_used = os.stat(path).st_mtime
+        except OSError:
+            return False
+        if now - last_used > TOUCH_INTERVAL:
+            try:
+                os.utime(path, (now, now))
+            except OSError:
+                pass
+        return True
+
+    def _find_existing(self, thumbnail_base, now):
+        """
+        Zwraca istniejącą miniaturę albo znacznik SKIPPED_EXTENSION
+        i odświeża jego czas ostatniego użycia.
+        """
+        for extension, _ in THUMBNAIL_FORMATS:
+            if self._touch(thumbnail_base + extension, now):
+                return thumbnail_base + extension
+        if self._touch(thumbnail_base + SKIPPED_EXTENSION, now):
+            return thumbnail_base + SKIPPED_EXTENSION
+        return None
+
+    def get_many(self, sources):
+        """
+        sources: krotki (ścieżka źródła, rozmiar, mtime_ns) z rekordów indeksu;
+        rozmiar None (starsze indeksy) - atrybuty są odczytywane z pliku.
+        Zwraca ({ścieżka źródła: ścieżka miniatury}, liczba obrazów bez
+        miniatury i bez znacznika) - obrazy, które mają (lub właśnie dostały)
+        miniaturę; brakujące są tworzone równolegle.
+        """
+        thumbnails = {}
+        missing = {}
+        unresolved_count = 0
+        now = time.time()
+        for source_path, size_bytes, mtime_ns in set(sources):
+            if size_bytes is None or mtime_ns is None:
+                try:
+                    file_stat = os.stat(source_path)
+                except OSError:
+                    continue
+                size_bytes, mtime_ns = file_stat.st_size, file_stat.st_mtime_ns
+            thumbnail_base = self._thumbnail_base(source_path, size_bytes, mtime_ns)
+            if thumbnail_base in self._skipped:
+                unresolved_count += 1
+                continue
+            thumbnail_path = self._find_existing(thumbnail_base, now)
+            if thumbnail_path is None:
+                missing[source_path] = thumbnail_base
+            elif not thumbnail_path.endswith(SKIPPED_EXTENSION):
+                thumbnails[source_path] = thumbnail_path
+
+        if missing:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            futures = {
+                source_path: self._executor.submit(
+                    make_thumbnail,
+                    source_path,
+                    thumbnail_base,
+                    self.min_side,
+                    self.max_side,
+                )
+                for source_path, thumbnail_base in missing.items()
+            }
+            for source_path, future in futures.items():
+                try:
+                    thumbnail_path = future.result()
+                except Exception as e:
+                    logger.error(f"Błąd procesu miniatur dla {source_path}: {e}")
+                    thumbnail_path = None
+                if thumbnail_path:
+                    thumbnails[source_path] = thumbnail_path
+                elif not os.path.exists(missing[source_path] + SKIPPED_EXTENSION):
+                    self._skipped.add(missing[source_path])
+                    unresolved_count += 1
+        return thumbnails, unresolved_count
+
+    def is_page_current(self, manifest_path):
+        """
+        Czy miniatury użyte przy ostatnim renderowaniu strony (manifest
+        write_page_manifest) nadal istnieją - odświeża też ich czas użycia.
+        Sprawdzane są tylko pliki w _gallery_cache, bez dostępu do źródeł.
+        """
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (
+            not isinstance(manifest, dict)
+            or manifest.get("sizes") != [self.min_side, self.max_side]
+            or not manifest.get("complete")
+        ):
+            return False
+        now = time.time()
+        return all(
+            self._touch(thumbnail_path, now)
+            for thumbnail_path in manifest.get("thumbnails", [])
+        )
+
+    def write_page_manifest(self, manifest_path, thumbnail_paths, complete):
+        """
+        Zapisuje miniatury użyte przez wyrenderowaną stronę. complete=False
+        (któryś obraz nie dostał miniatury ani znacznika) wymusza ponowne
+        renderowanie strony przy następnym generowaniu.
+        """
+        manifest = {
+            "sizes": [self.min_side, self.max_side],
+            "complete": complete,
+            "thumbnails": sorted(set(thumbnail_paths)),
+        }
+        temp_path = f"{manifest_path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(temp_path, manifest_path)
+        except OSError as e:
+            logger.warning(f"Nie można zapisać {manifest_path}: {e}")
+
+    def evict(self, max_cache_bytes, ttl_seconds):
+        """
+        Usuwa miniatury nieużywane dłużej niż ttl_seconds, a potem najdawniej
+        używane, dopóki pamięć przekracza max_cache_bytes.
+        Zwraca (liczba usuniętych plików, zwolnione bajty).
+        """
+        entries = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.thumbnail_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((file_stat.st_mtime, file_stat.st_size, path))
+
+        entries.sort()  # najdawniej używane na początku
+        total_bytes = sum(size for _, size, _ in entries)
+        removed_count = removed_bytes = 0
+        for last_used, size, path in entries:
+            expired = ttl_seconds > 0 and now - last_used > ttl_seconds
+            if not expired and total_bytes - removed_bytes <= max_cache_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Nie można usunąć miniatury {path}: {e}")
+                continue
+            removed_count += 1
+            removed_bytes += size
+
+        if removed_count:
+            logger.info(
+                f"Usunięto {removed_count} miniatur ({removed_bytes} bajtów) "
+                f"z {self.thumbnail_dir}"
+            )
+        return removed_count, removed_bytes
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+@contextmanager
+def open_thumbnail_cache(gallery_output_base_path, evict=True, config=None):
+    """
+    Otwiera pamięć miniatur na czas generowania galerii i (przy evict=True)
+    na końcu usuwa wpisy przeterminowane lub ponad limit rozmiaru.
+    Zwraca None, gdy performance.cache_previews jest wyłączone lub brak
+    biblioteki Pillow. config: migawka konfiguracji przebiegu.
+    """
+    settings = get_thumbnail_settings(config)
+    if not settings["enabled"] or Image is None:
+        if settings["enabled"]:
+            logger.info("Brak biblioteki Pillow - kafelki galerii użyją oryginałów")
+        yield None
+        return
+
+    thumbnails = ThumbnailCache(
+        get_thumbnail_dir(gallery_output_base_path),
+        settings["min_side"],
+        settings["max_side"],
+        settings["workers"],
+    )
+    try:
+        yield thumbnails
+    finally:
+        thumbnails.close()
+        if evict:
+            thumbnails.evict(settings["max_cache_bytes"], settings["ttl_seconds"])